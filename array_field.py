@@ -0,0 +1,316 @@
+try:
+    import numpy
+except ImportError: # numpy is optional, only needed for the array-backed field
+    numpy = None
+
+from game_mechanics_errors import InvalidJewelError
+
+EMPTY = 0
+_MAX_JEWEL_CODE = 255 # codes are stored in a byte
+
+def encode_jewel(jewel) -> int:
+    """ Converts a jewel (a single character string) to its small int code.
+        Empty cells are encoded as 0. Raises InvalidJewelError for jewels
+        whose character code doesn't fit in a byte. """
+
+    if jewel == EMPTY:
+        return 0
+    if not isinstance(jewel, str) or len(jewel) != 1 or not 0 < ord(jewel) <= _MAX_JEWEL_CODE:
+        raise InvalidJewelError(f"jewel {jewel!r} is not a single character with a code from 1 to {_MAX_JEWEL_CODE}")
+    return ord(jewel)
+
+def decode_jewel(code: int):
+    """ Converts a small int code back to the jewel it represents.
+        Returns EMPTY for 0. """
+
+    if code == 0:
+        return EMPTY
+    return chr(code)
+
+
+class ArrayField:
+    def __init__(self, rows: int, columns: int) -> None:
+        """ Initializes a compact uint8 grid with the given number of rows
+            (including the hidden rows) and columns, all cells empty. """
+
+        if numpy is None:
+            raise ImportError("numpy is required for the array-backed field")
+
+        self._cells = numpy.zeros((rows, columns), dtype=numpy.uint8)
+
+    def __len__(self) -> int:
+        return self._cells.shape[0]
+
+    def __getitem__(self, row):
+        """ Returns a view of the row that reads and writes jewels, or a list of
+            row views if given a slice, so the field can be indexed like a 2D list. """
+
+        if isinstance(row, slice):
+            return [_ArrayFieldRow(self._cells[i]) for i in range(*row.indices(len(self)))]
+        return _ArrayFieldRow(self._cells[row])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield _ArrayFieldRow(self._cells[i])
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ArrayField):
+            return numpy.array_equal(self._cells, other._cells)
+        return self.to_list() == other
+
+    def copy(self) -> 'ArrayField':
+        """ Returns an independent copy of the field. """
+
+        field = ArrayField.__new__(ArrayField)
+        field._cells = self._cells.copy()
+        return field
+
+    def to_list(self) -> list[list[str]]:
+        """ Returns the field as a 2D list of jewels, the same as the list-backed field. """
+
+        return [[decode_jewel(code) for code in row] for row in self._cells.tolist()]
+
+    def to_bytes(self) -> bytes:
+        """ Returns the field as one byte per cell, row by row. """
+        return self._cells.tobytes()
+
+    def load_bytes(self, data: bytes) -> None:
+        """ Replaces the field with one byte per cell, row by row, as made by to_bytes(). """
+        self._cells = numpy.frombuffer(data, dtype=numpy.uint8).reshape(self._cells.shape).copy()
+
+    def find_matches(self) -> list[tuple]:
+        """ Returns a list of tuple coordinates of every horizontal, vertical
+            and diagonal match in the field. """
+
+        rows, columns = numpy.nonzero(_match_mask(self._cells))
+        return list(zip(rows.tolist(), columns.tolist()))
+
+    def bring_jewels_down(self, columns = None, changed_cells: list = None) -> set:
+        """ Compacts every column (or only the given column indices) so there are no
+            empty cells below a jewel, keeping the order of the jewels. 
+            Returns the set of column indices that changed. If a changed_cells list
+            is given, the (row, column) of every cell that changed is appended to it. """
+
+        if columns is None:
+            columns = range(self._cells.shape[1])
+        columns = numpy.fromiter(columns, dtype=numpy.intp)
+
+        original = self._cells[:, columns]
+        compacted = _compact_columns(original)
+        changed_mask = compacted != original
+        changed = changed_mask.any(axis=-2)
+        self._cells[:, columns[changed]] = compacted[:, changed]
+        if changed_cells is not None:
+            rows, column_positions = numpy.nonzero(changed_mask)
+            changed_cells.extend(zip(rows.tolist(), columns[column_positions].tolist()))
+        return set(columns[changed].tolist())
+
+
+class FieldBatch:
+    def __init__(self, cells) -> None:
+        """ Holds many independent fields as one uint8 array of shape (boards, rows, columns),
+            where rows includes the two hidden rows, so they are all advanced and scored 
+            together with array operations instead of one at a time. The fields must not
+            contain matches, as every field in a GameState is between fallers. """
+
+        if numpy is None:
+            raise ImportError("numpy is required for batched fields")
+
+        self._cells = numpy.ascontiguousarray(cells, dtype=numpy.uint8)
+        self._game_over = numpy.zeros(len(self._cells), dtype=bool)
+
+    @classmethod
+    def from_fields(cls, fields: list) -> 'FieldBatch':
+        """ Returns a batch holding copies of the given fields (2D lists of jewels or ArrayFields). """
+
+        return cls(numpy.stack([field._cells if isinstance(field, ArrayField) else
+                                numpy.array([[encode_jewel(jewel) for jewel in row] for row in field], dtype=numpy.uint8)
+                                for field in fields]))
+
+    @classmethod
+    def from_field(cls, field, boards: int) -> 'FieldBatch':
+        """ Returns a batch holding the given number of copies of one field. """
+        return cls(numpy.repeat(cls.from_fields([field])._cells, boards, axis=0))
+
+    def __len__(self) -> int:
+        return self._cells.shape[0]
+
+    def field(self, board: int) -> list[list[str]]:
+        """ Returns one field of the batch as a 2D list of jewels. """
+        return [[decode_jewel(code) for code in row] for row in self._cells[board].tolist()]
+
+    def game_over(self):
+        """ Returns a boolean array that is True for every board whose game has ended. """
+        return self._game_over.copy()
+
+    def find_matches(self):
+        """ Returns a boolean array of the same shape as the batch that is True for 
+            every cell that is part of a match. """
+        return _match_mask(self._cells)
+
+    def bring_jewels_down(self):
+        """ Compacts every column of every board so there are no empty cells below
+            a jewel. Returns a boolean array that is True for every board that changed. """
+
+        compacted = _compact_columns(self._cells)
+        changed = (compacted != self._cells).any(axis=(-2, -1))
+        self._cells = compacted
+        return changed
+
+    def drop_fallers(self, jewels, columns):
+        """ Drops a faller of 3 jewels (one row of the jewels array per board, from top to bottom)
+            into the given column index of every board whose game isn't over, and freezes it
+            on top of the column. Like GameState, a game ends if the column is already full, 
+            or if the faller froze partly in the hidden rows without making a match. 
+            Returns a boolean array of the boards whose game ended. """
+
+        boards = numpy.flatnonzero(~self._game_over)
+        jewels = numpy.asarray(jewels, dtype=numpy.uint8)[boards]
+        columns = numpy.asarray(columns, dtype=numpy.intp)[boards]
+
+        column_cells = self._cells[boards, :, columns] # (boards, rows)
+        filled = column_cells != 0
+        top_rows = numpy.where(filled.any(axis=-1), filled.argmax(axis=-1), column_cells.shape[-1])
+
+        blocked = top_rows <= 2 # the faller would be created on top of a jewel in the first visible row
+        placed = boards[~blocked]
+        placed_top_rows = top_rows[~blocked] - 3
+        for i in range(3):
+            self._cells[placed, placed_top_rows + i, columns[~blocked]] = jewels[~blocked, i]
+
+        out_of_field = placed_top_rows <= 1
+        if out_of_field.any():
+            out_of_field_boards = placed[out_of_field]
+            matched = _match_mask(self._cells[out_of_field_boards]).any(axis=(-2, -1))
+            out_of_field[out_of_field] = ~matched
+
+        ended = numpy.zeros(len(self), dtype=bool)
+        ended[boards[blocked]] = True
+        ended[placed[out_of_field]] = True
+        self._game_over |= ended
+        return ended
+
+    def settle(self):
+        """ Clears the matches on every board whose game isn't over, brings the jewels down, and
+            repeats until no new matches form, the same as ticking each GameState until its 
+            matches are gone. Returns arrays with the number of jewels cleared and the number
+            of cascades (matches formed after jewels were brought down) on each board. """
+
+        cleared = numpy.zeros(len(self), dtype=numpy.int64)
+        cascades = numpy.zeros(len(self), dtype=numpy.int64)
+
+        matches = _match_mask(self._cells) & ~self._game_over[:, None, None]
+        matched = matches.any(axis=(-2, -1))
+        while matched.any():
+            cleared += matches.sum(axis=(-2, -1))
+            self._cells[matches] = 0
+            self._cells[matched] = _compact_columns(self._cells[matched])
+
+            matches = _match_mask(self._cells) & matched[:, None, None] # only boards that changed can match
+            matched = matches.any(axis=(-2, -1))
+            cascades += matched
+
+            # jewels left in the hidden rows after a clear end the game, same as in GameState.tick
+            out_of_field = (self._cells[..., :2, :] != 0).any(axis=(-2, -1))
+            self._game_over |= out_of_field
+            matches &= ~out_of_field[:, None, None]
+            matched &= ~out_of_field
+
+        return (cleared, cascades)
+
+    def column_heights(self):
+        """ Returns an array of shape (boards, columns) with the number of visible 
+            rows filled in each column, counted from the top-most jewel. """
+
+        filled = self._cells[..., 2:, :] != 0
+        visible_rows = filled.shape[-2]
+        return numpy.where(filled.any(axis=-2), visible_rows - filled.argmax(axis=-2), 0)
+
+    def neighbour_counts(self):
+        """ Returns an array with the number of pairs of touching (horizontally, vertically 
+            or diagonally) visible jewels of the same kind on each board. """
+
+        visible = self._cells[..., 2:, :]
+        pairs = _equal_pairs(visible[..., :, :-1], visible[..., :, 1:]).sum(axis=(-2, -1))
+        pairs += _equal_pairs(visible[..., :-1, :], visible[..., 1:, :]).sum(axis=(-2, -1))
+        pairs += _equal_pairs(visible[..., :-1, :-1], visible[..., 1:, 1:]).sum(axis=(-2, -1))
+        pairs += _equal_pairs(visible[..., :-1, 1:], visible[..., 1:, :-1]).sum(axis=(-2, -1))
+        return pairs
+
+
+class _ArrayFieldRow:
+    def __init__(self, cells) -> None:
+        """ Wraps a single row of an ArrayField so jewels can be read and written by index. """
+        self._cells = cells
+
+    def __len__(self) -> int:
+        return self._cells.shape[0]
+
+    def __getitem__(self, column):
+        return decode_jewel(int(self._cells[column]))
+
+    def __setitem__(self, column, jewel) -> None:
+        self._cells[column] = encode_jewel(jewel)
+
+    def __iter__(self):
+        for code in self._cells.tolist():
+            yield decode_jewel(code)
+
+    def __eq__(self, other) -> bool:
+        return list(self) == other
+
+
+# ------------------- Vectorized kernels ----------------------- #
+# the kernels only index the last two axes, so they work on a single field of shape
+# (rows, columns) and on a stack of fields of shape (boards, rows, columns)
+
+def _match_mask(cells):
+    """ Returns a boolean array that is True for every cell that is part of
+        a horizontal, vertical or diagonal run of 3 or more identical jewels. """
+
+    mask = numpy.zeros(cells.shape, dtype=bool)
+
+    # horizontal matches are never counted in the two hidden rows
+    visible = cells[..., 2:, :]
+    triples = _equal_triples(visible[..., :, :-2], visible[..., :, 1:-1], visible[..., :, 2:])
+    mask[..., 2:, :-2] |= triples
+    mask[..., 2:, 1:-1] |= triples
+    mask[..., 2:, 2:] |= triples
+
+    # vertical
+    triples = _equal_triples(cells[..., :-2, :], cells[..., 1:-1, :], cells[..., 2:, :])
+    mask[..., :-2, :] |= triples
+    mask[..., 1:-1, :] |= triples
+    mask[..., 2:, :] |= triples
+
+    # down-right diagonal
+    triples = _equal_triples(cells[..., :-2, :-2], cells[..., 1:-1, 1:-1], cells[..., 2:, 2:])
+    mask[..., :-2, :-2] |= triples
+    mask[..., 1:-1, 1:-1] |= triples
+    mask[..., 2:, 2:] |= triples
+
+    # down-left diagonal
+    triples = _equal_triples(cells[..., :-2, 2:], cells[..., 1:-1, 1:-1], cells[..., 2:, :-2])
+    mask[..., :-2, 2:] |= triples
+    mask[..., 1:-1, 1:-1] |= triples
+    mask[..., 2:, :-2] |= triples
+
+    return mask
+
+def _equal_triples(first, second, third):
+    """ Returns True wherever three shifted views hold the same non-empty jewel.
+        Any run of 3 or more is the union of the triples it contains. """
+
+    return (first != 0) & (first == second) & (second == third)
+
+def _equal_pairs(first, second):
+    """ Returns True wherever two shifted views hold the same non-empty jewel. """
+    return (first != 0) & (first == second)
+
+def _compact_columns(cells):
+    """ Returns a copy of the cells with every jewel moved to the bottom of its
+        column, keeping the order of the jewels within each column. """
+
+    # a stable sort on "is a jewel" puts the empty cells first and keeps the jewels in order
+    order = numpy.argsort(cells != 0, axis=-2, kind='stable')
+    return numpy.take_along_axis(cells, order, axis=-2)
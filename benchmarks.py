@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import NamedTuple
+
+from game_mechanics import GameState, EMPTY
+from matching_mechanics import _check_horizontal_matches, _check_vertical_matches, _check_diagonal_matches
+from simulation import simulate_game, RandomFallerSource, RandomMovePolicy, JEWELS
+
+_DEFAULT_SIZES = ((13, 6), (50, 50), (200, 200))
+_DEFAULT_DENSITIES = (0.25, 0.5, 0.9)
+_DEFAULT_REPEATS = 5
+_DEFAULT_MIN_SECONDS = 0.1 # each repeat calls the benchmark until at least this much time has passed
+_DEFAULT_THRESHOLD = 0.10 # slowdown (as a fraction) reported as a regression
+_DEFAULT_PLAYTHROUGH_TICKS = 2000
+_RESULTS_VERSION = 1
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    rows: int
+    columns: int
+    density: float
+    seconds: float # best seconds per operation over every repeat
+    operations: int # operations timed in the best repeat
+
+    def key(self) -> tuple:
+        """ Identifies the same benchmark case across runs. """
+        return (self.name, self.rows, self.columns, self.density)
+
+
+class Regression(NamedTuple):
+    key: tuple
+    baseline_seconds: float
+    seconds: float
+
+    def ratio(self) -> float:
+        return self.seconds / self.baseline_seconds
+
+
+def random_field(dimensions: tuple, density: float, generator: random.Random) -> list[list]:
+    """ Returns a field (with its two hidden rows empty) where every visible cell holds a
+        random jewel with the given probability, so jewels are left floating over gaps. """
+
+    rows, columns = dimensions
+    field = [[EMPTY] * columns for i in range(2)]
+    for i in range(rows):
+        field.append([generator.choice(JEWELS) if generator.random() < density else EMPTY
+                      for j in range(columns)])
+    return field
+
+
+def settled_state(dimensions: tuple, density: float, generator: random.Random, open_column: int) -> GameState:
+    """ Returns a game whose columns are stacked from the bottom to about density of
+        their height, except the open_column index which is left empty for fallers.
+        Any matches in the random stacks are cleared, so the field is ready for a faller. """
+
+    rows, columns = dimensions
+    jewels = [[" "] * columns for i in range(rows)]
+    for j in range(columns):
+        if j == open_column:
+            continue
+        height = min(rows - 1, int(generator.random() * 2 * density * rows)) # averages density of the rows
+        for i in range(rows - height, rows):
+            jewels[i][j] = generator.choice(JEWELS)
+
+    state = GameState(dimensions)
+    state.fill_initial_field(jewels)
+    state.resolve_cascades()
+    return _fresh_copy(state)
+
+
+def _fresh_copy(state: GameState) -> GameState:
+    """ Returns a copy of the game with no pending changes, so cloning it is O(rows). """
+
+    state = GameState.from_bytes(state.to_bytes())
+    state.take_changed_cells()
+    state.cell_statuses()
+    return state
+
+
+# Each benchmark takes the board dimensions, fill density and a random generator, does its setup
+# and returns a function to time. The function returns the number of operations it did, so
+# results are reported per operation (per tick for the benchmarks that tick).
+
+def _horizontal_matches_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    field = random_field(dimensions, density, generator)
+
+    def run() -> int:
+        _check_horizontal_matches(field)
+        return 1
+    return run
+
+def _vertical_matches_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    field = random_field(dimensions, density, generator)
+
+    def run() -> int:
+        _check_vertical_matches(field)
+        return 1
+    return run
+
+def _diagonal_matches_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    field = random_field(dimensions, density, generator)
+
+    def run() -> int:
+        _check_diagonal_matches(field)
+        return 1
+    return run
+
+def _bring_jewels_down_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    """ Compacts every column of a field full of floating jewels. Each call works on a
+        fresh copy-on-write clone, so the rows it copies are part of the measured cost. """
+
+    state = GameState(dimensions)
+    state._load_initial_jewel_positions(random_field(dimensions, density, generator)[2:]) # keeps them floating
+    state = _fresh_copy(state)
+
+    def run() -> int:
+        state.clone()._bring_floating_jewels_down()
+        return 1
+    return run
+
+def _tick_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    """ Drops a faller down the empty middle column of a settled field, ticking until
+        it has frozen and any matches it made are cleared. Timed per tick. The field is
+        only cloned again once the column is nearly full, so large boards time ticks, not clones. """
+
+    open_column = dimensions[1] // 2
+    state = settled_state(dimensions, density, generator, open_column)
+    games = [state.clone()]
+
+    def run() -> int:
+        if games[0]._field[4][open_column] != EMPTY or games[0].game_over(): # no room for another faller
+            games[0] = state.clone()
+        game = games[0]
+        game.create_faller(generator.choices(JEWELS, k=3), open_column + 1)
+        ticks = 0
+        while (game._faller is not None or game._match_found_previous_tick) and not game.game_over():
+            game.tick()
+            ticks += 1
+        return ticks
+    return run
+
+def _playthrough_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    """ Plays a random game from an empty field (so density is ignored) with random
+        moves, up to a tick limit. Timed per tick. """
+
+    def run() -> int:
+        seed = generator.random()
+        return simulate_game(RandomFallerSource(seed), RandomMovePolicy(seed), dimensions,
+                             _DEFAULT_PLAYTHROUGH_TICKS).ticks
+    return run
+
+def _redraw_game(dimensions: tuple, density: float, generator: random.Random):
+    """ Returns a ColumnsGame showing a settled field with a faller, drawn once on an
+        offscreen window. Imported here so the other benchmarks don't need pygame. """
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import main
+
+    open_column = dimensions[1] // 2
+    game = main.ColumnsGame(dimensions=dimensions)
+    game._state = settled_state(dimensions, density, generator, open_column)
+    game._state.create_faller(generator.choices(JEWELS, k=3), open_column + 1)
+    game._start()
+    game._redraw()
+    return game
+
+def _full_redraw_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    """ Repaints the whole window, as after the first frame or a resize. """
+
+    game = _redraw_game(dimensions, density, generator)
+
+    def run() -> int:
+        game._full_repaint_needed = True
+        game._redraw()
+        return 1
+    return run
+
+def _changed_cells_redraw_benchmark(dimensions: tuple, density: float, generator: random.Random):
+    """ Redraws only the faller's cells, as after a tick that moved it. """
+
+    game = _redraw_game(dimensions, density, generator)
+    state = game._state
+    faller_cells = [tuple(position) for position in state._faller.positions()]
+
+    def run() -> int:
+        state._mark_cells_changed(faller_cells)
+        game._redraw()
+        return 1
+    return run
+
+
+BENCHMARKS = {
+    "horizontal_matches": _horizontal_matches_benchmark,
+    "vertical_matches": _vertical_matches_benchmark,
+    "diagonal_matches": _diagonal_matches_benchmark,
+    "bring_jewels_down": _bring_jewels_down_benchmark,
+    "tick": _tick_benchmark,
+    "playthrough": _playthrough_benchmark,
+    "redraw_full": _full_redraw_benchmark,
+    "redraw_changed_cells": _changed_cells_redraw_benchmark,
+}
+_DENSITY_INDEPENDENT_BENCHMARKS = {"playthrough"} # only run at the first density
+
+
+def time_benchmark(function, repeats: int = _DEFAULT_REPEATS,
+                   min_seconds: float = _DEFAULT_MIN_SECONDS) -> tuple[float, int]:
+    """ Calls the function until at least min_seconds have passed, repeats times, and
+        returns the best seconds per operation with the operations done in that repeat. """
+
+    best = None
+    for i in range(repeats):
+        operations = 0
+        start = time.perf_counter()
+        while True:
+            operations += function()
+            seconds = time.perf_counter() - start
+            if seconds >= min_seconds and operations > 0:
+                break
+        if best is None or seconds / operations < best[0]:
+            best = (seconds / operations, operations)
+    return best
+
+
+def run_benchmarks(names: list[str] = None, sizes: list[tuple] = _DEFAULT_SIZES,
+                   densities: list[float] = _DEFAULT_DENSITIES, repeats: int = _DEFAULT_REPEATS,
+                   min_seconds: float = _DEFAULT_MIN_SECONDS, seed = 0, report = None) -> list[BenchmarkResult]:
+    """ Runs every named benchmark (all of them by default) on every board size and fill
+        density. Each case gets its own generator seeded from seed and the case, so a case
+        times the same work however the others are selected. report is called with each
+        result as soon as it is measured. """
+
+    if names is None:
+        names = list(BENCHMARKS.keys())
+
+    results = []
+    for name in names:
+        for rows, columns in sizes:
+            for density in densities[:1] if name in _DENSITY_INDEPENDENT_BENCHMARKS else densities:
+                generator = random.Random(f"{seed}:{name}:{rows}x{columns}:{density}")
+                function = BENCHMARKS[name]((rows, columns), density, generator)
+                seconds, operations = time_benchmark(function, repeats, min_seconds)
+                result = BenchmarkResult(name, rows, columns, density, seconds, operations)
+                results.append(result)
+                if report is not None:
+                    report(result)
+    return results
+
+
+def results_to_json(results: list[BenchmarkResult]) -> str:
+    """ Returns the results with the Python version they were measured on as JSON. """
+
+    return json.dumps({"version": _RESULTS_VERSION, "python": platform.python_version(),
+                       "results": [result._asdict() for result in results]}, indent=1, sort_keys=True)
+
+
+def results_from_json(text: str) -> list[BenchmarkResult]:
+    return [BenchmarkResult(**result) for result in json.loads(text)["results"]]
+
+
+def compare_results(baseline: list[BenchmarkResult], results: list[BenchmarkResult],
+                    threshold: float = _DEFAULT_THRESHOLD) -> list[Regression]:
+    """ Returns the cases that are more than threshold (a fraction) slower than in the
+        baseline, worst first. Cases missing from either run are ignored. """
+
+    baseline_seconds = {result.key(): result.seconds for result in baseline}
+    regressions = [Regression(result.key(), baseline_seconds[result.key()], result.seconds)
+                   for result in results
+                   if result.key() in baseline_seconds
+                   and result.seconds > baseline_seconds[result.key()] * (1 + threshold)]
+    return sorted(regressions, key=Regression.ratio, reverse=True)
+
+
+def _parse_size(text: str) -> tuple[int, int]:
+    rows, columns = text.lower().split("x")
+    return (int(rows), int(columns))
+
+
+def _print_result(result: BenchmarkResult) -> None:
+    print(f"{result.name:<22} {result.rows:>4}x{result.columns:<4} density {result.density:<5} "
+          f"{result.seconds * 1e6:>12.2f} us/op  ({result.operations} ops)", flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Times the engine hot paths across board sizes and fill densities.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, all of them by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", nargs="+", type=_parse_size, default=list(_DEFAULT_SIZES),
+                        help="board sizes as ROWSxCOLUMNS")
+    parser.add_argument("--densities", nargs="+", type=float, default=list(_DEFAULT_DENSITIES))
+    parser.add_argument("--repeats", type=int, default=_DEFAULT_REPEATS)
+    parser.add_argument("--min-seconds", type=float, default=_DEFAULT_MIN_SECONDS)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results to flag regressions against")
+    parser.add_argument("--threshold", type=float, default=_DEFAULT_THRESHOLD,
+                        help="slowdown reported as a regression, as a fraction")
+    arguments = parser.parse_args()
+    for name in arguments.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+
+    results = run_benchmarks(arguments.names or None, arguments.sizes, arguments.densities, arguments.repeats,
+                             arguments.min_seconds, arguments.seed, _print_result)
+
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            file.write(results_to_json(results))
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            regressions = compare_results(results_from_json(file.read()), results, arguments.threshold)
+        for regression in regressions:
+            name, rows, columns, density = regression.key
+            print(f"REGRESSION {name} {rows}x{columns} density {density}: "
+                  f"{regression.baseline_seconds * 1e6:.2f} -> {regression.seconds * 1e6:.2f} us/op "
+                  f"({regression.ratio():.2f}x)")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from game_mechanics import GameState, EMPTY
+from game_mechanics_errors import FallerNotActiveError, InvalidMoveError
+from array_field import FieldBatch, encode_jewel, numpy
+
+_DEFAULT_DEPTH = 1 # fallers placed per search: the active faller, then depth - 1 upcoming ones
+_DEFAULT_TIME_BUDGET = 0.05 # seconds the bot may search for each move
+_DEFAULT_TABLE_SIZE = 100000 # positions kept in the transposition table
+
+# weights of the placement score
+_CLEARED_JEWEL_WEIGHT = 10.0 # per jewel cleared by a match
+_CASCADE_WEIGHT = 5.0 # per match that formed after jewels were brought down
+_HEIGHT_WEIGHT = 0.5 # per jewel in the field
+_MAX_HEIGHT_WEIGHT = 2.0 # per row filled in the fullest column
+_BUMPINESS_WEIGHT = 1.0 # per row of difference between neighbouring columns
+_NEIGHBOUR_WEIGHT = 1.5 # per pair of touching jewels of the same kind, which can grow into a match
+_NEIGHBOUR_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class Placement(NamedTuple):
+    """ Where the bot drops the active faller, and how good the result is. """
+    column: int # column (starting at 1) the faller is shifted to
+    rotations: int # number of times the faller is rotated before shifting
+    score: float
+
+
+class PlacementBot:
+    def __init__(self, depth: int = _DEFAULT_DEPTH, time_budget: float = _DEFAULT_TIME_BUDGET,
+                 table_size: int = _DEFAULT_TABLE_SIZE, batched: bool = False) -> None:
+        """ Chooses where to drop each faller by trying every rotation in every column
+            it can be shifted to, letting it freeze and every match cascade clear, and
+            scoring the field that is left. With a depth above 1, the upcoming fallers
+            passed to choose_placement() are placed the same way after it.
+            The score of every settled field is kept in an LRU transposition table of
+            table_size positions, so positions reached again are not searched again.
+            A move never takes much longer than time_budget seconds: deeper searches
+            are only used if they finish in time. If batched is True, searches of a 
+            single faller drop it in every placement at once with numpy (see FieldBatch). """
+
+        if batched and numpy is None:
+            raise ImportError("numpy is required for the batched bot")
+
+        self._batched = batched
+        self._depth = depth
+        self._time_budget = time_budget
+        self._table = _TranspositionTable(table_size)
+
+    def choose_placement(self, state: GameState, upcoming: list[list] = ()) -> Placement:
+        """ Returns the best placement for the active faller. upcoming is a list of the
+            jewels of the fallers that come after it, if they are known; each is assumed
+            to start in the same column as the active faller. """
+
+        if state._faller is None:
+            raise FallerNotActiveError()
+        if self._batched and min(self._depth, len(upcoming) + 1) == 1:
+            return _best_batched_placement(state)
+
+        deadline = time.perf_counter() + self._time_budget
+        start_column = state._faller.column + 1
+        best_placement = Placement(start_column, 0, float("-inf")) # leave the faller alone if out of time
+
+        candidates = []
+        for column, rotations, settled_state, reward in _placements(state):
+            candidates.append((column, rotations, settled_state, reward))
+            if time.perf_counter() > deadline:
+                break
+
+        # iterative deepening: each depth is only used if every candidate was searched in time
+        for depth in range(1, min(self._depth, len(upcoming) + 1) + 1):
+            depth_best_placement = None
+            try:
+                for column, rotations, settled_state, reward in candidates:
+                    score = reward + self._settled_score(settled_state, tuple(map(tuple, upcoming[:depth - 1])),
+                                                         start_column, deadline)
+                    if depth_best_placement is None or score > depth_best_placement.score:
+                        depth_best_placement = Placement(column, rotations, score)
+                    if depth == 1: # the shallowest search keeps whatever it found so far
+                        best_placement = depth_best_placement
+                        if time.perf_counter() > deadline:
+                            break
+            except _SearchTimeout:
+                break
+            if depth_best_placement is not None:
+                best_placement = depth_best_placement
+
+        return best_placement
+
+    def choose_moves(self, state: GameState, upcoming: list[list] = ()) -> list[str]:
+        """ Returns the moves ("left", "right" or "rotate") that take the active faller
+            to its best placement. """
+
+        placement = self.choose_placement(state, upcoming)
+        return placement_moves(state, placement)
+
+    def _settled_score(self, state: GameState, upcoming: tuple, start_column: int, deadline: float) -> float:
+        """ Returns the score of a field with no faller or matches left: its evaluation, or
+            the best score reachable by placing the upcoming fallers on it. """
+
+        # the upcoming fallers start in start_column, which decides the columns they can reach
+        key = (state.position_hash(), upcoming, start_column if len(upcoming) > 0 else None)
+        score = self._table.get(key)
+        if score is not None:
+            return score
+
+        if state.game_over():
+            score = float("-inf")
+        elif len(upcoming) == 0:
+            score = evaluate_field(state)
+        else:
+            if time.perf_counter() > deadline:
+                raise _SearchTimeout()
+            next_state = state.clone()
+            next_state.create_faller(list(upcoming[0]), start_column)
+            score = float("-inf")
+            if not next_state.game_over():
+                for column, rotations, settled_state, reward in _placements(next_state):
+                    score = max(score, reward + self._settled_score(settled_state, upcoming[1:],
+                                                                    start_column, deadline))
+
+        self._table.put(key, score)
+        return score
+
+
+class BotMovePolicy:
+    def __init__(self, bot: PlacementBot) -> None:
+        """ Move policy (see GameRunner) that lets the bot choose where each faller goes.
+            All of the moves for a faller are returned right after it is created. """
+
+        self._bot = bot
+        self._planned_faller = None # the faller the moves were chosen for
+
+    def __call__(self, state: GameState) -> list[str]:
+        # a faller is the same object from its creation until it freezes
+        if state._faller is None or state._faller is self._planned_faller:
+            return []
+        self._planned_faller = state._faller
+        return self._bot.choose_moves(state)
+
+
+class _TranspositionTable:
+    def __init__(self, size: int) -> None:
+        """ Maps positions to their scores, forgetting the least recently used
+            position once more than size positions are stored. """
+
+        self._size = size
+        self._scores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def get(self, key):
+        """ Returns the score stored for the key, or None. """
+
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self._scores.move_to_end(key)
+        self.hits += 1
+        return score
+
+    def put(self, key, score: float) -> None:
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        if len(self._scores) > self._size:
+            self._scores.popitem(last=False)
+
+
+class _SearchTimeout(Exception):
+    """ Raised inside a search that ran out of time. """
+    pass
+
+
+def placement_moves(state: GameState, placement: Placement) -> list[str]:
+    """ Returns the moves that rotate and shift the active faller to the placement. """
+
+    shift = placement.column - 1 - state._faller.column
+    return ["rotate"] * placement.rotations + ["left" if shift < 0 else "right"] * abs(shift)
+
+def evaluate_field(state: GameState) -> float:
+    """ Scores a settled field: low, flat stacks with jewels that touch jewels of the
+        same kind score highest. """
+
+    field = state._field
+    first_row = 2 # jewels in the hidden rows have already ended the game
+    last_row = state.last_row_index()
+
+    heights = []
+    for column in range(state.columns()):
+        row = first_row
+        while row <= last_row and field[row][column] == EMPTY:
+            row += 1
+        heights.append(last_row + 1 - row)
+
+    neighbours = 0
+    for row in range(first_row, last_row + 1):
+        for column in range(state.columns()):
+            jewel = field[row][column]
+            if jewel == EMPTY:
+                continue
+            for row_delta, column_delta in _NEIGHBOUR_DIRECTIONS:
+                neighbour_row, neighbour_column = row + row_delta, column + column_delta
+                if neighbour_row <= last_row and 0 <= neighbour_column < state.columns() and \
+                    field[neighbour_row][neighbour_column] == jewel:
+                    neighbours += 1
+
+    bumpiness = sum(abs(heights[i] - heights[i + 1]) for i in range(len(heights) - 1))
+    return (-_HEIGHT_WEIGHT * sum(heights) - _MAX_HEIGHT_WEIGHT * max(heights)
+            - _BUMPINESS_WEIGHT * bumpiness + _NEIGHBOUR_WEIGHT * neighbours)
+
+def evaluate_fields(batch: FieldBatch):
+    """ Returns an array with the evaluate_field() score of every field in the batch. """
+
+    heights = batch.column_heights()
+    bumpiness = numpy.abs(numpy.diff(heights, axis=-1)).sum(axis=-1)
+    return (-_HEIGHT_WEIGHT * heights.sum(axis=-1) - _MAX_HEIGHT_WEIGHT * heights.max(axis=-1)
+            - _BUMPINESS_WEIGHT * bumpiness + _NEIGHBOUR_WEIGHT * batch.neighbour_counts())
+
+def _best_batched_placement(state: GameState) -> Placement:
+    """ Returns the best placement for the active faller, found by dropping it in every
+        rotation and reachable column of one batch of copies of the field. Gives the same
+        placements and scores as searching them one at a time. """
+
+    placements = []
+    jewel_orders = []
+    jewels = state._faller.jewels
+    for rotations in range(3):
+        jewel_order = jewels[-rotations:] + jewels[:-rotations] if rotations > 0 else jewels
+        if jewel_order in jewel_orders: # rotating a faller of identical jewels changes nothing
+            continue
+        jewel_orders.append(jewel_order)
+        for column in _reachable_columns(state):
+            placements.append((column, rotations, [encode_jewel(jewel) for jewel in jewel_order]))
+
+    field = state.clone()
+    for row, column in state._faller.positions():
+        field._set_cell(row, column, EMPTY)
+
+    batch = FieldBatch.from_field(field._field, len(placements))
+    batch.drop_fallers([codes for column, rotations, codes in placements],
+                       [column for column, rotations, codes in placements])
+    cleared, cascades = batch.settle()
+    scores = _CLEARED_JEWEL_WEIGHT * cleared + _CASCADE_WEIGHT * cascades + evaluate_fields(batch)
+    scores[batch.game_over()] = float("-inf")
+
+    best = int(numpy.argmax(scores))
+    return Placement(placements[best][0] + 1, placements[best][1], float(scores[best]))
+
+def _reachable_columns(state: GameState) -> list[int]:
+    """ Returns the column indices the active faller can be shifted to from where it is now,
+        in the same order as _placements(): its own column, then to the left, then to the right. """
+
+    start_column = state._faller.column
+    columns = [start_column]
+    for column_delta in (-1, 1):
+        column = start_column + column_delta
+        while 0 <= column < state.columns() and \
+            all(state._field[row][column] == EMPTY for row, faller_column in state._faller.positions()):
+            columns.append(column)
+            column += column_delta
+
+    return columns
+
+def _placements(state: GameState):
+    """ Yields (column, rotations, settled state, reward) for every distinct way to drop
+        the active faller: each rotation in each column it can be shifted to from where
+        it is now. The settled state is a copy after the faller froze and every match
+        cascade cleared, and the reward scores the jewels and cascades cleared. """
+
+    start_column = state._faller.column
+    jewel_orders = set()
+
+    for rotations in range(3):
+        rotated_state = state.clone()
+        for i in range(rotations):
+            rotated_state.rotate_faller()
+        jewel_order = tuple(rotated_state._faller.jewels)
+        if jewel_order in jewel_orders: # rotating a faller of identical jewels changes nothing
+            continue
+        jewel_orders.add(jewel_order)
+
+        yield (start_column + 1, rotations) + _drop(rotated_state.clone())
+        for direction in ("left", "right"):
+            shifted_state = rotated_state
+            for shifts in range(1, state.columns()):
+                shifted_state = shifted_state.clone()
+                try:
+                    shifted_state.shift_faller(direction)
+                except InvalidMoveError:
+                    break
+                column = start_column + (shifts if direction == "right" else -shifts)
+                yield (column + 1, rotations) + _drop(shifted_state.clone())
+
+def _drop(state: GameState) -> tuple[GameState, float]:
+    """ Ticks the state until the active faller froze and every match cascade cleared.
+        Returns the settled state and the reward for what was cleared. """
+
+    while state._faller is not None:
+        state.tick()
+
+    reward = 0.0
+    if not state.game_over():
+        cleared_matches, field = state.resolve_cascades()
+        reward += _CLEARED_JEWEL_WEIGHT * sum(len(matches) for matches in cleared_matches)
+        reward += _CASCADE_WEIGHT * max(len(cleared_matches) - 1, 0) # every clear after the first is a cascade
+
+    return (state, reward)
@@ -0,0 +1,48 @@
+class Faller:
+    __slots__ = ('jewels', 'top_row', 'column')
+
+    def __init__(self, jewels: list, top_row: int, column: int) -> None:
+        """ The active faller: its jewels from top to bottom, the row index of its
+            top jewel and its column index. Moving, shifting and rotating it only
+            update these in place; the positions of its jewels are derived from them.
+            Check for a missing faller with "is None", since == calls __eq__ below. """
+
+        self.jewels = list(jewels)
+        self.top_row = top_row
+        self.column = column
+
+    def bottom_row(self) -> int:
+        """ Returns the row index of the faller's bottom jewel. """
+        return self.top_row + len(self.jewels) - 1
+
+    def positions(self) -> list[list[int]]:
+        """ Returns the [row, column] field indices of each jewel, from top to bottom. """
+        return [[self.top_row + i, self.column] for i in range(len(self.jewels))]
+
+    def rotate(self) -> None:
+        """ Moves the bottom jewel to the top, shifting the others down. """
+        self.jewels.insert(0, self.jewels.pop())
+
+    def copy(self) -> 'Faller':
+        return Faller(self.jewels, self.top_row, self.column)
+
+    def __getitem__(self, key: str):
+        """ Reads the faller like the dictionary it used to be: 'jewels' or 'positions'. """
+
+        if key == 'jewels':
+            return self.jewels
+        elif key == 'positions':
+            return self.positions()
+        raise KeyError(key)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Faller):
+            return (self.jewels, self.top_row, self.column) == (other.jewels, other.top_row, other.column)
+        elif isinstance(other, dict): # the dictionary fallers used to be, as in the original tests
+            return {'jewels': self.jewels, 'positions': self.positions()} == other
+        return NotImplemented
+
+    __hash__ = None # fallers change in place, so they can't be dictionary keys
+
+    def __repr__(self) -> str:
+        return f"Faller({self.jewels!r}, {self.top_row}, {self.column})"
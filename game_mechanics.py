@@ -1,24 +1,95 @@
 from matching_mechanics import (_check_horizontal_matches, 
                                _check_vertical_matches, 
-                               _check_diagonal_matches)
+                               _check_diagonal_matches,
+                               _check_matches_through_cells)
+
+import copy
+import struct
+from typing import NamedTuple
+
+from array_field import ArrayField, encode_jewel, decode_jewel
+from faller import Faller
 
 from game_mechanics_errors import (FallerAlreadyActiveError, FallerNotActiveError,
-                                    InvalidFallerJewelNumbers, InvalidMoveError,
-                                    InvalidColumnError)
+                                    InvalidFallerJewelNumbers, InvalidMoveError, InvalidJewelError,
+                                    InvalidColumnError, MatchVerificationError,
+                                    InvalidSnapshotError, HashVerificationError)
 
 EMPTY = 0 # represents an empty cell in the field
 
+# status of each cell in the field, as returned by cell_status() and cell_statuses()
+CELL_EMPTY = 0
+CELL_FALLING = 1 # part of the active faller while it is falling
+CELL_LANDED = 2 # part of the active faller once it has landed
+CELL_FROZEN = 3 # a frozen jewel
+CELL_MATCHED = 4 # a frozen jewel that is part of a match about to be cleared
+
+# kinds of change reported by last_changes(), each with its details
+CHANGE_FALLER_CREATED = "faller_created" # (jewels, column index)
+CHANGE_FALLER_MOVED = "faller_moved" # (row index of the top jewel, column index), after a tick or shift
+CHANGE_FALLER_ROTATED = "faller_rotated" # (jewels,)
+CHANGE_FALLER_LANDED = "faller_landed" # ()
+CHANGE_FALLER_FALLING = "faller_falling" # (), the faller was shifted off what it landed on
+CHANGE_FALLER_FROZEN = "faller_frozen" # (positions of its jewels,)
+CHANGE_MATCHES_MARKED = "matches_marked" # (matched cells,)
+CHANGE_MATCHES_CLEARED = "matches_cleared" # (cleared cells,)
+CHANGE_GAME_OVER = "game_over" # ()
+
+# binary snapshot layout: magic, version, rows, columns, flags, number of matches
+_SNAPSHOT_MAGIC = b"CLMN"
+_SNAPSHOT_VERSION = 2 # version 1 stored the counts in 16 bits, too few for the matches of large fields
+_SNAPSHOT_HEADER = struct.Struct("<4sBIIBI")
+_SNAPSHOT_FALLER = struct.Struct("<3sII") # jewels, row of the top jewel, column
+_SNAPSHOT_MATCH = struct.Struct("<II") # row, column
+_FALLER_ACTIVE_FLAG = 1
+_FALLER_LANDED_FLAG = 2
+_MATCH_FOUND_PREVIOUS_TICK_FLAG = 4
+_GAME_OVER_FLAG = 8
+_DECODED_JEWELS = [decode_jewel(code) for code in range(256)] # lookup table from byte to jewel
+
+_HASH_MASK = 0xFFFFFFFFFFFFFFFF # position hashes are 64 bit
+_GAME_OVER_HASH_INDEX = 1 << 62 # hash key indices that can't collide with any cell's
+_MATCH_FOUND_PREVIOUS_TICK_HASH_INDEX = (1 << 62) + 1
+_JEWEL_HASH_CODES = {chr(code): code for code in range(1, 256)} # jewel -> small int, see _jewel_hash_code
+
+class StateChanges(NamedTuple):
+    """ What a single call that changes a GameState changed. """
+    cells: tuple # (row, column, jewel) of every cell that was written, jewel is EMPTY if cleared
+    events: tuple # (kind, details) of every change to the faller, matches and game, in order
+
+
 class GameState:
-    def __init__(self, dimensions: tuple) -> None:
-        """ Initializes GameState object with all required attributes. """
+    def __init__(self, dimensions: tuple, verify_matches: bool = False, array_field: bool = False,
+                 verify_hash: bool = False) -> None:
+        """ Initializes GameState object with all required attributes. 
+            If verify_matches is True, every incremental match check is compared
+            against a full scan of the field. If array_field is True, the field is 
+            stored as a compact numpy grid with vectorized matching and gravity.
+            If verify_hash is True, the incremental position hash is compared against
+            a full recompute every time it is read. """
 
         self._rows, self._columns = dimensions
-        self._field = self._initialize_field() # creates two "hidden" rows to help manage the new fallers offscreen
+        if array_field:
+            self._field = ArrayField(self._rows + 2, self._columns) # also has the two "hidden" rows
+        else:
+            self._field = self._initialize_field() # creates two "hidden" rows to help manage the new fallers offscreen
         self._faller = None # no faller in beginning by default
         self._faller_landed = False
         self._matches = [] # will contain tuples of coordinates representing locations of current matches
         self._match_found_previous_tick = False # matches found on one tick, then removed on the subsequent tick
         self._game_over = False 
+        self._verify_matches = verify_matches # debug mode: check incremental matches against a full scan
+        self._changed_cells = set() # cells whose contents or appearance changed since they were last taken
+        self._cell_statuses = [[CELL_EMPTY] * self._columns for i in range(self._rows + 2)]
+        self._stale_cell_statuses = set() # cells whose status must be recomputed before it is read
+        self._cell_hash_keys = [[0] * self._columns for i in range(self._rows + 2)] # zobrist key of each cell
+        self._cells_hash = 0 # XOR of every cell's zobrist key, updated when the position hash is read
+        self._stale_cell_hashes = set() # cells whose zobrist key must be recomputed before the hash is read
+        self._verify_hash = verify_hash # debug mode: check the incremental hash against a full recompute
+        self._shared_rows = set() # row indices whose lists are shared with a clone, copied on their first write
+        self._call_cells = [] # cells written by the latest call that changed the game, may repeat
+        self._call_events = [] # (kind, details) of the changes made by the latest call
+        self._instrumented_methods = () # names of the methods a Profiler wrapped on this game
     
     def rows(self) -> int:
         """ Returns number of visible rows in the field. """
@@ -42,6 +113,7 @@ class GameState:
         """ Given a 2D list of jewels from user input, the field is 
             filled with them and brings all floating jewels down. """
 
+        self._begin_changes()
         self._load_initial_jewel_positions(jewels)
         self._bring_floating_jewels_down()
         self._update_new_matches() # check for any matches that occur by default 
@@ -54,135 +126,280 @@ class GameState:
         # only check for matches when no active faller
         # when a match is found, display the matches but don't delete immediately  
         
-        if self._faller == None and not self._match_found_previous_tick:
+        self._begin_changes()
+        if self._faller is None and not self._match_found_previous_tick:
             raise FallerNotActiveError() 
             # entering an empty line with no active faller and all frozen jewels is invalid move-- nothing changes
-        elif self._faller == None and self._match_found_previous_tick: 
+        elif self._faller is None and self._match_found_previous_tick: 
             # removes any matched jewels on the tick AFTER they are displayed, and bring floating jewels down
-            self._clear_matched_jewels()
-            self._bring_floating_jewels_down()
-            self._update_new_matches() # check for any subsequent matches    
-
-            # check for rare case where leftover faller jewel is still out of the field. 
-            # check if any frozen jewels outside field
-            if self._check_out_of_bounds_frozen_jewels():
-                self._game_over = True
+            self._clear_matches_and_bring_jewels_down()
             return False   
-        elif self._faller != None and self._collision_next_tick() and not self._faller_landed:
-            # changes the faller to its landing state with bars | | (previously had brackets [ ])            
-            self._move_faller_down()
-            self._faller_landed = True
+        elif self._faller is not None and self._collision_next_tick() and not self._faller_landed:
+            self._land_faller()
             return False 
-        elif self._faller != None and self._faller_landed and len(self._matches) == 0:
-            # freezes faller in its current position, removes the bars | |
-            # check for any potential new matches upon being FROZEN
-
-            new_matches_found = self._update_new_matches()
-            if new_matches_found:
-                self._faller = None # deactivates faller   
-                self._faller_landed = False
-                return False
-            else:
-                if self._check_out_of_bounds_faller():
-                    self._game_over = True
-                    
-                self._faller = None # deactivates faller   
-                self._faller_landed = False
-                return False
+        elif self._faller is not None and self._faller_landed and len(self._matches) == 0:
+            self._freeze_faller()
+            return False
 
         # if no collisions on next tick or matches to clear, then the faller is shifted down one row
         self._move_faller_down()
         return True
     
+    def resolve_cascades(self) -> tuple[list[list[tuple]], list[list[str]]]:
+        """ Clears the current matches, brings the floating jewels down and clears any new
+            matches that form, until the field is stable or the game is over. Gives the same
+            result as ticking until the matches are gone, without the ticks that display them.
+            Returns the list of matches cleared at each step and a copy of the final field. """
+
+        self._begin_changes()
+        if self._faller is not None:
+            raise FallerAlreadyActiveError()
+
+        cleared_matches = []
+        while self._match_found_previous_tick and not self._game_over:
+            cleared_matches.append(self._matches)
+            self._clear_matches_and_bring_jewels_down()
+
+        if isinstance(self._field, ArrayField):
+            return (cleared_matches, self._field.to_list())
+        return (cleared_matches, [list(row) for row in self._field])
+
     def game_over(self) -> bool:
         """ Returns True if game is over (parts of faller frozen out of field)
             and False if game is still running.  """
         
         return self._game_over
+
+    def last_changes(self) -> StateChanges:
+        """ Returns what the latest call to fill_initial_field, tick, resolve_cascades, 
+            create_faller, rotate_faller or shift_faller changed: the cells it wrote 
+            (each once, with its jewel now) and the events it caused, in order. """
+
+        cells = sorted(set(self._call_cells))
+        return StateChanges(tuple((row, column, self._field[row][column]) for row, column in cells),
+                            tuple(self._call_events))
                
     def create_faller(self, jewels: list, column: int) -> None:
         """ Creates a new faller given a list of jewels and the column
             where they should start falling. """
         
+        self._begin_changes()
         if not self._require_valid_faller_conditions(jewels, column):
             return
         
-        new_faller = dict()
-        new_faller['jewels'] = jewels
-        new_faller['positions'] = []
+        new_faller = Faller(jewels, 0, column - 1) # subtract one from column to convert to list index
 
-        # initialize coordinate positions for each of the jewels and update the field with those positions
+        # update the field with the new faller's jewels
         for i in range(len(jewels)):        
-            new_faller['positions'].append([i, column - 1]) # subtract one from column to convert to list index
-            self._field[i][column - 1] = jewels[i] # update field with the new faller jewel
+            self._set_cell(i, column - 1, jewels[i])
+
+        self._record_change(CHANGE_FALLER_CREATED, (tuple(new_faller.jewels), new_faller.column))
 
         # handle case where newly created faller immediately lands 
-        bottom_row = new_faller['positions'][-1][0]
-        bottom_column = new_faller['positions'][-1][1]
-        if self._field[bottom_row + 1][bottom_column] != EMPTY:
+        if self._field[new_faller.bottom_row() + 1][new_faller.column] != EMPTY:
             self._faller_landed = True
+            self._record_change(CHANGE_FALLER_LANDED)
             
         self._faller = new_faller
 
     
-    def rotate_faller(self) -> dict:
-        """ Rotates the jewels in the faller and returns the new faller. """
+    def rotate_faller(self) -> Faller:
+        """ Rotates the jewels in the faller and returns the faller. """
         
-        if self._faller == None:
+        self._begin_changes()
+        if self._faller is None:
             raise FallerNotActiveError()
         
-        faller_jewel_list = self._faller['jewels']
-        rotated_jewel_list = faller_jewel_list[2:] + faller_jewel_list[:2] # shift last jewel to front
-
-        # create new faller with the shifted jewels, but same positions 
-        new_faller = dict()
-        new_faller['jewels'] = rotated_jewel_list
-        new_faller['positions'] = self._faller['positions']
-        self._faller = new_faller 
-
-        # update game state field to reflect the new faller's position
-        for i in range(len(self._faller['positions'])):
-            row = self._faller['positions'][i][0]
-            column = self._faller['positions'][i][1]
-            self._field[row][column] = self._faller['jewels'][i]
-
-        return new_faller
+        faller = self._faller
+        faller.rotate() # shift last jewel to front, in the same positions
+        self._record_change(CHANGE_FALLER_ROTATED, (tuple(faller.jewels),))
+
+        # update game state field to reflect the faller's new jewels
+        for i in range(len(faller.jewels)):
+            self._set_cell(faller.top_row + i, faller.column, faller.jewels[i])
+
+        return faller
     
     def shift_faller(self, direction: str) -> bool:
         """ Shifts currently active faller to either left or right.
             Returns True if successfully shifted in the given direction. """
 
         # make sure faller is shifted in the appropriate situation
+        self._begin_changes()
         self._require_valid_shift_conditions(direction)
             
         # if no collision, then modify the faller AND the field
-        for i in range(len(self._faller['positions'])):
-            coords = self._faller['positions'][i]
-            self._field[coords[0]][coords[1]] = EMPTY
-            if direction == "left":
-                self._faller['positions'][i] = [coords[0], coords[1] - 1]
-                self._field[coords[0]][coords[1] - 1] = self._faller['jewels'][i]
-            elif direction == "right":
-                self._faller['positions'][i] = [coords[0], coords[1] + 1]
-                self._field[coords[0]][coords[1] + 1] = self._faller['jewels'][i]
+        faller = self._faller
+        for i in range(len(faller.jewels)):
+            self._set_cell(faller.top_row + i, faller.column, EMPTY)
+        if direction == "left":
+            faller.column -= 1
+        elif direction == "right":
+            faller.column += 1
+        for i in range(len(faller.jewels)):
+            self._set_cell(faller.top_row + i, faller.column, faller.jewels[i])
+        self._record_change(CHANGE_FALLER_MOVED, (faller.top_row, faller.column))
             
         # if shifting the faller causes it to be floating, take it out of its landing status (and vice versa)
+        faller_was_landed = self._faller_landed
         if self._faller_currently_floating():
             self._faller_landed = False
         else:
             self._faller_landed = True
+        if self._faller_landed != faller_was_landed:
+            self._record_change(CHANGE_FALLER_LANDED if self._faller_landed else CHANGE_FALLER_FALLING)
+        self._mark_cells_changed(faller.positions()) # faller is drawn differently once landed
         
         return True
     
+    def clone(self) -> 'GameState':
+        """ Returns an independent copy of the game. The rows of the field (and of the
+            cell statuses) are shared copy-on-write: the copy and the original only copy
+            a row the first time they write to it, so a clone costs O(rows), not O(cells). """
+
+        clone = copy.copy(self)
+        if isinstance(self._field, ArrayField):
+            clone._field = self._field.copy()
+        else:
+            clone._field = list(self._field)
+        if self._faller is not None:
+            clone._faller = self._faller.copy()
+        clone._matches = list(self._matches)
+        clone._changed_cells = set(self._changed_cells)
+        clone._cell_statuses = list(self._cell_statuses)
+        clone._stale_cell_statuses = set(self._stale_cell_statuses)
+        clone._stale_cell_hashes = set(self._stale_cell_hashes)
+        clone._cell_hash_keys = list(self._cell_hash_keys)
+        clone._call_cells = list(self._call_cells)
+        clone._call_events = list(self._call_events)
+        for name in self._instrumented_methods: # clones (ex: for bot searches) aren't profiled
+            delattr(clone, name)
+        clone._instrumented_methods = ()
+
+        # both games now share every row, so neither can write to one without copying it first
+        self._shared_rows = set(range(len(self._cell_statuses)))
+        clone._shared_rows = set(self._shared_rows)
+
+        return clone
+
+    def take_changed_cells(self) -> set:
+        """ Returns the set of (row, column) field indices whose jewel or appearance 
+            (falling, landed, frozen or matched) changed since the last call,
+            and starts tracking changes again from scratch. """
+
+        changed_cells = self._changed_cells
+        self._changed_cells = set()
+        return changed_cells
+
+    def to_bytes(self) -> bytes:
+        """ Returns a compact binary snapshot of the game: a small header with the
+            dimensions and flags, the faller, the current matches, and then one byte 
+            per cell of the field (0 for empty, otherwise the jewel's character code). """
+
+        flags = 0
+        if self._faller is not None:
+            flags |= _FALLER_ACTIVE_FLAG
+        if self._faller_landed:
+            flags |= _FALLER_LANDED_FLAG
+        if self._match_found_previous_tick:
+            flags |= _MATCH_FOUND_PREVIOUS_TICK_FLAG
+        if self._game_over:
+            flags |= _GAME_OVER_FLAG
+
+        snapshot = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, self._rows, self._columns,
+                                          flags, len(self._matches))]
+        if self._faller is not None:
+            faller_jewels = bytes(encode_jewel(jewel) for jewel in self._faller.jewels)
+            snapshot.append(_SNAPSHOT_FALLER.pack(faller_jewels, self._faller.top_row, self._faller.column))
+        for row, column in self._matches:
+            snapshot.append(_SNAPSHOT_MATCH.pack(row, column))
+
+        if isinstance(self._field, ArrayField):
+            snapshot.append(self._field.to_bytes())
+        else:
+            snapshot.append(bytes(encode_jewel(jewel) for row in self._field for jewel in row))
+
+        return b"".join(snapshot)
+
+    @classmethod
+    def from_bytes(cls, snapshot: bytes, verify_matches: bool = False, array_field: bool = False,
+                   verify_hash: bool = False) -> 'GameState':
+        """ Returns a new GameState restored exactly from a snapshot made by to_bytes(). """
+
+        if len(snapshot) < _SNAPSHOT_HEADER.size:
+            raise InvalidSnapshotError("snapshot is too short")
+        magic, version, rows, columns, flags, match_count = _SNAPSHOT_HEADER.unpack_from(snapshot, 0)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise InvalidSnapshotError("not a GameState snapshot of a supported version")
+
+        expected_size = _SNAPSHOT_HEADER.size + match_count * _SNAPSHOT_MATCH.size + (rows + 2) * columns
+        if flags & _FALLER_ACTIVE_FLAG:
+            expected_size += _SNAPSHOT_FALLER.size
+        if len(snapshot) != expected_size:
+            raise InvalidSnapshotError(f"snapshot should be {expected_size} bytes long, not {len(snapshot)}")
+
+        state = cls((rows, columns), verify_matches, array_field, verify_hash)
+        offset = _SNAPSHOT_HEADER.size
+
+        if flags & _FALLER_ACTIVE_FLAG:
+            faller_jewels, top_row, column = _SNAPSHOT_FALLER.unpack_from(snapshot, offset)
+            offset += _SNAPSHOT_FALLER.size
+            state._faller = Faller([_DECODED_JEWELS[code] for code in faller_jewels], top_row, column)
+
+        state._matches = [_SNAPSHOT_MATCH.unpack_from(snapshot, offset + i * _SNAPSHOT_MATCH.size)
+                          for i in range(match_count)]
+        offset += match_count * _SNAPSHOT_MATCH.size
+
+        if array_field:
+            state._field.load_bytes(snapshot[offset:])
+        else:
+            state._field = [[_DECODED_JEWELS[code] for code in snapshot[row_start:row_start + columns]]
+                            for row_start in range(offset, len(snapshot), columns)]
+
+        state._faller_landed = bool(flags & _FALLER_LANDED_FLAG)
+        state._match_found_previous_tick = bool(flags & _MATCH_FOUND_PREVIOUS_TICK_FLAG)
+        state._game_over = bool(flags & _GAME_OVER_FLAG)
+        state._mark_cells_changed(state._cells_above({column: state.last_row_index() for column in range(columns)}))
+
+        return state
+
     def coordinate_in_faller(self, coordinates: tuple) -> bool:
         """ Returns True if the given coordinate position on the field is 
             occupied by an active faller, otherwise returns False. """
 
-        if self._faller != None: 
-            if list(coordinates) in self._faller['positions']:
-                return True
-        
-        return False
+        return self.cell_status(coordinates) in (CELL_FALLING, CELL_LANDED)
+
+    def cell_status(self, coordinates: tuple) -> int:
+        """ Returns the status (CELL_EMPTY, CELL_FALLING, CELL_LANDED, CELL_FROZEN 
+            or CELL_MATCHED) of the cell at the given (row, column) field index. """
+
+        row, column = coordinates
+        return self.cell_statuses()[row][column]
+
+    def position_hash(self) -> int:
+        """ Returns a 64 bit Zobrist hash of the position: every jewel in the field with
+            its status (so the faller and its landed state are included), plus the game
+            over and pending match flags. Updated incrementally from the changed cells. """
+
+        if len(self._stale_cell_hashes) > 0:
+            self._refresh_cell_hashes()
+
+        position_hash = self._cells_hash ^ self._flags_hash()
+        if self._verify_hash:
+            expected_hash = self._compute_position_hash()
+            if position_hash != expected_hash:
+                raise HashVerificationError(position_hash, expected_hash)
+
+        return position_hash
+
+    def cell_statuses(self) -> list[list[int]]:
+        """ Returns a 2D list with the status of every cell in the field (including
+            the two hidden rows), indexed the same way as the field. 
+            The list is updated in place, so it should not be modified. """
+
+        if len(self._stale_cell_statuses) > 0:
+            self._refresh_cell_statuses()
+        return self._cell_statuses
     
     # ------------------- Protected methods ----------------------- #
             
@@ -190,30 +407,40 @@ class GameState:
         """ Returns True if any part of the active faller is out of bounds of the field,
             returns false if otherwise. """
 
-        if self._faller != None:
-            for coord in self._faller['positions']:
-                row_index = coord[0]
-                if row_index <= 1: 
-                    return True
+        if self._faller is not None and self._faller.top_row <= 1:
+            return True
                             
         return False
     
-    def _check_out_of_bounds_frozen_jewels(self) -> bool:
+    def _check_out_of_bounds_frozen_jewels(self, columns = None) -> bool:
+        """ Returns True if there are jewels in the two hidden rows of the given column
+            indices (or of every column if none are given), otherwise returns False. """
+
+        if columns is None:
+            columns = range(len(self._field[0]))
+
         for row_index in range(0, 2):
-            for column_index in range(len(self._field[0])):
+            for column_index in columns:
                 if self._field[row_index][column_index] != EMPTY:
                     return True
         
         return False
 
-    def _update_new_matches(self) -> bool:
+    def _update_new_matches(self, changed_cells: list = None) -> bool:
         """ Looks for new matches and updates the game state matches and field 
-            attributes. Returns True if new matches found, otherwise returns False.  """
+            attributes. Returns True if new matches found, otherwise returns False. 
+            If the cells changed since the last check are given, only the matches 
+            running through them are searched for, otherwise the whole field is scanned. """
         
-        new_matches = self._check_matches()
+        if changed_cells is None:
+            new_matches = self._check_matches()
+        else:
+            new_matches = self._check_matches_incrementally(changed_cells)
         self._matches = new_matches
+        self._mark_cells_changed(self._matches) # matched jewels are drawn differently
 
         if len(self._matches) > 0: # if matches found, they are displayed on current tick and removed on next tick
+            self._record_change(CHANGE_MATCHES_MARKED, (tuple(self._matches),))
             self._match_found_previous_tick = True
             return True
         else: 
@@ -224,6 +451,9 @@ class GameState:
         """ Returns a list of tuple coordinates in the field containing all of the 
             matches in the current game state. Returns empty list if no matches. """
 
+        if isinstance(self._field, ArrayField): # vectorized kernels find all three kinds of match at once
+            return self._field.find_matches()
+
         current_matches = []
 
         horizontal_matches = _check_horizontal_matches(self._field)
@@ -235,12 +465,26 @@ class GameState:
 
         return current_matches
 
+    def _check_matches_incrementally(self, changed_cells: list) -> list[tuple]:
+        """ Returns a list of tuple coordinates containing all of the matches that 
+            run through the given changed cells. Since the field has no matches left
+            after every check, this is the same as the result of a full scan. """
+
+        current_matches = _check_matches_through_cells(self._field, changed_cells)
+
+        if self._verify_matches:
+            expected_matches = self._check_matches()
+            if set(current_matches) != set(expected_matches):
+                raise MatchVerificationError(current_matches, expected_matches)
+
+        return current_matches
+
     def _faller_currently_floating(self) -> bool:
         """ Returns True if the active faller is currently floating 
             (no frozen jewels) directly below it, otherwise returns False. """
 
-        bottom_row_index = self._faller['positions'][-1][0] # use lowest jewel to determine if floating
-        faller_column_index = self._faller['positions'][-1][1]
+        bottom_row_index = self._faller.bottom_row() # use lowest jewel to determine if floating
+        faller_column_index = self._faller.column
         if bottom_row_index + 1 <= self.last_row_index() and \
             self._field[bottom_row_index + 1][faller_column_index] == EMPTY:
             return True
@@ -260,26 +504,22 @@ class GameState:
     def _move_faller_down(self):
         """ Moves currently active faller down one row. """
 
-        top_jewel_row = self._faller['positions'][0][0] # row index of topmost jewel, will have to reset to EMPTY later
+        faller = self._faller
+        top_jewel_row = faller.top_row # row index of topmost jewel, will have to reset to EMPTY later
+        faller.top_row += 1 # update faller (make go down one square)
             
-        for i in range(len(self._faller['positions'])):
-            # update faller (make go down one square)
-            self._faller['positions'][i][0] += 1
-                
-            row = self._faller['positions'][i][0]
-            column = self._faller['positions'][i][1]
-
-            # update field 
-            self._field[row][column] = self._faller['jewels'][i]
+        # update field 
+        for i in range(len(faller.jewels)):
+            self._set_cell(faller.top_row + i, faller.column, faller.jewels[i])
         
-        self._field[top_jewel_row][column] = EMPTY
+        self._set_cell(top_jewel_row, faller.column, EMPTY)
+        self._record_change(CHANGE_FALLER_MOVED, (faller.top_row, faller.column))
     
     def _collision_next_tick(self):
         """ Check if the next tick will have a collision (either with bottom of field
             or with a frozen jewel) that will cause it to become in "landed" status. """
 
-        bottom_jewel_coordinates = self._faller['positions'][-1]
-        bottom_jewel_row, bottom_jewel_column = bottom_jewel_coordinates
+        bottom_jewel_row, bottom_jewel_column = self._faller.bottom_row(), self._faller.column
         if not self._faller_landed:
             if bottom_jewel_row + 2 >= self._rows + 2: # check 2 indices ahead because landed status is right before they collide
                 return True    
@@ -288,15 +528,189 @@ class GameState:
         
         return False
 
-    def _clear_matched_jewels(self) -> None:
+    def _land_faller(self) -> None:
+        """ Moves the faller onto whatever is below it and changes it to its landing 
+            state with bars | | (previously had brackets [ ]). """
+
+        self._move_faller_down()
+        self._faller_landed = True
+        self._record_change(CHANGE_FALLER_LANDED)
+        self._mark_cells_changed(self._faller.positions()) # faller is drawn differently once landed
+
+    def _freeze_faller(self) -> None:
+        """ Freezes the landed faller in its current position, removes the bars | |
+            and checks for any potential new matches upon being FROZEN. """
+
+        faller_positions = self._faller.positions()
+        self._record_change(CHANGE_FALLER_FROZEN, (faller_positions,))
+        new_matches_found = self._update_new_matches(faller_positions)
+        self._mark_cells_changed(faller_positions) # frozen jewels are drawn differently than landed ones
+        if not new_matches_found and self._check_out_of_bounds_faller():
+            self._game_over = True
+            self._record_change(CHANGE_GAME_OVER)
+
+        self._faller = None # deactivates faller   
+        self._faller_landed = False
+
+    def _clear_matches_and_bring_jewels_down(self) -> None:
+        """ Removes the matched jewels, brings the jewels above them down, and looks for
+            the new matches that formed. Ends the game if jewels are left out of the field. """
+
+        cleared_rows = self._clear_matched_jewels()
+        # only the compacted cells changed, so only look for subsequent matches through them
+        self._update_new_matches(self._bring_jewels_down_into_cleared_cells(cleared_rows))
+
+        # check for rare case where leftover faller jewel is still out of the field. 
+        # check if any frozen jewels outside field (only the faller's column can have any, and it was cleared)
+        if self._check_out_of_bounds_frozen_jewels(cleared_rows.keys()):
+            self._game_over = True
+            self._record_change(CHANGE_GAME_OVER)
+
+    def _bring_jewels_down_into_cleared_cells(self, cleared_rows: dict) -> list[tuple]:
+        """ Brings the jewels above the cleared cells (see _clear_matched_jewels) down,
+            and returns every cell that may have changed. """
+
+        if isinstance(self._field, ArrayField):
+            changed_columns = self._bring_floating_jewels_down(cleared_rows.keys())
+            return self._cells_above({column: max(cleared_rows[column]) for column in changed_columns})
+        return self._drop_jewels_into_cleared_cells(cleared_rows)
+
+    def _clear_matched_jewels(self) -> dict:
         """ Remove the matched jewels from the field (so they are no longer displayed)
-            and reset the matches attribite. """
+            and reset the matches attribite. Returns a dictionary mapping each column 
+            that had jewels removed to the list of row indices removed in that column. """
 
+        self._record_change(CHANGE_MATCHES_CLEARED, (tuple(self._matches),))
+        cleared_rows = dict()
         for coord in self._matches:
             row, column = coord
-            self._field[row][column] = EMPTY
+            self._set_cell(row, column, EMPTY)
+            cleared_rows.setdefault(column, []).append(row)
         self._matches = []
 
+        return cleared_rows
+
+    def _cells_above(self, lowest_rows: dict) -> list[tuple]:
+        """ Given a dictionary mapping columns to row indices, returns the coordinates 
+            of every cell in those columns at or above the given row. These are the
+            only cells that can change when floating jewels are brought down. """
+
+        cells = []
+        for column, lowest_row in lowest_rows.items():
+            for row in range(lowest_row + 1):
+                cells.append((row, column))
+
+        return cells
+
+    def _set_cell(self, row: int, column: int, jewel) -> None:
+        """ Puts a jewel (or EMPTY) in a cell of the field and records that the cell changed. 
+            Every change to the field goes through this method. """
+
+        if row in self._shared_rows:
+            self._copy_shared_row(row)
+        self._field[row][column] = jewel
+        self._call_cells.append((row, column))
+        self._changed_cells.add((row, column))
+        self._stale_cell_statuses.add((row, column))
+        self._stale_cell_hashes.add((row, column))
+
+    def _begin_changes(self) -> None:
+        """ Starts recording the changes of a new call for last_changes(). """
+
+        self._call_cells.clear()
+        self._call_events.clear()
+
+    def _record_change(self, kind: str, details: tuple = ()) -> None:
+        self._call_events.append((kind, details))
+
+    def _mark_cells_changed(self, cells) -> None:
+        """ Records that the appearance of the given cells changed even though
+            their jewels may not have. """
+
+        for row, column in cells:
+            self._changed_cells.add((row, column))
+            self._stale_cell_statuses.add((row, column))
+            self._stale_cell_hashes.add((row, column))
+
+    def _refresh_cell_statuses(self) -> None:
+        """ Recomputes the status of every cell that changed since the statuses were last read. """
+
+        faller_cells, matched_cells = self._faller_and_matched_cells()
+
+        for row, column in self._stale_cell_statuses:
+            if row in self._shared_rows:
+                self._copy_shared_row(row)
+            self._cell_statuses[row][column] = self._compute_cell_status(row, column, faller_cells, matched_cells)
+
+        self._stale_cell_statuses = set()
+
+    def _refresh_cell_hashes(self) -> None:
+        """ Recomputes the zobrist key of every cell that changed since the position hash
+            was last read, and updates the hash to match. Only games that are hashed
+            (ex: by the bot) pay for this, not every read of the statuses. """
+
+        cell_statuses = self.cell_statuses()
+        for row, column in self._stale_cell_hashes:
+            if row in self._shared_rows:
+                self._copy_shared_row(row)
+            cell_hash_key = _zobrist_key(row, column, self._field[row][column], cell_statuses[row][column])
+            self._cells_hash ^= self._cell_hash_keys[row][column] ^ cell_hash_key # swap the old key for the new one
+            self._cell_hash_keys[row][column] = cell_hash_key
+
+        self._stale_cell_hashes = set()
+
+    def _copy_shared_row(self, row: int) -> None:
+        """ Gives this game its own copy of a row shared with a clone, before writing to it. """
+
+        if not isinstance(self._field, ArrayField): # the array field is copied whole when cloned
+            self._field[row] = list(self._field[row])
+        self._cell_statuses[row] = list(self._cell_statuses[row])
+        self._cell_hash_keys[row] = list(self._cell_hash_keys[row])
+        self._shared_rows.discard(row)
+
+    def _faller_and_matched_cells(self) -> tuple[set, set]:
+        """ Returns the sets of (row, column) cells in the active faller and in the current matches. """
+
+        faller_cells = set()
+        if self._faller is not None:
+            faller_cells = {(row, column) for row, column in self._faller.positions()}
+        return (faller_cells, set(self._matches))
+
+    def _compute_cell_status(self, row: int, column: int, faller_cells: set, matched_cells: set) -> int:
+        """ Returns the status of a cell from the field, faller and matches. """
+
+        if (row, column) in faller_cells:
+            return CELL_LANDED if self._faller_landed else CELL_FALLING
+        elif self._field[row][column] == EMPTY:
+            return CELL_EMPTY
+        elif (row, column) in matched_cells:
+            return CELL_MATCHED
+        return CELL_FROZEN
+
+    def _flags_hash(self) -> int:
+        """ Returns the part of the position hash that comes from the game's flags. """
+
+        flags_hash = 0
+        if self._game_over:
+            flags_hash ^= _hash_index(_GAME_OVER_HASH_INDEX)
+        if self._match_found_previous_tick:
+            flags_hash ^= _hash_index(_MATCH_FOUND_PREVIOUS_TICK_HASH_INDEX)
+        return flags_hash
+
+    def _compute_position_hash(self) -> int:
+        """ Computes the position hash from scratch over the whole field, without
+            using any of the incrementally updated statuses or keys. """
+
+        faller_cells, matched_cells = self._faller_and_matched_cells()
+
+        position_hash = self._flags_hash()
+        for row in range(len(self._field)):
+            for column in range(self._columns):
+                status = self._compute_cell_status(row, column, faller_cells, matched_cells)
+                position_hash ^= _zobrist_key(row, column, self._field[row][column], status)
+
+        return position_hash
+
     def _load_initial_jewel_positions(self, jewels: list[list[str]]) -> None:
         """ Load the field matrix with the user input of default jewels they 
             want to start with. """
@@ -305,26 +719,73 @@ class GameState:
         for i in range(len(jewels) - 1, -1, -1):
             for j in range(len(jewels[i])):
                 if jewels[i][j] == " ": # check this
-                    self._field[current_field_row][j] = EMPTY
+                    self._set_cell(current_field_row, j, EMPTY)
                 else:
-                    self._field[current_field_row][j] = jewels[i][j]
+                    self._set_cell(current_field_row, j, jewels[i][j])
             current_field_row -= 1
 
-    def _bring_floating_jewels_down(self) -> None:
+    def _bring_floating_jewels_down(self, columns = None) -> set:
         """ Look for any floating jewels (jewels with empty spaces directly below them)
-            and shift them down until there is no more empty space. """
-
-        for i in range(len(self._field) - 1, -1, -1): # exclude two "hidden" rows at the top
-            for j in range(len(self._field[i])):
-                current_row = i
-                while (self._field[current_row][j] != EMPTY and 
-                       current_row < self.last_row_index() and 
-                       self._field[current_row + 1][j] == EMPTY):
-                    
-                    self._field[current_row + 1][j] = self._field[current_row][j]
-                    self._field[current_row][j] = EMPTY 
-                    current_row += 1
+            and shift them down until there is no more empty space. Each column is 
+            compacted in one pass, keeping the order of its jewels. Only the given column
+            indices are compacted if any are given, otherwise every column is. 
+            Returns the set of column indices that actually changed. """
+
+        if isinstance(self._field, ArrayField):
+            changed_cells = []
+            changed_columns = self._field.bring_jewels_down(columns, changed_cells)
+            self._call_cells.extend(changed_cells) # written in bulk, so recorded here instead of by _set_cell
+            self._mark_cells_changed(changed_cells)
+            return changed_columns
+
+        if columns is None:
+            columns = range(self._columns)
+
+        changed_columns = set()
+        for j in columns:
+            column_jewels = [self._field[i][j] for i in range(len(self._field)) if self._field[i][j] != EMPTY]
+            first_jewel_row = len(self._field) - len(column_jewels) # jewels are stacked at the bottom of the column
+
+            for i in range(len(self._field)):
+                new_jewel = EMPTY if i < first_jewel_row else column_jewels[i - first_jewel_row]
+                if self._field[i][j] != new_jewel:
+                    self._set_cell(i, j, new_jewel)
+                    changed_columns.add(j)
+
+        return changed_columns
                     
+    def _drop_jewels_into_cleared_cells(self, cleared_rows: dict) -> list[tuple]:
+        """ Given a dictionary mapping columns to the row indices just cleared in them,
+            brings the jewels above those rows down into the gaps. Returns the cells that 
+            now hold a different jewel. Jewels only float after a clear, so each column is
+            walked up from its lowest cleared row to the top of its stack, never over the
+            empty cells above it: the cost depends on the jewels that move, not on the board. """
+
+        changed_cells = []
+        for column, rows in cleared_rows.items():
+            cleared = set(rows)
+            lowest_row = max(rows)
+
+            stacked_jewels = [] # jewels above the lowest cleared row, from the bottom up
+            row = lowest_row
+            while row >= 0 and (self._field[row][column] != EMPTY or row in cleared):
+                if self._field[row][column] != EMPTY:
+                    stacked_jewels.append(self._field[row][column])
+                row -= 1
+            stack_top_row = row # first empty cell above the stack, or -1
+
+            row = lowest_row
+            for jewel in stacked_jewels:
+                if self._field[row][column] != jewel:
+                    self._set_cell(row, column, jewel)
+                    changed_cells.append((row, column))
+                row -= 1
+            for row in range(row, stack_top_row, -1): # cells the stack came down from
+                if self._field[row][column] != EMPTY:
+                    self._set_cell(row, column, EMPTY)
+
+        return changed_cells
+
     def _initialize_field(self) -> list[list[str]]:
         """ Returns a 2D list representing the field with 
             2 default "hidden rows" for the fallers off-screen. """
@@ -348,12 +809,15 @@ class GameState:
             raise InvalidMoveError()
         elif column > self.columns() or column <= 0:
             raise InvalidColumnError()
-        elif self._faller != None: # make sure no other fallers are active
+        elif self._faller is not None: # make sure no other fallers are active
             raise FallerAlreadyActiveError()
         elif len(jewels) != 3: # a faller can only consist of exactly 3 jewels
             raise InvalidFallerJewelNumbers()
+        elif isinstance(self._field, ArrayField) and not all(_fits_in_byte(jewel) for jewel in jewels):
+            raise InvalidJewelError(f"the array-backed field can't store the jewels {jewels}")
         elif self._field[2][column - 1] != EMPTY: # user creates a faller in full column, causing game to end
             self._game_over = True
+            self._record_change(CHANGE_GAME_OVER)
             return False
         
         return True
@@ -363,15 +827,53 @@ class GameState:
             appropriatae situation. Throws an error if not, and returns True
             if valid conditions have been met. """
         
-        if self._faller == None:
+        if self._faller is None:
             raise FallerNotActiveError()
         
         # invalid move if there is a collision 
-        for coords in self._faller['positions']:
+        for coords in self._faller.positions():
             shifted_position = coords
             if direction == "left" and self._collision_on_shift(shifted_position, "left"):
                 raise InvalidMoveError()
             elif direction == "right" and self._collision_on_shift(shifted_position, "right"):
                 raise InvalidMoveError()
             
-        return True
\ No newline at end of file
+        return True
+
+
+def _fits_in_byte(jewel) -> bool:
+    """ Returns True if the jewel has a byte code (see encode_jewel). """
+
+    try:
+        encode_jewel(jewel)
+    except InvalidJewelError:
+        return False
+    return True
+
+def _zobrist_key(row: int, column: int, jewel, status: int) -> int:
+    """ Returns the zobrist key for a jewel with the given status in a cell (0 for empty cells).
+        Keys are derived from the cell, jewel and status instead of stored in a table, 
+        so they are the same in every process and for any size of field. """
+
+    if status == CELL_EMPTY:
+        return 0
+    return _hash_index((((row << 16) | column) << 16 | _jewel_hash_code(jewel)) << 3 | status)
+
+def _jewel_hash_code(jewel) -> int:
+    """ Returns the small int that stands for a jewel in zobrist keys. Jewels with a byte
+        code (see encode_jewel) keep it, so their keys are the same in every process;
+        any other jewel (ex: a multi-character string) is interned the first time it is hashed. """
+
+    code = _JEWEL_HASH_CODES.get(jewel)
+    if code is None:
+        code = len(_JEWEL_HASH_CODES) + 1
+        _JEWEL_HASH_CODES[jewel] = code
+    return code
+
+def _hash_index(index: int) -> int:
+    """ Scrambles an integer into a well distributed 64 bit key (splitmix64). """
+
+    index = (index + 0x9E3779B97F4A7C15) & _HASH_MASK
+    index = ((index ^ (index >> 30)) * 0xBF58476D1CE4E5B9) & _HASH_MASK
+    index = ((index ^ (index >> 27)) * 0x94D049BB133111EB) & _HASH_MASK
+    return index ^ (index >> 31)
@@ -10,10 +10,30 @@ class InvalidFallerJewelNumbers(Exception):
     """ Raised when more or less than 3 jewels are given to create a new faller. """
     pass
 
+class InvalidJewelError(Exception):
+    """ Raised when a jewel can't be stored in a byte (ex: in the array-backed field or a snapshot). """
+    pass
+
 class InvalidMoveError(Exception):
     """ Raised when user makes invalid move (ex: shifting faller to a freezed jewel or outside the field)"""
     pass
 
 class InvalidColumnError(Exception):
     """ Raised when user tries to create a faller in an out-of-bounds column. """
-    pass
\ No newline at end of file
+    pass
+
+class MatchVerificationError(Exception):
+    """ Raised in verification mode when the incremental match check disagrees with a full scan of the field. """
+    pass
+
+class InvalidSnapshotError(Exception):
+    """ Raised when restoring a GameState from bytes that are not a valid snapshot. """
+    pass
+
+class InvalidReplayError(Exception):
+    """ Raised when a replay file is malformed or does not replay to its recorded keyframes. """
+    pass
+
+class HashVerificationError(Exception):
+    """ Raised in verification mode when the incremental position hash disagrees with a full recompute. """
+    pass
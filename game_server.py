@@ -0,0 +1,529 @@
+import argparse
+import asyncio
+import collections
+import logging
+import multiprocessing
+import random
+import struct
+import time
+from typing import NamedTuple
+
+from game_mechanics import GameState, EMPTY
+from game_mechanics_errors import (FallerAlreadyActiveError, FallerNotActiveError, InvalidMoveError,
+                                   InvalidColumnError, InvalidFallerJewelNumbers)
+from array_field import encode_jewel, decode_jewel
+from simulation import JEWELS, _DEFAULT_DIMENSIONS
+
+_DEFAULT_HOST = "127.0.0.1"
+_DEFAULT_PORT = 8765
+_DEFAULT_SLOT_SECONDS = 0.01 # resolution of the timer wheel that schedules every session's gravity
+_DEFAULT_WHEEL_SLOTS = 512 # slots in the timer wheel, longer delays wrap around it
+_DEFAULT_GRAVITY_INTERVAL = 1.0 # seconds between gravity ticks of a session, same as the pygame game
+_MIN_SESSION_DIMENSIONS = (3, 1) # rows, columns, a faller is 3 jewels tall
+_MAX_SESSION_DIMENSIONS = (250, 250) # keeps every delta of a board (rows + 2 hidden) under 65536 cells
+_MAX_PUSH_BUFFER_BYTES = 1 << 20 # connections with more pushes than this waiting to be sent are dropped
+_JEWEL_CODES = frozenset(encode_jewel(jewel) for jewel in JEWELS) # the only jewels fallers can be made of
+
+_logger = logging.getLogger(__name__)
+
+# every message is a 4 byte length followed by that many bytes
+_FRAME_LENGTH = struct.Struct("<I")
+
+# client commands: a one byte command followed by its arguments
+CREATE_SESSION = 1
+CREATE_FALLER = 2
+SHIFT_LEFT = 3
+SHIFT_RIGHT = 4
+ROTATE = 5
+TICK = 6
+CLOSE_SESSION = 7
+_CREATE_SESSION_ARGUMENTS = struct.Struct("<HHI") # rows, columns, gravity interval in milliseconds (0 for none)
+_CREATE_FALLER_ARGUMENTS = struct.Struct("<I3sH") # session, jewels, column
+_SESSION_ARGUMENTS = struct.Struct("<I") # session
+
+# server messages: a reply to each command in the order they were sent, or a pushed gravity tick,
+# followed by the delta of the session's field
+_REPLY = 1
+_PUSH = 2
+_MESSAGE_HEADER = struct.Struct("<BBI") # message type, status (replies only), session
+_DELTA_HEADER = struct.Struct("<BH") # flags, number of changed cells
+_DELTA_CELL = struct.Struct("<HHBB") # row, column, jewel, cell status (see game_mechanics.CELL_)
+
+# reply statuses
+STATUS_OK = 0
+STATUS_REJECTED = 1 # the move isn't allowed in the current state of the game
+STATUS_UNKNOWN_SESSION = 2
+STATUS_SESSION_CLOSED = 3 # pushed (with no delta) when the server closes a session on its own
+
+# delta flags
+DELTA_GAME_OVER = 1
+DELTA_MATCHES_PENDING = 2
+
+_REJECTED_MOVE_ERRORS = (FallerAlreadyActiveError, FallerNotActiveError, InvalidMoveError,
+                         InvalidColumnError, InvalidFallerJewelNumbers)
+
+
+class TimerWheel:
+    def __init__(self, slot_seconds: float, slots: int, start_time: float) -> None:
+        """ Schedules timers for any number of keys with one list of slots, each
+            slot_seconds long, so scheduling, cancelling and expiring a timer are O(1)
+            no matter how many are pending. Delays longer than the wheel wrap around
+            it, counting how many more times they must pass their slot. """
+
+        self._slot_seconds = slot_seconds
+        self._slots = [dict() for i in range(slots)] # key -> number of turns of the wheel left
+        self._key_slots = dict() # key -> index of the slot it's in
+        self._current_slot = 0
+        self._next_slot_time = start_time + slot_seconds
+
+    def __len__(self) -> int:
+        return len(self._key_slots)
+
+    def schedule(self, key, delay: float) -> None:
+        """ Schedules the key to expire after delay seconds (at least one slot),
+            replacing its current timer if it has one. """
+
+        self.cancel(key)
+        slots = max(1, round(delay / self._slot_seconds))
+        slot = (self._current_slot + slots) % len(self._slots)
+        self._slots[slot][key] = (slots - 1) // len(self._slots)
+        self._key_slots[key] = slot
+
+    def cancel(self, key) -> None:
+        slot = self._key_slots.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def next_slot_time(self) -> float:
+        """ Returns the time the wheel next needs to advance. """
+        return self._next_slot_time
+
+    def advance(self, now: float) -> list:
+        """ Moves the wheel up to the given time and returns the keys that expired, in order. """
+
+        expired = []
+        while self._next_slot_time <= now:
+            self._current_slot = (self._current_slot + 1) % len(self._slots)
+            self._next_slot_time += self._slot_seconds
+
+            slot = self._slots[self._current_slot]
+            for key, turns in list(slot.items()):
+                if turns == 0:
+                    expired.append(key)
+                    del slot[key]
+                    del self._key_slots[key]
+                else:
+                    slot[key] = turns - 1
+
+        return expired
+
+
+class _ServerSession:
+    def __init__(self, state: GameState, writer: asyncio.StreamWriter, gravity_interval: float) -> None:
+        """ A game hosted by the server and the connection that owns it. """
+
+        self.state = state
+        self.writer = writer
+        self.gravity_interval = gravity_interval
+
+
+class GameServer:
+    def __init__(self, slot_seconds: float = _DEFAULT_SLOT_SECONDS, wheel_slots: int = _DEFAULT_WHEEL_SLOTS) -> None:
+        """ Hosts many games at once for clients connected over TCP. Each command is
+            answered with only the cells of the field that changed, and the gravity
+            ticks of every session are scheduled on one timer wheel and pushed to
+            the client that owns the session. """
+
+        self._slot_seconds = slot_seconds
+        self._wheel_slots = wheel_slots
+        self._sessions = dict() # session id -> _ServerSession
+        self._next_session_id = 1
+        self._wheel = None
+        self._server = None
+        self._wheel_task = None
+
+    def sessions(self) -> int:
+        """ Returns the number of sessions being hosted. """
+        return len(self._sessions)
+
+    async def start(self, host: str = _DEFAULT_HOST, port: int = 0) -> int:
+        """ Starts accepting connections and running gravity ticks, and returns the
+            port the server is listening on (a free port is chosen if port is 0). """
+
+        self._wheel = TimerWheel(self._slot_seconds, self._wheel_slots, asyncio.get_running_loop().time())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self._wheel_task = asyncio.create_task(self._run_wheel())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        self._wheel_task.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Answers the commands sent on one connection, in order, until it closes. """
+
+        owned_sessions = set()
+        try:
+            while True:
+                length = _FRAME_LENGTH.unpack(await reader.readexactly(_FRAME_LENGTH.size))[0]
+                message = await reader.readexactly(length)
+                writer.write(_frame(self._handle_command(message, writer, owned_sessions)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error, IndexError):
+            pass # the client disconnected or sent something that isn't a command
+        finally:
+            for session_id in owned_sessions:
+                self._close_session(session_id)
+            writer.close()
+
+    def _handle_command(self, message: bytes, writer: asyncio.StreamWriter, owned_sessions: set) -> bytes:
+        """ Applies a command and returns the reply to it. """
+
+        command = message[0]
+        if command == CREATE_SESSION:
+            rows, columns, gravity_milliseconds = _CREATE_SESSION_ARGUMENTS.unpack_from(message, 1)
+            if not (_MIN_SESSION_DIMENSIONS[0] <= rows <= _MAX_SESSION_DIMENSIONS[0]
+                    and _MIN_SESSION_DIMENSIONS[1] <= columns <= _MAX_SESSION_DIMENSIONS[1]):
+                return _MESSAGE_HEADER.pack(_REPLY, STATUS_REJECTED, 0)
+            session_id = self._next_session_id
+            self._next_session_id += 1
+            session = _ServerSession(GameState((rows, columns)), writer, gravity_milliseconds / 1000)
+            self._sessions[session_id] = session
+            owned_sessions.add(session_id)
+            if session.gravity_interval > 0:
+                self._wheel.schedule(session_id, session.gravity_interval)
+            return _MESSAGE_HEADER.pack(_REPLY, STATUS_OK, session_id) + encode_delta(session.state)
+
+        if command == CREATE_FALLER:
+            session_id, jewels, column = _CREATE_FALLER_ARGUMENTS.unpack_from(message, 1)
+        else:
+            session_id = _SESSION_ARGUMENTS.unpack_from(message, 1)[0]
+
+        session = self._sessions.get(session_id)
+        if session is None or session_id not in owned_sessions:
+            return _MESSAGE_HEADER.pack(_REPLY, STATUS_UNKNOWN_SESSION, session_id)
+        if command == CLOSE_SESSION:
+            self._close_session(session_id)
+            owned_sessions.discard(session_id)
+            return _MESSAGE_HEADER.pack(_REPLY, STATUS_OK, session_id)
+
+        if command == CREATE_FALLER and not all(code in _JEWEL_CODES for code in jewels):
+            return _MESSAGE_HEADER.pack(_REPLY, STATUS_REJECTED, session_id) + encode_delta(session.state)
+
+        status = STATUS_OK
+        try:
+            if command == CREATE_FALLER:
+                session.state.create_faller([decode_jewel(code) for code in jewels], column)
+            elif command == SHIFT_LEFT:
+                session.state.shift_faller("left")
+            elif command == SHIFT_RIGHT:
+                session.state.shift_faller("right")
+            elif command == ROTATE:
+                session.state.rotate_faller()
+            elif command == TICK:
+                session.state.tick()
+            else:
+                raise struct.error(f"unknown command {command}")
+        except _REJECTED_MOVE_ERRORS:
+            status = STATUS_REJECTED
+
+        if session.state.game_over():
+            self._wheel.cancel(session_id)
+        return _MESSAGE_HEADER.pack(_REPLY, status, session_id) + encode_delta(session.state)
+
+    def _close_session(self, session_id: int) -> None:
+        self._wheel.cancel(session_id)
+        self._sessions.pop(session_id, None)
+
+    async def _run_wheel(self) -> None:
+        """ Ticks every session whose gravity timer expired, pushes what changed to its
+            client and schedules its next tick, sleeping until the next slot in between. 
+            A session whose tick fails is logged and closed (telling its client) without stopping
+            the others, and a client that stops reading its pushes is disconnected instead of
+            buffering them forever. """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max(0, self._wheel.next_slot_time() - loop.time()))
+
+            for session_id in self._wheel.advance(loop.time()):
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue
+                try:
+                    self._push_gravity_tick(session_id, session)
+                except Exception:
+                    _logger.exception("closing session %d, its gravity tick failed", session_id)
+                    self._close_session(session_id)
+                    if not session.writer.is_closing():
+                        session.writer.write(_frame(_MESSAGE_HEADER.pack(_PUSH, STATUS_SESSION_CLOSED, session_id)))
+
+    def _push_gravity_tick(self, session_id: int, session: _ServerSession) -> None:
+        """ Ticks a session, schedules its next tick and pushes what changed to its client. """
+
+        try:
+            session.state.tick()
+        except FallerNotActiveError:
+            pass # waiting for the client to create the next faller
+
+        if session.state.game_over():
+            self._wheel.cancel(session_id)
+        else:
+            self._wheel.schedule(session_id, session.gravity_interval)
+
+        delta = encode_delta(session.state)
+        if (len(delta) > _DELTA_HEADER.size or session.state.game_over()) and not session.writer.is_closing():
+            if session.writer.transport.get_write_buffer_size() > _MAX_PUSH_BUFFER_BYTES:
+                session.writer.transport.abort() # its connection handler closes the rest of its sessions
+                self._close_session(session_id)
+            else:
+                session.writer.write(_frame(_MESSAGE_HEADER.pack(_PUSH, STATUS_OK, session_id) + delta))
+
+
+class GameClient:
+    def __init__(self) -> None:
+        """ Connects to a GameServer and keeps a copy of the field of each of its sessions,
+            kept up to date from the deltas in replies and pushed gravity ticks. """
+
+        self.fields = dict() # session id -> 2D list of jewels
+        self.statuses = dict() # session id -> 2D list of cell statuses
+        self.flags = dict() # session id -> flags of its latest delta
+        self.pushes = 0 # number of gravity ticks pushed by the server
+        self.closed_sessions = set() # ids of the sessions the server closed on its own
+        self._reader = None
+        self._writer = None
+        self._replies = collections.deque() # futures of the commands waiting for their reply
+        self._read_task = None
+
+    async def connect(self, host: str = _DEFAULT_HOST, port: int = _DEFAULT_PORT) -> None:
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._read_task = asyncio.create_task(self._read_messages())
+
+    async def close(self) -> None:
+        self._writer.close()
+        self._read_task.cancel()
+
+    async def create_session(self, dimensions: tuple = _DEFAULT_DIMENSIONS,
+                             gravity_interval: float = _DEFAULT_GRAVITY_INTERVAL) -> int:
+        """ Creates a session and returns its id, or None if the server rejected its
+            dimensions. A gravity_interval of 0 turns gravity off. """
+
+        rows, columns = dimensions
+        status, session_id = await self._send(bytes([CREATE_SESSION]) +
+            _CREATE_SESSION_ARGUMENTS.pack(rows, columns, int(gravity_interval * 1000)), (rows + 2, columns))
+        return session_id if status == STATUS_OK else None
+
+    async def create_faller(self, session_id: int, jewels: list, column: int) -> int:
+        """ Sends a command and returns the status of the reply, once the field is updated. """
+        return (await self._send(bytes([CREATE_FALLER]) + _CREATE_FALLER_ARGUMENTS.pack(
+            session_id, bytes(encode_jewel(jewel) for jewel in jewels), column)))[0]
+
+    async def shift_faller(self, session_id: int, direction: str) -> int:
+        command = SHIFT_LEFT if direction == "left" else SHIFT_RIGHT
+        return (await self._send(bytes([command]) + _SESSION_ARGUMENTS.pack(session_id)))[0]
+
+    async def rotate_faller(self, session_id: int) -> int:
+        return (await self._send(bytes([ROTATE]) + _SESSION_ARGUMENTS.pack(session_id)))[0]
+
+    async def tick(self, session_id: int) -> int:
+        return (await self._send(bytes([TICK]) + _SESSION_ARGUMENTS.pack(session_id)))[0]
+
+    async def close_session(self, session_id: int) -> int:
+        status = (await self._send(bytes([CLOSE_SESSION]) + _SESSION_ARGUMENTS.pack(session_id)))[0]
+        self.fields.pop(session_id, None)
+        self.statuses.pop(session_id, None)
+        self.flags.pop(session_id, None)
+        return status
+
+    async def _send(self, message: bytes, new_field_shape: tuple = None) -> tuple[int, int]:
+        """ Sends a command and waits for the (status, session id) of its reply. """
+
+        reply = asyncio.get_running_loop().create_future()
+        self._replies.append((reply, new_field_shape))
+        self._writer.write(_frame(message))
+        return await reply
+
+    async def _read_messages(self) -> None:
+        while True:
+            length = _FRAME_LENGTH.unpack(await self._reader.readexactly(_FRAME_LENGTH.size))[0]
+            message = await self._reader.readexactly(length)
+            message_type, status, session_id = _MESSAGE_HEADER.unpack_from(message, 0)
+
+            if message_type == _REPLY:
+                reply, new_field_shape = self._replies.popleft()
+                if new_field_shape is not None and status == STATUS_OK:
+                    rows, columns = new_field_shape
+                    self.fields[session_id] = [[EMPTY] * columns for i in range(rows)]
+                    self.statuses[session_id] = [[0] * columns for i in range(rows)]
+            elif status == STATUS_SESSION_CLOSED:
+                reply = None
+                self.closed_sessions.add(session_id)
+                self.fields.pop(session_id, None)
+                self.statuses.pop(session_id, None)
+                self.flags.pop(session_id, None)
+            else:
+                reply = None
+                self.pushes += 1
+
+            if len(message) > _MESSAGE_HEADER.size and session_id in self.fields:
+                flags, cells = decode_delta(message, _MESSAGE_HEADER.size)
+                self.flags[session_id] = flags
+                field, statuses = self.fields[session_id], self.statuses[session_id]
+                for row, column, jewel, cell_status in cells:
+                    field[row][column] = jewel
+                    statuses[row][column] = cell_status
+            if reply is not None:
+                reply.set_result((status, session_id))
+
+
+class LoadReport(NamedTuple):
+    """ Latency of the commands sent by the load generator. """
+    sessions: int
+    commands: int
+    pushes: int # gravity ticks pushed by the server while the commands ran
+    seconds: float
+    p50: float # median command latency in seconds
+    p99: float
+
+    def commands_per_second(self) -> float:
+        return self.commands / self.seconds if self.seconds > 0 else float("inf")
+
+
+def encode_delta(state: GameState) -> bytes:
+    """ Returns the cells of the field that changed since the last delta of the state,
+        each with its jewel and status, along with the game over and pending match flags. """
+
+    changed_cells = state.take_changed_cells()
+    statuses = state.cell_statuses()
+    flags = 0
+    if state.game_over():
+        flags |= DELTA_GAME_OVER
+    if state._match_found_previous_tick:
+        flags |= DELTA_MATCHES_PENDING
+
+    delta = [_DELTA_HEADER.pack(flags, len(changed_cells))]
+    for row, column in changed_cells:
+        delta.append(_DELTA_CELL.pack(row, column, encode_jewel(state._field[row][column]), statuses[row][column]))
+    return b"".join(delta)
+
+def decode_delta(data: bytes, offset: int = 0) -> tuple[int, list[tuple]]:
+    """ Returns the flags and the list of (row, column, jewel, status) cells of a delta. """
+
+    flags, cell_count = _DELTA_HEADER.unpack_from(data, offset)
+    offset += _DELTA_HEADER.size
+    cells = []
+    for i in range(cell_count):
+        row, column, code, cell_status = _DELTA_CELL.unpack_from(data, offset + i * _DELTA_CELL.size)
+        cells.append((row, column, decode_jewel(code), cell_status))
+    return (flags, cells)
+
+async def run_load(port: int, sessions: int, host: str = _DEFAULT_HOST, connections: int = 50,
+                   commands_per_session: int = 20, gravity_interval: float = _DEFAULT_GRAVITY_INTERVAL,
+                   seed = None) -> LoadReport:
+    """ Creates the given number of sessions spread over the connections and sends each
+        session random commands (like a player pressing keys) while the server runs
+        their gravity, then reports the latency of the commands. """
+
+    generator = random.Random(seed)
+    clients = [GameClient() for i in range(connections)]
+    for client in clients:
+        await client.connect(host, port)
+
+    async def play(client: GameClient, session_count: int) -> list[float]:
+        session_ids = [await client.create_session(gravity_interval=gravity_interval) for i in range(session_count)]
+        latencies = []
+        for i in range(commands_per_session):
+            for session_id in session_ids:
+                start = time.perf_counter()
+                move = generator.random()
+                if move < 0.25:
+                    await client.create_faller(session_id, generator.choices(JEWELS, k=3),
+                                               generator.randint(1, _DEFAULT_DIMENSIONS[1]))
+                elif move < 0.5:
+                    await client.shift_faller(session_id, generator.choice(["left", "right"]))
+                elif move < 0.75:
+                    await client.rotate_faller(session_id)
+                else:
+                    await client.tick(session_id)
+                latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    session_counts = [sessions // connections + (1 if i < sessions % connections else 0) for i in range(connections)]
+    results = await asyncio.gather(*[play(client, count) for client, count in zip(clients, session_counts)])
+    seconds = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+
+    latencies = sorted(latency for client_latencies in results for latency in client_latencies)
+    return LoadReport(sessions, len(latencies), sum(client.pushes for client in clients), seconds,
+                      _percentile(latencies, 0.5), _percentile(latencies, 0.99))
+
+def run_local_load(session_levels: list[int], connections: int = 50, commands_per_session: int = 20,
+                   gravity_interval: float = _DEFAULT_GRAVITY_INTERVAL, seed = None) -> list[LoadReport]:
+    """ Runs the load generator at each number of sessions against a new server started
+        in a separate process on this machine, so they don't share an event loop. """
+
+    reports = []
+    for sessions in session_levels:
+        ready = multiprocessing.Queue()
+        server_process = multiprocessing.Process(target=_serve_in_process, args=(ready,), daemon=True)
+        server_process.start()
+        try:
+            port = ready.get()
+            reports.append(asyncio.run(run_load(port, sessions, connections=connections,
+                                                commands_per_session=commands_per_session,
+                                                gravity_interval=gravity_interval, seed=seed)))
+        finally:
+            server_process.terminate()
+            server_process.join()
+    return reports
+
+def _serve_in_process(ready) -> None:
+    """ Runs a server on a free port until the process is terminated,
+        putting the port in the ready queue once it is listening. """
+
+    async def serve() -> None:
+        server = GameServer()
+        ready.put(await server.start())
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    if len(sorted_values) == 0:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def _frame(message: bytes) -> bytes:
+    return _FRAME_LENGTH.pack(len(message)) + message
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hosts Columns sessions over TCP, or load tests a local server.")
+    parser.add_argument("--host", default=_DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=_DEFAULT_PORT)
+    parser.add_argument("--load", type=int, nargs="+", metavar="SESSIONS",
+                        help="instead of serving, report command latency at each number of sessions")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--commands-per-session", type=int, default=20)
+    arguments = parser.parse_args()
+
+    if arguments.load is None:
+        async def serve() -> None:
+            server = GameServer()
+            await server.start(arguments.host, arguments.port)
+            await asyncio.Event().wait()
+        asyncio.run(serve())
+        return
+
+    for report in run_local_load(arguments.load, arguments.connections, arguments.commands_per_session):
+        print(f"sessions: {report.sessions}  commands: {report.commands}  pushes: {report.pushes}  "
+              f"commands/second: {report.commands_per_second():.0f}  "
+              f"p50: {report.p50 * 1000:.2f} ms  p99: {report.p99 * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import asyncio
+
+from game_mechanics import GameState
+from simulation import GameRunner, GameStats, no_moves, GAME_OVER_TICK_LIMIT, _DEFAULT_DIMENSIONS
+
+_DEFAULT_GRAVITY_INTERVAL = 1.0 # seconds between each tick of a session, same as the pygame game
+
+
+class GameSession:
+    def __init__(self, faller_source, move_policy = no_moves, dimensions: tuple = _DEFAULT_DIMENSIONS,
+                 gravity_interval: float = _DEFAULT_GRAVITY_INTERVAL) -> None:
+        """ A game played in real time on the asyncio event loop, ticking once every
+            gravity_interval seconds. Any number of sessions can run on the same loop
+            (next to a ColumnsGame window) without threads. See GameRunner for the
+            faller_source and move_policy arguments. """
+
+        self._runner = GameRunner(GameState(dimensions), faller_source, move_policy)
+        self._gravity_interval = gravity_interval
+
+    def state(self) -> GameState:
+        """ Returns the GameState played by this session. """
+        return self._runner.state
+
+    async def run(self, max_ticks: int = None) -> GameStats:
+        """ Plays the game until it ends (or reaches max_ticks), sleeping on the
+            event loop between ticks, and returns its stats. """
+
+        while max_ticks is None or self._runner.ticks < max_ticks:
+            ticks_before_step = self._runner.ticks
+            if self._runner.step():
+                return self._runner.stats()
+            if self._runner.ticks != ticks_before_step: # creating a faller doesn't take a tick
+                await asyncio.sleep(self._gravity_interval)
+
+        self._runner.game_over_cause = GAME_OVER_TICK_LIMIT
+        return self._runner.stats()
+
+
+async def run_sessions(sessions: list[GameSession], max_ticks: int = None) -> list[GameStats]:
+    """ Plays every session concurrently on the running event loop and returns their stats. """
+
+    return list(await asyncio.gather(*[session.run(max_ticks) for session in sessions]))
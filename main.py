@@ -1,12 +1,23 @@
 from game_mechanics import GameState
 import game_mechanics
+from bot import BotMovePolicy, PlacementBot
+from simulation import apply_moves
+from array_field import numpy
+from profiler import Profiler
 import pygame
 import random
 import asyncio
+import argparse
+import time
 
 # Global game configuration constants
 EMPTY = 0
-_FRAME_RATE = 10
+_SIMULATION_RATE = 10 # steps per second, held keys repeat their move once per step
+_GRAVITY_INTERVAL = 1.0 # seconds between each default tick of the faller
+_INPUT_POLL_INTERVAL = 0.01 # seconds between checks for input while running on the asyncio event loop
+_MAX_INPUT_POLL_INTERVAL = 0.05 # the poll interval doubles up to this while no input arrives
+_IDLE_INPUT_POLL_INTERVAL = 0.25 # and up to this while nothing is scheduled (ex: the game over screen)
+_MAX_STEPS_PER_FRAME = 5 # repeats of held keys caught up at once before missed repeats are dropped
 
 # field and grid fractional constants
 _FIELD_ROWS = 13
@@ -24,6 +35,14 @@ _GRID_Y_START_POSITION = 0.0125 # fractional coordinates, starts 1/80th of the d
 _GRID_WIDTH_PROPORTION = 0.5 # grid takes up half of the display width
 _GRID_HEIGHT_PROPORTION = 0.975 # grid takes up 97.5% of the display height (leaves some space above and below)
 
+# viewport constants, for fields too large to show whole
+_MIN_FIT_CELL_SIZE = 12 # pixels, fields whose cells would be smaller are shown through a scrolling viewport
+_VIEWPORT_CELL_SIZE = 24 # pixels, size of the cells when a field first opens in the viewport
+_MIN_CELL_SIZE = 4 # pixels, limits of zooming in and out
+_MAX_CELL_SIZE = 120
+_ZOOM_FACTOR = 1.25 # cell size is multiplied or divided by this on every zoom
+_SCROLL_FRACTION = 0.25 # fraction of the visible rows or columns scrolled on every key press
+
 # game over font
 _FONT_SIZE = 0.10 # 3% of view width
 _FROZEN_JEWEL_COLORS = { # colors for each jewel after they freeze
@@ -46,6 +65,10 @@ _LANDED_JEWEL_COLORS = { # colors for each jewel when they land (slightly faded)
     "Z": (245, 185, 144)
 }
 
+# cell statuses that a jewel can be drawn with
+_JEWEL_TYPES = (game_mechanics.CELL_FALLING, game_mechanics.CELL_LANDED,
+                game_mechanics.CELL_FROZEN, game_mechanics.CELL_MATCHED)
+
 def setup_field(window_dimensions: tuple[int, int]) -> GameState:
     """ Creates a GameState object using all of the user input 
         parameters (dimensions, initial state, etc..) 
@@ -67,81 +90,232 @@ def check_game_over(game_state: GameState) -> bool:
     return False
 
 
+class _RenderCache:
+    def __init__(self, size: tuple[int, int], visible_cells: tuple[int, int], grid_layer: pygame.Surface,
+                 grid_x_pos: float, grid_y_pos: float, row_gap: float, column_gap: float, line_width: float) -> None:
+        """ Holds the pre-rendered grid layer and jewel sprites for one window size and
+            number of (rows, columns) visible, so each frame only needs to blit them. 
+            The field cell shown in the top left corner of the grid is first_row, first_column. """
+
+        self.size = size
+        self.visible_cells = visible_cells
+        self.first_row = 2 # first two rows are "hidden" so they are not displayed
+        self.first_column = 0
+        self.grid_layer = grid_layer # white background with the grid outline and lines
+        self.sprites = dict() # maps (jewel, cell status) to a pre-rendered jewel surface
+        self._grid_x_pos = grid_x_pos
+        self._grid_y_pos = grid_y_pos
+        self._row_gap = row_gap
+        self._column_gap = column_gap
+        self._line_width = line_width
+
+    def jewel_size(self) -> tuple[int, int]:
+        """ Returns the size in pixels of a single jewel sprite. """
+        return self.cell_rect(self.first_row, self.first_column).size
+
+    def cell_size(self) -> float:
+        """ Returns the size in pixels of the smaller side of a cell. """
+        return min(self._row_gap, self._column_gap)
+
+    def is_visible(self, row_index: int, column_index: int) -> bool:
+        visible_rows, visible_columns = self.visible_cells
+        return (self.first_row <= row_index < self.first_row + visible_rows
+                and self.first_column <= column_index < self.first_column + visible_columns)
+
+    def cell_rect(self, row_index: int, column_index: int) -> pygame.Rect:
+        """ Returns the rectangle of the display covered by the jewel in the given visible field cell. """
+
+        top_left_x_pos = self._grid_x_pos + (column_index - self.first_column) * self._column_gap + self._line_width
+        top_left_y_pos = self._grid_y_pos + (row_index - self.first_row) * self._row_gap + self._line_width
+        return pygame.Rect(top_left_x_pos, top_left_y_pos, self._column_gap - self._line_width + 1,
+                           self._row_gap - self._line_width + 1)
+
+
 class ColumnsGame:
-    def __init__(self) -> None:
-        """ Initialies attributes for the Columns Game State. """
+    def __init__(self, simulation_rate: int = _SIMULATION_RATE, gravity_interval: float = _GRAVITY_INTERVAL,
+                 bot: PlacementBot = None, dimensions: tuple = (_FIELD_ROWS, _FIELD_COLUMNS),
+                 profiler: Profiler = None, cell_size: float = None) -> None:
+        """ Initialies attributes for the Columns Game State. Held keys repeat 
+            simulation_rate times per second and the faller falls by default once 
+            every gravity_interval seconds, independently of how often frames are drawn.
+            If a bot is given, it moves every new faller to where it should be dropped.
+            dimensions are the (rows, columns) of the field. If a profiler is given, the
+            phases of every frame and tick are timed, and F3 prints what it recorded so far.
+            Fields too large to fit in the window are shown through a viewport that follows 
+            the faller: WASD scroll it (and stop it following until F is pressed) and +/- zoom.
+            cell_size sets the size in pixels of the cells in the viewport. """
 
         self._running = True
+        self._step_seconds = 1 / simulation_rate
+        self._gravity_interval = gravity_interval
+        self._next_gravity_time = None # time of the next default tick, scheduled when the game starts
+        self._next_repeat_time = None # time held keys next repeat their move, None while no keys are held
         self._game_over_displayed = False
-        self._state = game_mechanics.GameState((_FIELD_ROWS, _FIELD_COLUMNS))
+        self._state = game_mechanics.GameState(dimensions)
         self._faller_moving_right = False
         self._faller_moving_left = False
         self._faller_rotating = False
         self._faller_speeding_down = False
+        self._full_repaint_needed = True # the whole window is only repainted when it is first shown or resized
+        self._render_cache = None # pre-rendered grid and jewel sprites, rebuilt when the window size changes
+        self._game_over_text = None # (window size, rendered text) of the game over message
+        self._bot_policy = None if bot is None else BotMovePolicy(bot)
+        self._cell_size = cell_size # pixels, None fits the whole field in the window if it isn't too large
+        self._viewport_origin = (2, 0) # (row, column) of the top left visible cell, the 2 hidden rows aren't shown
+        self._follow_faller = True # scroll the viewport to every faller that leaves it
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.instrument_game(self)
 
     def run(self) -> None:
-        """ Executes the columns game in a separate window. """
+        """ Executes the columns game in a separate window. Between scheduled 
+            steps the loop sleeps until the next event arrives, and frames are 
+            only drawn when something on the field changed. """
 
-        pygame.init()
-
-        self._resize_surface((800, 800))
-        clock = pygame.time.Clock()
-        tick_counter = 0 # only tick the faller by default every second
-        # when tick counter reaches the frame rate, then it ticks the faller by default and resets it to 0
-        # this allows us to set a higher framerate so the response to user input on the display is quick,
-        # while still maintaing a faller that ticks 1 per second by default. 
+        self._start()
     
         # display grid/field and actively falling jewels
         while self._running:
-            clock.tick(_FRAME_RATE)
-            self._handle_faller_motion()
-            tick_counter = self._default_faller_tick(tick_counter)
-            if check_game_over(self._state):
-                self._running = False
-                self._game_over_displayed = True
-                break
-            self._redraw()
-            tick_counter += 1
+            self._update_frame(self._wait_for_events(self._seconds_until_next_step()))
         
-        game_over_clock = pygame.time.Clock()
-
-        # display game over message
+        # display game over message, nothing is scheduled so only wake up for events
         while self._game_over_displayed: 
-            game_over_clock.tick(_FRAME_RATE)
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self._game_over_displayed = False
-                    break
-                if event.type == pygame.VIDEORESIZE:
-                    self._resize_surface(event.size)
-            self._draw_game_over_message('GAME OVER', pygame.font.SysFont(None, int(_FONT_SIZE * pygame.display.get_surface().get_width())))
-            pygame.display.flip()
-            
+            self._draw_game_over_screen()
+            self._handle_game_over_events(self._wait_for_events(None))
         
         pygame.quit()
 
+    async def run_async(self) -> None:
+        """ Executes the columns game in a separate window without blocking the asyncio 
+            event loop: it yields to the loop every frame and while waiting for input, 
+            so other tasks (or GameSessions) can run on the same loop. """
+
+        self._start()
 
-    def _handle_faller_motion(self) -> None:
+        while self._running:
+            self._update_frame(await self._wait_for_events_async(self._seconds_until_next_step()))
+
+        while self._game_over_displayed: 
+            self._draw_game_over_screen()
+            self._handle_game_over_events(await self._wait_for_events_async(None))
+
+        pygame.quit()
+
+    def _start(self) -> None:
+        """ Opens the window and schedules the first default tick. """
+
+        pygame.init()
+
+        self._resize_surface((800, 800))
+        self._next_gravity_time = time.perf_counter() + self._gravity_interval
+
+    def _update_frame(self, events: list) -> None:
+        """ Handles the events, runs any steps that are due, and draws what changed. """
+
+        self._handle_faller_motion(events)
+        self._run_scheduled_steps()
+
+        if check_game_over(self._state):
+            self._running = False
+            self._game_over_displayed = True
+            return
+        self._redraw() # only draws anything if the field changed
+
+    async def _wait_for_events_async(self, timeout: float) -> list:
+        """ Yields to the event loop until an event arrives or the timeout (in seconds)
+            runs out, then returns every pending event. Waits without a timeout if it is None.
+            pygame can't wake up the event loop, so events are polled, starting every 
+            _INPUT_POLL_INTERVAL and backing off while the game is idle. """
+
+        await asyncio.sleep(0) # always let other tasks run at least once per frame
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        poll_interval = _INPUT_POLL_INTERVAL
+        max_poll_interval = _IDLE_INPUT_POLL_INTERVAL if timeout is None else _MAX_INPUT_POLL_INTERVAL
+
+        while True:
+            events = pygame.event.get()
+            if len(events) > 0:
+                return events
+            
+            sleep_seconds = poll_interval
+            poll_interval = min(2 * poll_interval, max_poll_interval)
+            if deadline is not None:
+                remaining_seconds = deadline - time.perf_counter()
+                if remaining_seconds <= 0:
+                    return events
+                sleep_seconds = min(sleep_seconds, remaining_seconds)
+            await asyncio.sleep(sleep_seconds)
+
+    def _wait_for_events(self, timeout: float) -> list:
+        """ Sleeps until an event arrives or the timeout (in seconds) runs out, 
+            then returns every pending event. Waits without a timeout if it is None. """
+
+        if timeout is None:
+            first_event = pygame.event.wait()
+        elif timeout > 0:
+            first_event = pygame.event.wait(max(1, int(timeout * 1000)))
+        else:
+            first_event = pygame.event.Event(pygame.NOEVENT)
+
+        if first_event.type == pygame.NOEVENT:
+            return pygame.event.get()
+        return [first_event] + pygame.event.get()
+
+    def _seconds_until_next_step(self) -> float:
+        """ Returns the number of seconds until the next default tick or, 
+            if keys are held down, the next repeat of their moves. """
+
+        next_step_time = self._next_gravity_time
+        if self._next_repeat_time is not None:
+            next_step_time = min(next_step_time, self._next_repeat_time)
+        return next_step_time - time.perf_counter()
+
+    def _run_scheduled_steps(self) -> None:
+        """ Repeats the moves of held keys and ticks the faller by default for every
+            fixed step that is due. Steps missed after a long stall are dropped. """
+
+        now = time.perf_counter()
+
+        steps = 0
+        while self._next_repeat_time is not None and now >= self._next_repeat_time and steps < _MAX_STEPS_PER_FRAME:
+            self._repeat_held_moves()
+            self._next_repeat_time += self._step_seconds
+            steps += 1
+        if self._next_repeat_time is not None and now >= self._next_repeat_time:
+            self._next_repeat_time = now + self._step_seconds
+
+        if now >= self._next_gravity_time:
+            self._default_faller_tick()
+            self._next_gravity_time += self._gravity_interval
+            if now >= self._next_gravity_time: # fell too far behind (ex: window was dragged)
+                self._next_gravity_time = now + self._gravity_interval
+
+    def _handle_faller_motion(self, events: list) -> None:
         """ Handles all user input that changes and moves the faller. """
         try:
-            self._handle_events()
+            self._handle_events(events)
+        except (game_mechanics.FallerAlreadyActiveError, game_mechanics.InvalidMoveError,
+                game_mechanics.FallerNotActiveError):
+            pass
+
+    def _repeat_held_moves(self) -> None:
+        """ Repeats the moves of any keys that are held down. """
+
+        try:
             self._move_faller()
         except (game_mechanics.FallerAlreadyActiveError, game_mechanics.InvalidMoveError,
                 game_mechanics.FallerNotActiveError):
             pass
     
-    def _default_faller_tick(self, tick_counter: int) -> int:
-        """ Ticks the faller by default every second based on the frame rate."""
+    def _default_faller_tick(self) -> None:
+        """ Ticks the faller by default, creating a new faller once the previous one froze. """
 
-        try: # tick the faller only when tick counter reaches frame rate so that it happens only once per second. 
-            if tick_counter == _FRAME_RATE:  
-                self._state.tick()
-            elif tick_counter > _FRAME_RATE:
-                tick_counter = 0 # reset tick counter once the faller is ticked so it happens every second
+        try:
+            self._state.tick()
         except (game_mechanics.FallerNotActiveError):
             self._create_random_faller() # once a faller freezes, create a new random faller in a random column
-        finally:
-            return tick_counter # return tick counter so it can be updated in the run() method
+            if self._bot_policy is not None and not self._state.game_over():
+                apply_moves(self._state, self._bot_policy(self._state))
 
     def _move_faller(self) -> None:
         """ Rotates, shifts, or ticks the faller depending on the game state.
@@ -155,16 +329,34 @@ class ColumnsGame:
             self._state.rotate_faller()
         if self._faller_speeding_down:
             self._state.tick()
+
+    def _move_faller_immediately(self, key: int) -> None:
+        """ Applies the move for a key as soon as it is pressed, instead of waiting
+            for the next step. Held keys start repeating one step later. """
+
+        try:
+            if key == pygame.K_RIGHT:
+                self._state.shift_faller('right')
+            elif key == pygame.K_LEFT:
+                self._state.shift_faller('left')
+            elif key == pygame.K_SPACE:
+                self._state.rotate_faller()
+            elif key == pygame.K_DOWN:
+                self._state.tick()
+        except (game_mechanics.FallerAlreadyActiveError, game_mechanics.InvalidMoveError,
+                game_mechanics.FallerNotActiveError):
+            pass
+        self._next_repeat_time = time.perf_counter() + self._step_seconds
     
     def _create_random_faller(self) -> None:
         """ Creates a faller with random jewels to be dropped in a random column. """
 
         new_column = None
         if self._all_columns_full(): # choose any random column for new faller if all columns are full
-            new_column = random.randint(1, _FIELD_COLUMNS)
+            new_column = random.randint(1, self._state.columns())
         else: # otherwise keep randomly choosing a column until you choose one that isn't full
             while True:
-                new_column = random.randint(1, _FIELD_COLUMNS)
+                new_column = random.randint(1, self._state.columns())
                 if self._state._field[0][new_column - 1] != EMPTY: # subtract 1 from new_column to convert to index
                     continue # keep searching if the chosen column is full with frozen jewels
                 break # exit once an empty column has been found 
@@ -181,10 +373,10 @@ class ColumnsGame:
                 return False
         return True
 
-    def _handle_events(self) -> None:
+    def _handle_events(self, events: list) -> None:
         """ Handles both user keydown and keyup events to move the faller. """
 
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 self._running = False
             if event.type == pygame.VIDEORESIZE:
@@ -204,6 +396,10 @@ class ColumnsGame:
                 self._faller_rotating = True
             if event.key == pygame.K_DOWN:
                 self._faller_speeding_down = True
+            if event.key == pygame.K_F3 and self._profiler is not None:
+                print(self._profiler.report())
+            self._move_viewport(event.key)
+            self._move_faller_immediately(event.key)
         if event.type == pygame.VIDEORESIZE:
             self._resize_surface(event.size)
 
@@ -219,90 +415,152 @@ class ColumnsGame:
                 self._faller_rotating = False
             if event.key == pygame.K_DOWN:
                 self._faller_speeding_down = False
+            if not self._any_key_held():
+                self._next_repeat_time = None # nothing to repeat, so no need to wake up for it
 
+    def _any_key_held(self) -> bool:
+        """ Returns True if any of the keys that move the faller are held down. """
 
-    def _redraw(self) -> None:
-        """ Draws the current state of the field and faller to the screen. """ 
+        return self._faller_moving_right or self._faller_moving_left \
+            or self._faller_rotating or self._faller_speeding_down
 
-        surface, grid_x_pos, grid_y_pos, grid_width, grid_height = self._get_grid_dimensions()
-        row_gap, column_gap = self._get_grid_gaps(grid_width, grid_height)
-        line_width = _LINE_WIDTH_PROPORTION * surface.get_width() # width of lines inside the grid
+    def _handle_game_over_events(self, events: list) -> None:
+        """ Handles the events while the game over message is displayed. """
 
-        surface.fill(pygame.Color(255, 255, 255)) # fill background with white
+        for event in events:
+            if event.type == pygame.QUIT:
+                self._game_over_displayed = False
+                break
+            if event.type == pygame.VIDEORESIZE:
+                self._resize_surface(event.size)
 
-        self._draw_grid(surface, grid_x_pos, grid_y_pos, grid_width, grid_height)
-        self._draw_vertical_grid_lines(surface, grid_x_pos, grid_y_pos, grid_width, grid_height, column_gap, line_width)
-        self._draw_horizontal_grid_lines(surface, grid_x_pos, grid_y_pos, grid_width, grid_height, row_gap, line_width)
-        self._draw_jewels(surface, grid_x_pos, grid_y_pos, row_gap, column_gap, line_width)
-        
+    def _draw_game_over_screen(self) -> None:
+        """ Draws the field with the game over message on top, only if the window
+            needs repainting (when it is first shown or resized). """
+
+        if not self._full_repaint_needed and self._game_over_text is not None:
+            return
+        self._redraw()
+        self._draw_game_over_message('GAME OVER')
         pygame.display.flip()
 
 
-    def _draw_jewels(self, surface: pygame.Surface, grid_x_pos: float, grid_y_pos: float, row_gap: float,
-                      column_gap: float, line_width: float) -> None:
-        """ Draws all the jewels on the field display using the GameState field attribute. """
-        
-        visible_field = self._state._field[2:] # first two rows are "hidden" so they are not displayed
-        current_y_pos = grid_y_pos # will increase to progress through rows
+    def _redraw(self) -> None:
+        """ Draws the current state of the field and faller to the screen. 
+            After the first frame (or a resize) only the cells that changed are redrawn. """ 
 
-        for row_index in range(len(visible_field)):
-            current_x_pos = grid_x_pos # will increase to progress through columns
+        surface = pygame.display.get_surface()
+        visible_cells = self._visible_cells()
+        if self._render_cache is None or self._render_cache.size != surface.get_size() \
+            or self._render_cache.visible_cells != visible_cells:
+            self._render_cache = self._build_render_cache(surface, visible_cells)
+            self._full_repaint_needed = True
+        if self._scroll_viewport():
+            self._full_repaint_needed = True
+        changed_cells = self._state.take_changed_cells()
+
+        if self._full_repaint_needed:
+            surface.blit(self._render_cache.grid_layer, (0, 0)) # white background and the grid
+            self._draw_jewels(surface)
             
-            for column_index in range(len(visible_field[row_index])):
-                current_jewel = visible_field[row_index][column_index]
-
-                top_left_x_pos = current_x_pos + line_width
-                top_left_y_pos = current_y_pos + line_width
-                
-                if current_jewel in _FROZEN_JEWEL_COLORS.keys():
-                    current_jewel_color = _FROZEN_JEWEL_COLORS[current_jewel]
-                    current_jewel_position = (top_left_x_pos, top_left_y_pos, column_gap - line_width + 1, 
-                                             row_gap - line_width + 1)
-                    
-                    current_jewel_coordinates = [row_index + 2, column_index] # add 2 to i because 2 hidden rows 
-
-                    self._draw_correct_jewel_type(surface, current_jewel_coordinates, current_jewel_position,
-                                                  current_jewel_color, current_jewel, current_x_pos,
-                                                  current_y_pos, column_gap, row_gap, top_left_x_pos, 
-                                                  top_left_y_pos, line_width)
-                current_x_pos += column_gap
-            current_y_pos += row_gap
-
-    def _draw_correct_jewel_type(self, surface: pygame.surface, current_jewel_coordinates: list[int, int],
-                                 current_jewel_position: tuple, current_jewel_color: tuple,
-                                 current_jewel: str, current_x_pos: int, current_y_pos: int,
-                                 column_gap: int, row_gap: int, top_left_x_pos: int,
-                                 top_left_y_pos: int, line_width: float) -> None:
+            pygame.display.flip()
+            self._full_repaint_needed = False
+        elif len(changed_cells) > 0:
+            pygame.display.update(self._draw_changed_cells(surface, changed_cells))
+
+    def _build_render_cache(self, surface: pygame.Surface, visible_cells: tuple[int, int]) -> '_RenderCache':
+        """ Pre-renders the grid and every kind of jewel for the current window size
+            and number of visible (rows, columns). """
+
+        window_surface, grid_x_pos, grid_y_pos, grid_width, grid_height = self._get_grid_dimensions()
+        row_gap, column_gap = self._get_grid_gaps(grid_width, grid_height, visible_cells)
+        line_width = _LINE_WIDTH_PROPORTION * surface.get_width() # width of lines inside the grid
+
+        grid_layer = pygame.Surface(surface.get_size())
+        grid_layer.fill(pygame.Color(255, 255, 255)) # fill background with white
+        self._draw_grid(grid_layer, grid_x_pos, grid_y_pos, grid_width, grid_height)
+        self._draw_vertical_grid_lines(grid_layer, grid_x_pos, grid_y_pos, grid_width, grid_height,
+                                       column_gap, line_width, visible_cells[1])
+        self._draw_horizontal_grid_lines(grid_layer, grid_x_pos, grid_y_pos, grid_width, grid_height,
+                                         row_gap, line_width, visible_cells[0])
+
+        render_cache = _RenderCache(surface.get_size(), visible_cells, grid_layer, grid_x_pos, grid_y_pos,
+                                    row_gap, column_gap, line_width)
+        render_cache.first_row, render_cache.first_column = self._viewport_origin
+        for jewel in _FROZEN_JEWEL_COLORS.keys():
+            for jewel_type in _JEWEL_TYPES:
+                render_cache.sprites[(jewel, jewel_type)] = self._render_jewel_sprite(
+                    surface, render_cache.jewel_size(), jewel, jewel_type)
+
+        return render_cache
+
+    def _draw_changed_cells(self, surface: pygame.Surface, changed_cells: set) -> list[pygame.Rect]:
+        """ Redraws only the given (row, column) field cells and returns the 
+            rectangles of the display that were updated. """
+
+        cell_statuses = self._state.cell_statuses()
+        updated_rects = []
+        for row_index, column_index in changed_cells:
+            if not self._render_cache.is_visible(row_index, column_index): # includes the two hidden rows
+                continue
+
+            cell_rect = self._render_cache.cell_rect(row_index, column_index)
+            surface.blit(self._render_cache.grid_layer, cell_rect, area=cell_rect) # erase the cell
+            self._draw_jewel(surface, row_index, column_index, cell_rect, cell_statuses)
+            updated_rects.append(cell_rect)
+
+        return updated_rects
+
+    def _draw_jewels(self, surface: pygame.Surface) -> None:
+        """ Draws all the visible jewels on the field display using the GameState field attribute. """
+        
+        cell_statuses = self._state.cell_statuses()
+        render_cache = self._render_cache
+        visible_rows, visible_columns = render_cache.visible_cells
+        for row_index in range(render_cache.first_row, render_cache.first_row + visible_rows):
+            for column_index in range(render_cache.first_column, render_cache.first_column + visible_columns):
+                cell_rect = self._render_cache.cell_rect(row_index, column_index)
+                self._draw_jewel(surface, row_index, column_index, cell_rect, cell_statuses)
+
+    def _draw_jewel(self, surface: pygame.Surface, row_index: int, column_index: int, cell_rect: pygame.Rect,
+                    cell_statuses: list[list[int]]) -> None:
+        """ Blits the pre-rendered sprite of the jewel in the given field cell, if there is one. """
+
+        current_jewel = self._state._field[row_index][column_index]
+        if current_jewel in _FROZEN_JEWEL_COLORS.keys():
+            jewel_type = cell_statuses[row_index][column_index] # falling, landed, frozen or matched
+            surface.blit(self._render_cache.sprites[(current_jewel, jewel_type)], cell_rect)
+
+    def _render_jewel_sprite(self, surface: pygame.Surface, jewel_size: tuple[int, int],
+                             current_jewel: str, jewel_type: int) -> pygame.Surface:
         """ Draws the correct representation of a given jewel if it is in an active faller,
-            currently landed, or frozen. """
+            currently landed, matched, or frozen onto a new sprite surface the size of a cell. """
         
         falling_jewel_outline = int(_FALLING_JEWEL_OUTLINE_PROPORTION * surface.get_width())
         cross_jewel_outline = int(_CROSS_JEWEL_OUTLINE_PROPORTION * surface.get_width())
-
-        if self._state._faller != None \
-            and current_jewel_coordinates in self._state._faller['positions'] \
-            and not self._state._faller_landed: # draws a currently falling jewel 
-                pygame.draw.rect(surface, current_jewel_color, current_jewel_position, width=falling_jewel_outline)
-        elif self._state._faller != None \
-            and current_jewel_coordinates in self._state._faller['positions'] \
-            and self._state._faller_landed: 
-                # draws a jewel that has landed (colors made faded to show it is not final)
-                landed_color = _LANDED_JEWEL_COLORS[current_jewel]
-                pygame.draw.rect(surface, landed_color, current_jewel_position)
-        elif tuple(current_jewel_coordinates) in self._state._matches: 
+        current_jewel_color = _FROZEN_JEWEL_COLORS[current_jewel]
+
+        sprite = pygame.Surface(jewel_size)
+        sprite.fill(pygame.Color(255, 255, 255))
+        jewel_rect = sprite.get_rect()
+
+        if jewel_type == game_mechanics.CELL_FALLING: # draws a currently falling jewel 
+            pygame.draw.rect(sprite, current_jewel_color, jewel_rect, width=falling_jewel_outline)
+        elif jewel_type == game_mechanics.CELL_LANDED:
+            # draws a jewel that has landed (colors made faded to show it is not final)
+            landed_color = _LANDED_JEWEL_COLORS[current_jewel]
+            pygame.draw.rect(sprite, landed_color, jewel_rect)
+        elif jewel_type == game_mechanics.CELL_MATCHED: 
             # draws X on matched jewels to indicate matching
-            pygame.draw.rect(surface, current_jewel_color, current_jewel_position)
-            bottom_right_x_pos = current_x_pos + column_gap - line_width + 1
-            bottom_right_y_pos = current_y_pos + row_gap - line_width + 1
-                        
-            pygame.draw.line(surface, _GRID_COLOR, (top_left_x_pos, top_left_y_pos),
-                                                    (bottom_right_x_pos,bottom_right_y_pos),
-                                                    width=cross_jewel_outline)
-            pygame.draw.line(surface, _GRID_COLOR, (top_left_x_pos, bottom_right_y_pos), 
-                                                    (bottom_right_x_pos, top_left_y_pos),
-                                                    width=cross_jewel_outline)
+            pygame.draw.rect(sprite, current_jewel_color, jewel_rect)
+            pygame.draw.line(sprite, _GRID_COLOR, jewel_rect.topleft, jewel_rect.bottomright,
+                             width=cross_jewel_outline)
+            pygame.draw.line(sprite, _GRID_COLOR, jewel_rect.bottomleft, jewel_rect.topright,
+                             width=cross_jewel_outline)
         else: # draws a normal frozen jewel (colors full saturated and not faded)
-            pygame.draw.rect(surface, current_jewel_color, current_jewel_position)
+            pygame.draw.rect(sprite, current_jewel_color, jewel_rect)
+
+        return sprite
 
     def _get_grid_dimensions(self) -> tuple[pygame.Surface, float, float, float, float]:
         """ Returns the display surface object and grid dimensions to be 
@@ -334,19 +592,19 @@ class ColumnsGame:
     
     def _draw_vertical_grid_lines(self, surface: pygame.surface, grid_x_pos: float,
                                   grid_y_pos: float, grid_width: float, grid_height: float,
-                                  column_gap: float, line_width: float) -> None:
+                                  column_gap: float, line_width: float, visible_columns: int) -> None:
         """ Draws vertical lines of the field grid. """
 
-        for i in range(1, _FIELD_COLUMNS):
+        for i in range(1, visible_columns):
             position = (grid_x_pos + (i * column_gap), grid_y_pos, line_width, grid_height)
             pygame.draw.rect(surface, _GRID_COLOR, position)
 
     def _draw_horizontal_grid_lines(self, surface: pygame.surface, grid_x_pos: float,
                                     grid_y_pos: float, grid_width: float, grid_height: float,
-                                    row_gap: float, line_width: float) -> None:
+                                    row_gap: float, line_width: float, visible_rows: int) -> None:
         """ Draws horizontal lines of the field grid. """
 
-        for i in range(1, _FIELD_ROWS):
+        for i in range(1, visible_rows):
             position = (grid_x_pos, grid_y_pos + (i * row_gap), grid_width, line_width)
             pygame.draw.rect(surface, _GRID_COLOR, position)
 
@@ -361,30 +619,130 @@ class ColumnsGame:
         
         return False
     
-    def _get_grid_gaps(self, grid_width: float, grid_height: float) -> tuple:
+    def _get_grid_gaps(self, grid_width: float, grid_height: float, visible_cells: tuple[int, int]) -> tuple:
         """ Calculates and returns the gaps between each row and column 
-            given the number of field rows and columns we want. """
+            given the number of visible field rows and columns we want. """
         
-        column_gap = (grid_width / _FIELD_COLUMNS)  
-        row_gap = (grid_height / _FIELD_ROWS)
+        visible_rows, visible_columns = visible_cells
+        column_gap = (grid_width / visible_columns)  
+        row_gap = (grid_height / visible_rows)
 
         return (row_gap, column_gap)
+
+    def _visible_cells(self) -> tuple[int, int]:
+        """ Returns the number of (rows, columns) of the field that fit in the grid:
+            all of them unless the field is too large or a cell size was chosen. """
+
+        window_surface, grid_x_pos, grid_y_pos, grid_width, grid_height = self._get_grid_dimensions()
+        rows, columns = self._state.rows(), self._state.columns()
+
+        cell_size = self._cell_size
+        if cell_size is None:
+            if self._fit_cell_size() >= _MIN_FIT_CELL_SIZE:
+                return (rows, columns)
+            cell_size = _VIEWPORT_CELL_SIZE
+        return (max(1, min(rows, int(grid_height // cell_size))), max(1, min(columns, int(grid_width // cell_size))))
+
+    def _fit_cell_size(self) -> float:
+        """ Returns the size in pixels of the cells when the whole field fits in the grid. """
+
+        window_surface, grid_x_pos, grid_y_pos, grid_width, grid_height = self._get_grid_dimensions()
+        return min(grid_width / self._state.columns(), grid_height / self._state.rows())
+
+    def _scroll_viewport(self) -> bool:
+        """ Moves the viewport onto the faller if it left it (while following the faller) and
+            keeps the viewport inside the field. Returns True if the viewport moved. """
+
+        visible_rows, visible_columns = self._render_cache.visible_cells
+        first_row, first_column = self._viewport_origin
+        faller = self._state._faller
+        if self._follow_faller and faller is not None \
+            and not self._render_cache.is_visible(max(2, faller.bottom_row()), faller.column):
+            first_row = faller.bottom_row() - visible_rows // 2
+            first_column = faller.column - visible_columns // 2
+
+        first_row = max(2, min(first_row, self._state.last_row_index() + 1 - visible_rows))
+        first_column = max(0, min(first_column, self._state.columns() - visible_columns))
+        self._viewport_origin = (first_row, first_column)
+
+        if (self._render_cache.first_row, self._render_cache.first_column) == self._viewport_origin:
+            return False
+        self._render_cache.first_row, self._render_cache.first_column = self._viewport_origin
+        return True
+
+    def _move_viewport(self, key: int) -> None:
+        """ Scrolls the viewport with WASD, which stops it from following the faller until
+            F is pressed, and zooms in and out with + and -. Once the whole field is visible
+            again the field goes back to fitting the window, as when no cell size was chosen. """
+
+        if self._render_cache is None:
+            return
+        visible_rows, visible_columns = self._render_cache.visible_cells
+        first_row, first_column = self._viewport_origin
+        row_step = max(1, int(visible_rows * _SCROLL_FRACTION))
+        column_step = max(1, int(visible_columns * _SCROLL_FRACTION))
+
+        if key == pygame.K_w:
+            self._viewport_origin = (first_row - row_step, first_column)
+        elif key == pygame.K_s:
+            self._viewport_origin = (first_row + row_step, first_column)
+        elif key == pygame.K_a:
+            self._viewport_origin = (first_row, first_column - column_step)
+        elif key == pygame.K_d:
+            self._viewport_origin = (first_row, first_column + column_step)
+        elif key == pygame.K_f:
+            self._follow_faller = True
+        elif key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+            self._cell_size = min(_MAX_CELL_SIZE, self._render_cache.cell_size() * _ZOOM_FACTOR)
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self._cell_size = max(_MIN_CELL_SIZE, self._render_cache.cell_size() / _ZOOM_FACTOR)
+        if self._cell_size is not None and self._fit_cell_size() >= _MIN_FIT_CELL_SIZE \
+            and self._visible_cells() == (self._state.rows(), self._state.columns()):
+            self._cell_size = None
+
+        if key in (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d):
+            self._follow_faller = False
     
-    def _draw_game_over_message(self, text: str, font: pygame.font.SysFont) -> None:
+    def _draw_game_over_message(self, text: str) -> None:
+        """ Draws the message over the field. The font and rendered text are 
+            cached until the window size changes. """
+
         surface = pygame.display.get_surface()
-        text_image = font.render(text, True, _GRID_COLOR)
+        if self._game_over_text is None or self._game_over_text[0] != surface.get_size():
+            font = pygame.font.SysFont(None, int(_FONT_SIZE * surface.get_width()))
+            self._game_over_text = (surface.get_size(), font.render(text, True, _GRID_COLOR))
+
+        text_image = self._game_over_text[1]
         surface.blit(text_image, (int(0.55 * surface.get_width() / 2), int(0.85 * surface.get_height() / 2)))
 
     def _resize_surface(self, new_size: tuple[int, int]) -> None:
         """ Resizes surface in response to user input. """
 
         pygame.display.set_mode(new_size, pygame.RESIZABLE)
+        self._render_cache = None
+        self._full_repaint_needed = True
     
 
-async def main():
-    game = ColumnsGame()
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays Columns in a window.")
+    parser.add_argument("--bot", action="store_true", help="let the placement search bot move the fallers")
+    parser.add_argument("--rows", type=int, default=_FIELD_ROWS)
+    parser.add_argument("--columns", type=int, default=_FIELD_COLUMNS)
+    parser.add_argument("--cell-size", type=float, default=None,
+                        help="size of the cells in pixels, shows the field through a scrolling viewport")
+    parser.add_argument("--profile", nargs="?", const="", metavar="PATH",
+                        help="time the phases of every frame and tick, and print them on exit (or write them to PATH as JSON)")
+    arguments = parser.parse_args()
+
+    profiler = None
+    if arguments.profile is not None:
+        profiler = Profiler()
+        profiler.dump_on_exit(arguments.profile or None)
+
+    game = ColumnsGame(bot=PlacementBot(batched=numpy is not None) if arguments.bot else None,
+                       dimensions=(arguments.rows, arguments.columns), profiler=profiler, cell_size=arguments.cell_size)
     game.run()
-    await asyncio.sleep(0) 
 
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,4 +1,5 @@
 EMPTY = 0
+_MATCH_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1)) # horizontal, vertical, and both diagonals
 
 def _check_horizontal_matches(matrix: list[list[str]]) -> list[tuple]:
     """ Given a 2D list, a list of tuple coordinates are returned, 
@@ -57,49 +58,100 @@ def _check_vertical_matches(matrix: list[list[str]]) -> list[tuple]:
     
 def _check_diagonal_matches(matrix: list[list[str]]) -> list[tuple]:
     """ Given a 2D list, a list of tuple coordinates are returned, 
-        with the tuple coordinates representing diagonal matches. """
+        with the tuple coordinates representing diagonal matches. 
+        Each diagonal is walked exactly once, so no coordinate is visited twice. """
 
-    match_indices = []
-    for i in range(len(matrix) - 1, -1, -1):
-        for j in range(len(matrix[i])):
-            right_diagonal_matches = _scan_diagonal_direction(matrix, i, j, 'right') 
-            for diagonal_match in right_diagonal_matches:
-                if diagonal_match not in match_indices:
-                    match_indices.append(diagonal_match)
-
-            left_diagonal_matches = _scan_diagonal_direction(matrix, i, j, 'left')
-            for diagonal_match in left_diagonal_matches:
-                if diagonal_match not in match_indices:
-                    match_indices.append(diagonal_match)
+    match_indices = set() # set so overlapping diagonal matches are only counted once
+    for diagonal in _diagonal_lines(len(matrix), len(matrix[0])):
+        match_indices.update(_scan_line_runs(matrix, diagonal))
         
-    return match_indices
+    return list(match_indices)
+
+
+def _diagonal_lines(rows: int, columns: int):
+    """ Yields every diagonal of a field with the given number of rows and columns
+        as a list of coordinates, first going down-right and then going down-left. """
 
+    # down-right diagonals start on the left edge or the top edge
+    for start_row, start_column in [(row, 0) for row in range(rows)] + [(0, column) for column in range(1, columns)]:
+        length = min(rows - start_row, columns - start_column)
+        yield [(start_row + delta, start_column + delta) for delta in range(length)]
 
-def _scan_diagonal_direction(matrix: list[list[str]], current_row_index: int, current_column_index: int, direction: str):
-    """ Given either a 'right' or 'left' direction, the function will scan for diagonal
-        matches only in that direction (up, right, up, etc...) or (up, left, up, etc...)"""
+    # down-left diagonals start on the top edge or the right edge
+    for start_row, start_column in [(0, column) for column in range(columns)] + [(row, columns - 1) for row in range(1, rows)]:
+        length = min(rows - start_row, start_column + 1)
+        yield [(start_row + delta, start_column - delta) for delta in range(length)]
+
+
+def _scan_line_runs(matrix: list[list[str]], line: list[tuple]) -> list[tuple]:
+    """ Given a line of coordinates in the field, walks it once and returns the 
+        coordinates of every run of 3 or more identical jewels along it. """
 
     match_indices = []
-    vertical_index_counter = current_row_index
-    horizontal_index_counter = current_column_index
-    horizontal_index_delta = 1 if direction == "right" else (-1 if direction == "left" else None)
-    current_jewel = matrix[current_row_index][current_column_index]
-    counter = 0 # to determine how long the match is
-    while True:
-        if vertical_index_counter < 0 \
-            or horizontal_index_counter > len(matrix[current_row_index]) - 1 \
-            or horizontal_index_counter < 0: # handle out of bounds indices
-                break
-        if matrix[vertical_index_counter][horizontal_index_counter] != current_jewel \
-            or matrix[vertical_index_counter][horizontal_index_counter] == EMPTY: # match streak broken
-            break
-
-        counter += 1
-        vertical_index_counter += -1
-        horizontal_index_counter += horizontal_index_delta
-    if counter >= 3:
-        for delta in range(counter):
-            new_point = (current_row_index - delta, current_column_index + (delta * horizontal_index_delta))
-            match_indices.append(new_point)
+    run_start = 0
+    for i in range(1, len(line) + 1):
+        # the run continues while the jewel is the same as the jewel at the start of the run
+        if i < len(line):
+            row, column = line[i]
+            start_row, start_column = line[run_start]
+            if matrix[row][column] == matrix[start_row][start_column]:
+                continue
+
+        start_row, start_column = line[run_start]
+        if i - run_start >= 3 and matrix[start_row][start_column] != EMPTY:
+            match_indices.extend(line[run_start:i])
+        run_start = i
 
     return match_indices
+
+
+def _check_matches_through_cells(matrix: list[list[str]], cells) -> list[tuple]:
+    """ Given a 2D list and an iterable of (row, column) cells that changed since the 
+        last check, a list of tuple coordinates are returned representing every match
+        (horizontal, vertical or diagonal) that passes through one of those cells. 
+        Only the runs touching the changed cells are walked, so the cost depends on 
+        the number of changed cells rather than the size of the field. """
+
+    match_indices = set()
+    for row, column in cells:
+        for row_delta, column_delta in _MATCH_DIRECTIONS:
+            if row_delta == 0 and row < 2: # horizontal matches are never counted in the two hidden rows
+                continue
+            match_indices.update(_scan_run_through_cell(matrix, row, column, row_delta, column_delta))
+
+    return list(match_indices)
+
+
+def _scan_run_through_cell(matrix: list[list[str]], row: int, column: int,
+                           row_delta: int, column_delta: int) -> list[tuple]:
+    """ Extends outwards from the given cell in both senses of a direction and returns
+        the coordinates of the run containing the cell if it is at least 3 jewels long. """
+
+    current_jewel = matrix[row][column]
+    if current_jewel == EMPTY:
+        return []
+
+    last_row_index = len(matrix) - 1
+    last_column_index = len(matrix[0]) - 1
+
+    # walk backwards to find the start of the run
+    start_row, start_column = row, column
+    while 0 <= start_row - row_delta <= last_row_index \
+        and 0 <= start_column - column_delta <= last_column_index \
+        and matrix[start_row - row_delta][start_column - column_delta] == current_jewel:
+        start_row -= row_delta
+        start_column -= column_delta
+
+    # walk forwards from the start, collecting the run
+    run = []
+    current_row, current_column = start_row, start_column
+    while 0 <= current_row <= last_row_index \
+        and 0 <= current_column <= last_column_index \
+        and matrix[current_row][current_column] == current_jewel:
+        run.append((current_row, current_column))
+        current_row += row_delta
+        current_column += column_delta
+
+    if len(run) >= 3:
+        return run
+    return []
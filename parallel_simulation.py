@@ -0,0 +1,124 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from simulation import iterate_games, RandomMovePolicy, _DEFAULT_DIMENSIONS, _DEFAULT_MAX_TICKS
+
+_DEFAULT_GAMES_PER_SHARD = 250
+
+
+class SimulationAggregate:
+    def __init__(self) -> None:
+        """ Running totals over simulated games. Only integer totals are kept, so 
+            merging partial aggregates in any order gives exactly the same result. """
+
+        self.games = 0
+        self.ticks = 0
+        self.score = 0
+        self.cascades = 0
+        self.max_score = 0
+        self.max_ticks = 0
+        self.game_over_causes = dict() # number of games that ended for each reason
+
+    def add(self, stats) -> None:
+        """ Adds the stats of a single game to the totals. """
+
+        self.games += 1
+        self.ticks += stats.ticks
+        self.score += stats.score
+        self.cascades += stats.cascades
+        self.max_score = max(self.max_score, stats.score)
+        self.max_ticks = max(self.max_ticks, stats.ticks)
+        self.game_over_causes[stats.game_over_cause] = self.game_over_causes.get(stats.game_over_cause, 0) + 1
+
+    def merge(self, other: 'SimulationAggregate') -> None:
+        """ Adds the totals of another aggregate to this one. """
+
+        self.games += other.games
+        self.ticks += other.ticks
+        self.score += other.score
+        self.cascades += other.cascades
+        self.max_score = max(self.max_score, other.max_score)
+        self.max_ticks = max(self.max_ticks, other.max_ticks)
+        for cause, count in other.game_over_causes.items():
+            self.game_over_causes[cause] = self.game_over_causes.get(cause, 0) + count
+
+    def to_dict(self) -> dict:
+        return {"games": self.games, "ticks": self.ticks, "score": self.score,
+                "cascades": self.cascades, "max_score": self.max_score, "max_ticks": self.max_ticks,
+                "game_over_causes": dict(self.game_over_causes)}
+
+    def to_json(self) -> str:
+        """ Returns the totals as JSON with sorted keys, so the same totals always
+            produce the same bytes. """
+
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+
+def run_parallel_simulation(games: int, master_seed = 0, workers: int = None, move_policy_factory = None,
+                            dimensions: tuple = _DEFAULT_DIMENSIONS, max_ticks: int = _DEFAULT_MAX_TICKS,
+                            games_per_shard: int = _DEFAULT_GAMES_PER_SHARD) -> tuple[SimulationAggregate, float]:
+    """ Plays the given number of games split into shards across a pool of worker processes
+        (one per core by default) and returns the aggregate of every game and the seconds taken.
+        Game i is seeded from master_seed and i, so the aggregate is identical for any number of
+        workers. Shard results are merged as they arrive instead of keeping every game's stats. """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    shards = [(first_game, min(games_per_shard, games - first_game), master_seed,
+               move_policy_factory, dimensions, max_ticks)
+              for first_game in range(0, games, games_per_shard)]
+
+    start = time.perf_counter()
+    aggregate = SimulationAggregate()
+    if workers <= 1: # no need to start processes for a single worker
+        for shard in shards:
+            aggregate.merge(_simulate_shard(shard))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for shard_aggregate in pool.imap_unordered(_simulate_shard, shards):
+                aggregate.merge(shard_aggregate)
+    seconds = time.perf_counter() - start
+
+    return (aggregate, seconds)
+
+
+def _simulate_shard(shard: tuple) -> SimulationAggregate:
+    """ Plays every game in a shard inside a worker process and returns their aggregate. """
+
+    first_game, games, master_seed, move_policy_factory, dimensions, max_ticks = shard
+
+    aggregate = SimulationAggregate()
+    for stats in iterate_games(games, master_seed, move_policy_factory, dimensions, max_ticks, first_game):
+        aggregate.add(stats)
+
+    return aggregate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays Columns games on every core and aggregates the results.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rows", type=int, default=_DEFAULT_DIMENSIONS[0])
+    parser.add_argument("--columns", type=int, default=_DEFAULT_DIMENSIONS[1])
+    parser.add_argument("--max-ticks", type=int, default=_DEFAULT_MAX_TICKS)
+    parser.add_argument("--games-per-shard", type=int, default=_DEFAULT_GAMES_PER_SHARD)
+    parser.add_argument("--random-moves", action="store_true", help="shift and rotate fallers randomly")
+    arguments = parser.parse_args()
+
+    move_policy_factory = RandomMovePolicy if arguments.random_moves else None
+    aggregate, seconds = run_parallel_simulation(arguments.games, arguments.seed, arguments.workers,
+                                                 move_policy_factory, (arguments.rows, arguments.columns),
+                                                 arguments.max_ticks, arguments.games_per_shard)
+
+    print(aggregate.to_json())
+    print(f"seconds: {seconds:.3f}  games/second: {aggregate.games / seconds:.1f}  "
+          f"ticks/second: {aggregate.ticks / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
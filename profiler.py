@@ -0,0 +1,192 @@
+import atexit
+import json
+import time
+
+# (phase, method) pairs timed by Profiler.instrument_state and Profiler.instrument_game.
+# Phases nest (ex: a tick that freezes the faller also scans for matches), so times are inclusive.
+STATE_PHASES = (("state.tick", "tick"),
+                ("state.move", "_move_faller_down"),
+                ("state.land", "_land_faller"),
+                ("state.freeze", "_freeze_faller"),
+                ("state.match_scan", "_update_new_matches"),
+                ("state.clear", "_clear_matched_jewels"),
+                ("state.gravity", "_bring_jewels_down_into_cleared_cells"))
+GAME_PHASES = (("game.frame", "_update_frame"),
+               ("game.handle_faller_motion", "_handle_faller_motion"),
+               ("game.default_faller_tick", "_default_faller_tick"),
+               ("game.redraw", "_redraw"))
+
+_HISTOGRAM_BUCKETS = 65 # bucket b holds durations of b bits, so up to 2**64 nanoseconds
+
+
+class TimingHistogram:
+    __slots__ = ('count', 'total_ns', 'max_ns', 'buckets')
+
+    def __init__(self) -> None:
+        """ Durations in nanoseconds, counted in power of two buckets so recording one
+            is a few integer operations and the memory used never grows. """
+
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * _HISTOGRAM_BUCKETS
+
+    def record(self, nanoseconds: int) -> None:
+        self.count += 1
+        self.total_ns += nanoseconds
+        if nanoseconds > self.max_ns:
+            self.max_ns = nanoseconds
+        self.buckets[nanoseconds.bit_length()] += 1
+
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count > 0 else 0.0
+
+    def percentile_ns(self, fraction: float) -> int:
+        """ Returns an upper bound (within a factor of two) on the duration that the
+            given fraction of the recorded durations don't exceed. """
+
+        if self.count == 0:
+            return 0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for bits, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min((1 << bits) - 1, self.max_ns)
+        return self.max_ns
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "total_ns": self.total_ns, "mean_ns": self.mean_ns(),
+                "p50_ns": self.percentile_ns(0.5), "p99_ns": self.percentile_ns(0.99), "max_ns": self.max_ns,
+                "buckets": {str((1 << bits) - 1): bucket_count # keyed by the longest duration in the bucket
+                            for bits, bucket_count in enumerate(self.buckets) if bucket_count > 0}}
+
+
+class Profiler:
+    def __init__(self, clock = time.perf_counter_ns) -> None:
+        """ Timing histograms for named phases and named counters. Games are profiled by
+            wrapping the methods of each phase on the instance only, so games that aren't
+            instrumented (and the GameState class itself) run exactly as without a profiler.
+            clock returns the current time in integer nanoseconds. """
+
+        self._clock = clock
+        self._histograms = dict() # maps phase name to its TimingHistogram
+        self._counters = dict()
+
+    def record(self, phase: str, nanoseconds: int) -> None:
+        """ Adds one duration of the given phase, for timing code that isn't a method. """
+        self._histogram(phase).record(nanoseconds)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def timed(self, phase: str, function):
+        """ Returns a function that calls the given one and records how long it took,
+            even if it raised. """
+
+        histogram = self._histogram(phase)
+        clock = self._clock
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.record(clock() - start)
+        return timed_function
+
+    def instrument_state(self, state) -> None:
+        """ Times every phase of the GameState's ticks, and counts the changes
+            (see game_mechanics.CHANGE_*) and cell writes made by each tick. """
+
+        self._instrument(state, STATE_PHASES)
+        timed_tick = state.tick
+
+        def counted_tick() -> bool:
+            try:
+                return timed_tick()
+            finally:
+                changes = state.last_changes()
+                self.increment("state.cells_written", len(changes.cells))
+                for kind, details in changes.events:
+                    self.increment("state." + kind)
+        state.tick = counted_tick
+
+    def instrument_game(self, game) -> None:
+        """ Times the phases of each frame of a ColumnsGame, and instruments its GameState. """
+
+        self._instrument(game, GAME_PHASES)
+        self.instrument_state(game._state)
+
+    def uninstrument(self, instrumented) -> None:
+        """ Removes the timing wrappers from a GameState, or a ColumnsGame and its GameState. """
+
+        for name in getattr(instrumented, '_instrumented_methods', ()):
+            delattr(instrumented, name)
+        instrumented._instrumented_methods = ()
+        if hasattr(instrumented, '_state'):
+            self.uninstrument(instrumented._state)
+
+    def histogram(self, phase: str) -> TimingHistogram:
+        """ Returns the histogram of the given phase, or None if it was never timed. """
+        return self._histograms.get(phase)
+
+    def counter(self, counter: str) -> int:
+        return self._counters.get(counter, 0)
+
+    def reset(self) -> None:
+        """ Forgets every recorded duration and count, keeping instrumented games profiled. """
+
+        for histogram in self._histograms.values():
+            histogram.reset()
+        self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """ Returns everything recorded so far, while the game keeps running. """
+
+        return {"phases": {phase: histogram.to_dict() for phase, histogram in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items()))}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=1)
+
+    def report(self) -> str:
+        """ Returns a table of every phase's timings in microseconds, followed by the counters. """
+
+        lines = [f"{'phase':<28} {'count':>9} {'mean':>10} {'p50':>10} {'p99':>10} {'max':>10} {'total ms':>10}"]
+        for phase, histogram in sorted(self._histograms.items()):
+            lines.append(f"{phase:<28} {histogram.count:>9} {histogram.mean_ns() / 1e3:>10.2f} "
+                         f"{histogram.percentile_ns(0.5) / 1e3:>10.2f} {histogram.percentile_ns(0.99) / 1e3:>10.2f} "
+                         f"{histogram.max_ns / 1e3:>10.2f} {histogram.total_ns / 1e6:>10.2f}")
+        for counter, count in sorted(self._counters.items()):
+            lines.append(f"{counter:<28} {count:>9}")
+        return "\n".join(lines)
+
+    def dump(self, path: str = None) -> None:
+        """ Writes the snapshot as JSON to the given path, or prints the report if there is none. """
+
+        if path is None:
+            print(self.report())
+        else:
+            with open(path, "w") as file:
+                file.write(self.to_json())
+
+    def dump_on_exit(self, path: str = None) -> None:
+        """ Dumps everything recorded (see dump) when the interpreter exits. """
+        atexit.register(self.dump, path)
+
+    def _instrument(self, instrumented, phases: tuple) -> None:
+        """ Replaces the methods of the given phases with timed ones on this instance only. """
+
+        self.uninstrument(instrumented) # never time the same call twice
+        for phase, name in phases:
+            setattr(instrumented, name, self.timed(phase, getattr(instrumented, name)))
+        instrumented._instrumented_methods = tuple(name for phase, name in phases)
+
+    def _histogram(self, phase: str) -> TimingHistogram:
+        if phase not in self._histograms:
+            self._histograms[phase] = TimingHistogram()
+        return self._histograms[phase]
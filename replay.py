@@ -0,0 +1,278 @@
+import argparse
+import bisect
+import mmap
+import struct
+
+from game_mechanics import GameState
+from game_mechanics_errors import (FallerAlreadyActiveError, FallerNotActiveError, InvalidFallerJewelNumbers,
+                                   InvalidMoveError, InvalidColumnError, InvalidJewelError,
+                                   InvalidSnapshotError, InvalidReplayError)
+from array_field import encode_jewel, decode_jewel
+from faller import Faller
+
+# replay file layout: a header, then records of a one byte command followed by its arguments
+_REPLAY_MAGIC = b"CLMR"
+_REPLAY_VERSION = 2 # keyframes are GameState snapshots, so this changes along with their version
+_REPLAY_HEADER = struct.Struct("<4sBI") # magic, version, keyframe interval
+_DEFAULT_KEYFRAME_INTERVAL = 100 # ticks between keyframe snapshots
+
+_CREATE_FALLER = 1
+_SHIFT_LEFT = 2
+_SHIFT_RIGHT = 3
+_ROTATE = 4
+_TICK = 5
+_KEYFRAME = 6
+
+_CREATE_FALLER_ARGUMENTS = struct.Struct("<3sH") # jewels, column
+_KEYFRAME_ARGUMENTS = struct.Struct("<II") # ticks so far, length of the snapshot that follows
+
+# errors of a recorded command or keyframe that can't be replayed
+_REPLAY_ERRORS = (FallerAlreadyActiveError, FallerNotActiveError, InvalidFallerJewelNumbers, InvalidMoveError,
+                  InvalidColumnError, InvalidJewelError, InvalidSnapshotError)
+
+
+class ReplayRecorder:
+    def __init__(self, path: str, state: GameState, keyframe_interval: int = _DEFAULT_KEYFRAME_INTERVAL) -> None:
+        """ Records every command applied to the game state to a new replay file.
+            Commands are applied through the recorder instead of the state directly.
+            Each command is written before it is applied, and removed again if the
+            state rejects it, so the file never falls behind or gets ahead of the state.
+            A snapshot of the state is written when recording starts and then once
+            every keyframe_interval ticks, so seeking never replays more ticks than that. """
+
+        self.state = state
+        self._keyframe_interval = keyframe_interval
+        self._ticks = 0
+        self._file = open(path, "wb")
+        self._file.write(_REPLAY_HEADER.pack(_REPLAY_MAGIC, _REPLAY_VERSION, keyframe_interval))
+        self._write_keyframe()
+
+    def create_faller(self, jewels: list, column: int) -> None:
+        record = bytes([_CREATE_FALLER]) + _CREATE_FALLER_ARGUMENTS.pack(
+            bytes(encode_jewel(jewel) for jewel in jewels), column)
+        self._record(record, self.state.create_faller, jewels, column)
+
+    def shift_faller(self, direction: str) -> bool:
+        return self._record(bytes([_SHIFT_LEFT if direction == "left" else _SHIFT_RIGHT]),
+                            self.state.shift_faller, direction)
+
+    def rotate_faller(self) -> Faller:
+        return self._record(bytes([_ROTATE]), self.state.rotate_faller)
+
+    def tick(self) -> bool:
+        moved = self._record(bytes([_TICK]), self.state.tick)
+        self._ticks += 1
+        if self._ticks % self._keyframe_interval == 0:
+            self._write_keyframe()
+        return moved
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'ReplayRecorder':
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+    def _record(self, record: bytes, command, *arguments):
+        """ Appends the record of a command, then applies the command to the state and returns
+            its result. The record is cut off the file again if the command raises. """
+
+        record_offset = self._file.tell()
+        self._file.write(record)
+        try:
+            return command(*arguments)
+        except BaseException:
+            self._file.seek(record_offset)
+            self._file.truncate()
+            raise
+
+    def _write_keyframe(self) -> None:
+        """ Appends a snapshot of the current state, and flushes the file so
+            everything up to the keyframe survives a crash. """
+
+        snapshot = self.state.to_bytes()
+        self._file.write(bytes([_KEYFRAME]) + _KEYFRAME_ARGUMENTS.pack(self._ticks, len(snapshot)) + snapshot)
+        self._file.flush()
+
+
+class ReplayReader:
+    def __init__(self, path: str) -> None:
+        """ Opens a replay file by memory-mapping it, and indexes its keyframes
+            without decoding them. A record cut off at the end of the file (for
+            example by a crash while recording) is ignored. """
+
+        self._file = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty files can't be mapped
+            self._file.close()
+            raise InvalidReplayError(f"{path} is too short to be a replay")
+
+        try:
+            self._index_keyframes(path)
+        except BaseException: # including an unknown command while indexing
+            self.close()
+            raise
+
+    def ticks(self) -> int:
+        """ Returns the number of ticks recorded. """
+        return self._ticks
+
+    def state_at(self, tick: int, array_field: bool = False) -> GameState:
+        """ Returns the game state right after the given number of ticks (before any
+            commands that followed it), starting from the closest keyframe before it. """
+
+        if tick < 0 or tick > self._ticks:
+            raise ValueError(f"tick must be between 0 and {self._ticks}")
+
+        keyframe_index = bisect.bisect_right(self._keyframe_ticks, tick) - 1
+        keyframe_offset = self._keyframe_offsets[keyframe_index]
+        ticks = self._keyframe_ticks[keyframe_index]
+        state = None
+
+        for command, arguments, record_offset, next_offset in self._records(keyframe_offset):
+            if command == _KEYFRAME:
+                if state is None:
+                    state = GameState.from_bytes(self._snapshot(arguments, next_offset), array_field=array_field)
+                continue
+            if ticks == tick:
+                break
+            _apply_command(state, command, arguments)
+            if command == _TICK:
+                ticks += 1
+
+        return state
+
+    def validate(self) -> None:
+        """ Replays the whole file from the first keyframe and checks that every later
+            keyframe matches the replayed state. Raises InvalidReplayError if not. """
+
+        state = None
+        for command, arguments, offset, next_offset in self._records(self._keyframe_offsets[0]):
+            try:
+                if command != _KEYFRAME:
+                    _apply_command(state, command, arguments)
+                elif state is None:
+                    state = GameState.from_bytes(self._snapshot(arguments, next_offset))
+                elif state.to_bytes() != self._snapshot(arguments, next_offset):
+                    raise InvalidReplayError(f"replayed state differs from the keyframe at tick {arguments[0]}")
+            except _REPLAY_ERRORS as error:
+                raise InvalidReplayError(f"{type(error).__name__} while replaying the record at offset {offset}") from error
+
+    def close(self) -> None:
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self) -> 'ReplayReader':
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+    def _index_keyframes(self, path: str) -> None:
+        """ Checks the header and finds the tick count and offset of every keyframe,
+            and the number of ticks recorded. """
+
+        if len(self._data) < _REPLAY_HEADER.size:
+            raise InvalidReplayError(f"{path} is too short to be a replay")
+        magic, version, self._keyframe_interval = _REPLAY_HEADER.unpack_from(self._data, 0)
+        if magic != _REPLAY_MAGIC or version != _REPLAY_VERSION:
+            raise InvalidReplayError(f"{path} is not a replay of a supported version")
+
+        self._keyframe_ticks = [] # tick count of each keyframe, in order
+        self._keyframe_offsets = [] # offset of each keyframe record in the file
+        self._ticks = 0
+        for command, arguments, offset, next_offset in self._records(_REPLAY_HEADER.size):
+            if command == _TICK:
+                self._ticks += 1
+            elif command == _KEYFRAME:
+                self._keyframe_ticks.append(arguments[0])
+                self._keyframe_offsets.append(offset)
+
+        if len(self._keyframe_offsets) == 0:
+            raise InvalidReplayError(f"{path} has no keyframes")
+
+    def _snapshot(self, keyframe_arguments: tuple, next_offset: int) -> bytes:
+        """ Returns the snapshot of a keyframe record, copied out of the file only when needed. """
+        return self._data[keyframe_arguments[1]:next_offset]
+
+    def _records(self, offset: int):
+        """ Yields (command, arguments, offset, next offset) for each complete record
+            from the given offset to the end of the file. Keyframe arguments are the
+            tick count and the offset of the snapshot, which ends at the next offset (see _snapshot). """
+
+        data = self._data
+        while offset < len(data):
+            command = data[offset]
+            arguments_offset = offset + 1
+
+            if command == _CREATE_FALLER:
+                next_offset = arguments_offset + _CREATE_FALLER_ARGUMENTS.size
+                if next_offset > len(data):
+                    return
+                jewels, column = _CREATE_FALLER_ARGUMENTS.unpack_from(data, arguments_offset)
+                arguments = ([decode_jewel(code) for code in jewels], column)
+            elif command == _KEYFRAME:
+                snapshot_offset = arguments_offset + _KEYFRAME_ARGUMENTS.size
+                if snapshot_offset > len(data):
+                    return
+                ticks, snapshot_length = _KEYFRAME_ARGUMENTS.unpack_from(data, arguments_offset)
+                next_offset = snapshot_offset + snapshot_length
+                if next_offset > len(data):
+                    return
+                arguments = (ticks, snapshot_offset)
+            elif command in (_SHIFT_LEFT, _SHIFT_RIGHT, _ROTATE, _TICK):
+                next_offset = arguments_offset
+                arguments = ()
+            else:
+                raise InvalidReplayError(f"unknown command {command} at offset {offset}")
+
+            yield (command, arguments, offset, next_offset)
+            offset = next_offset
+
+
+def _apply_command(state: GameState, command: int, arguments: tuple) -> None:
+    """ Applies a recorded command to the game state. """
+
+    if command == _CREATE_FALLER:
+        state.create_faller(*arguments)
+    elif command == _SHIFT_LEFT:
+        state.shift_faller("left")
+    elif command == _SHIFT_RIGHT:
+        state.shift_faller("right")
+    elif command == _ROTATE:
+        state.rotate_faller()
+    elif command == _TICK:
+        state.tick()
+
+
+def validate_replays(paths: list[str]) -> dict:
+    """ Validates every replay file and returns a dictionary mapping each invalid
+        file to the reason it is invalid. """
+
+    invalid_replays = dict()
+    for path in paths:
+        try:
+            with ReplayReader(path) as reader:
+                reader.validate()
+        except (InvalidReplayError, OSError, struct.error) as error:
+            invalid_replays[path] = str(error)
+
+    return invalid_replays
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validates Columns replay files.")
+    parser.add_argument("paths", nargs="+")
+    arguments = parser.parse_args()
+
+    invalid_replays = validate_replays(arguments.paths)
+    for path, reason in invalid_replays.items():
+        print(f"{path}: {reason}")
+    print(f"{len(arguments.paths) - len(invalid_replays)} of {len(arguments.paths)} replays are valid")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import random
+import time
+from typing import NamedTuple
+
+from game_mechanics import GameState, EMPTY
+from game_mechanics_errors import InvalidMoveError
+from bot import PlacementBot, BotMovePolicy
+from array_field import numpy
+
+# same jewels as the colors used by the pygame display in main.py
+JEWELS = ("S", "T", "V", "W", "X", "Y", "Z")
+_DEFAULT_DIMENSIONS = (13, 6)
+_DEFAULT_MAX_TICKS = 10000
+
+# reasons a simulated game can end
+GAME_OVER_FALLER_BLOCKED = "faller_blocked" # a new faller was created in a full column
+GAME_OVER_JEWELS_OUT_OF_FIELD = "jewels_out_of_field" # jewels froze in the hidden rows
+GAME_OVER_TICK_LIMIT = "tick_limit" # the game was stopped after the maximum number of ticks
+
+
+class GameStats(NamedTuple):
+    """ Statistics of a single simulated game. """
+    score: int # number of jewels cleared by matches
+    cascades: int # number of matches that formed after jewels were brought down by a clear
+    ticks: int # number of ticks the game survived
+    game_over_cause: str
+
+
+class SimulationReport(NamedTuple):
+    """ Statistics of a batch of simulated games and how quickly they ran. """
+    games: list[GameStats]
+    total_ticks: int
+    seconds: float
+
+    def games_per_second(self) -> float:
+        return len(self.games) / self.seconds if self.seconds > 0 else float("inf")
+
+    def ticks_per_second(self) -> float:
+        return self.total_ticks / self.seconds if self.seconds > 0 else float("inf")
+
+
+class RandomFallerSource:
+    def __init__(self, seed = None, jewels: tuple = JEWELS) -> None:
+        """ Creates fallers of 3 random jewels in random columns, the same way
+            the pygame game does. A seed makes the stream of fallers reproducible. """
+
+        self._random = random.Random(seed)
+        self._jewels = list(jewels)
+
+    def __call__(self, state: GameState) -> tuple[list, int]:
+        """ Returns the jewels and column (starting at 1) for the next faller. """
+
+        open_columns = [column for column in range(1, state.columns() + 1)
+                        if state._field[0][column - 1] == EMPTY]
+        if len(open_columns) == 0: # choose any random column for new faller if all columns are full
+            column = self._random.randint(1, state.columns())
+        else:
+            column = self._random.choice(open_columns)
+
+        return (self._random.choices(self._jewels, k=3), column)
+
+
+class RandomMovePolicy:
+    def __init__(self, seed = None, move_probability: float = 0.3) -> None:
+        """ Randomly shifts and rotates the active faller, similar to a player
+            pressing random keys. """
+
+        self._random = random.Random(seed)
+        self._move_probability = move_probability
+
+    def __call__(self, state: GameState) -> list[str]:
+        """ Returns the moves to apply to the active faller before the next tick. """
+
+        if self._random.random() >= self._move_probability:
+            return []
+        return [self._random.choice(("left", "right", "rotate"))]
+
+
+def no_moves(state: GameState) -> list[str]:
+    """ Move policy that lets every faller drop straight down. """
+    return []
+
+
+class GameRunner:
+    def __init__(self, state: GameState, faller_source, move_policy = no_moves) -> None:
+        """ Plays a game on the given state one step at a time, counting its score,
+            cascades and ticks. faller_source is called with the game state whenever a 
+            new faller is needed and returns its jewels and column. move_policy is called
+            with the game state before every tick while a faller is active and returns
+            a list of moves ("left", "right" or "rotate"). """
+
+        self.state = state
+        self.score = 0
+        self.cascades = 0
+        self.ticks = 0
+        self.game_over_cause = None
+        self._faller_source = faller_source
+        self._move_policy = move_policy
+
+    def step(self) -> bool:
+        """ Creates a new faller if one is needed, otherwise applies the move policy
+            and ticks the game once. Returns True if the game has ended. """
+
+        state = self.state
+        if state._faller is None and not state._match_found_previous_tick:
+            jewels, column = self._faller_source(state)
+            state.create_faller(jewels, column)
+            if state.game_over():
+                self.game_over_cause = GAME_OVER_FALLER_BLOCKED
+                return True
+            return False
+
+        if state._faller is not None:
+            apply_moves(state, self._move_policy(state))
+
+        # matches displayed on the previous tick are cleared on this tick
+        clearing_matches = state._faller is None and state._match_found_previous_tick
+        cleared_jewels = len(state._matches)
+
+        state.tick()
+        self.ticks += 1
+
+        if clearing_matches:
+            self.score += cleared_jewels
+            if state._match_found_previous_tick: # new matches formed after jewels were brought down
+                self.cascades += 1
+        if state.game_over():
+            self.game_over_cause = GAME_OVER_JEWELS_OUT_OF_FIELD
+            return True
+        return False
+
+    def stats(self) -> GameStats:
+        """ Returns the stats of the game so far. """
+        return GameStats(self.score, self.cascades, self.ticks, self.game_over_cause)
+
+
+def simulate_game(faller_source, move_policy = no_moves, dimensions: tuple = _DEFAULT_DIMENSIONS,
+                  max_ticks: int = _DEFAULT_MAX_TICKS) -> GameStats:
+    """ Plays a single game without a display as fast as possible and returns its stats.
+        See GameRunner for the faller_source and move_policy arguments. """
+
+    runner = GameRunner(GameState(dimensions), faller_source, move_policy)
+    while runner.ticks < max_ticks:
+        if runner.step():
+            return runner.stats()
+
+    runner.game_over_cause = GAME_OVER_TICK_LIMIT
+    return runner.stats()
+
+
+def iterate_games(games: int, seed = None, move_policy_factory = None,
+                  dimensions: tuple = _DEFAULT_DIMENSIONS, max_ticks: int = _DEFAULT_MAX_TICKS,
+                  first_game: int = 0):
+    """ Yields the stats of each of the given number of games, one at a time, numbered from
+        first_game. Game i uses fallers from RandomFallerSource seeded with derive_game_seed(seed, i).
+        move_policy_factory is called with the same seed to create each game's move policy,
+        otherwise fallers are not moved. """
+
+    for i in range(first_game, first_game + games):
+        game_seed = derive_game_seed(seed, i)
+        move_policy = no_moves if move_policy_factory is None else move_policy_factory(game_seed)
+        yield simulate_game(RandomFallerSource(game_seed), move_policy, dimensions, max_ticks)
+
+
+def run_simulation(games: int, seed = None, move_policy_factory = None,
+                   dimensions: tuple = _DEFAULT_DIMENSIONS, max_ticks: int = _DEFAULT_MAX_TICKS) -> SimulationReport:
+    """ Plays the given number of games and returns their stats along with the time taken. """
+
+    start = time.perf_counter()
+    game_stats = list(iterate_games(games, seed, move_policy_factory, dimensions, max_ticks))
+    seconds = time.perf_counter() - start
+
+    return SimulationReport(game_stats, sum(stats.ticks for stats in game_stats), seconds)
+
+
+def derive_game_seed(seed, game_index: int):
+    """ Returns the seed for a single game, derived from the seed of the whole run.
+        String seeds are hashed the same way on every platform and in every process.
+        Returns None (an unpredictable game) if the run has no seed. """
+
+    if seed is None:
+        return None
+    return f"{seed}:{game_index}"
+
+
+def apply_moves(state: GameState, moves: list[str]) -> None:
+    """ Applies the moves to the active faller, ignoring moves that are not allowed. """
+
+    for move in moves:
+        try:
+            if move == "left" or move == "right":
+                state.shift_faller(move)
+            elif move == "rotate":
+                state.rotate_faller()
+        except InvalidMoveError:
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays Columns games without a display and reports throughput.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=_DEFAULT_DIMENSIONS[0])
+    parser.add_argument("--columns", type=int, default=_DEFAULT_DIMENSIONS[1])
+    parser.add_argument("--seed", default=None)
+    parser.add_argument("--max-ticks", type=int, default=_DEFAULT_MAX_TICKS)
+    parser.add_argument("--random-moves", action="store_true", help="shift and rotate fallers randomly")
+    parser.add_argument("--bot", action="store_true", help="let the placement search bot move the fallers")
+    parser.add_argument("--bot-time-budget", type=float, default=0.05, help="seconds the bot may search per faller")
+    arguments = parser.parse_args()
+
+    move_policy_factory = RandomMovePolicy if arguments.random_moves else None
+    if arguments.bot:
+        move_policy_factory = lambda game_seed: BotMovePolicy(PlacementBot(time_budget=arguments.bot_time_budget,
+                                                                           batched=numpy is not None))
+    report = run_simulation(arguments.games, arguments.seed, move_policy_factory,
+                            (arguments.rows, arguments.columns), arguments.max_ticks)
+
+    print(f"games: {len(report.games)}  ticks: {report.total_ticks}  seconds: {report.seconds:.3f}")
+    print(f"games/second: {report.games_per_second():.1f}  ticks/second: {report.ticks_per_second():.1f}")
+    if len(report.games) > 0:
+        print(f"mean score: {sum(stats.score for stats in report.games) / len(report.games):.2f}  "
+              f"mean cascades: {sum(stats.cascades for stats in report.games) / len(report.games):.2f}")
+
+
+if __name__ == "__main__":
+    main()
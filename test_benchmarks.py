@@ -0,0 +1,39 @@
+import unittest
+import random
+from game_mechanics import EMPTY
+from benchmarks import (run_benchmarks, compare_results, results_to_json, results_from_json, random_field,
+                        settled_state, BenchmarkResult)
+
+class TestBenchmarks(unittest.TestCase):
+    def test_every_case_is_measured_and_survives_json(self):
+        results = run_benchmarks(["vertical_matches", "tick", "playthrough"], [(5, 4), (8, 8)], [0.2, 0.8],
+                                 repeats=1, min_seconds=0)
+        self.assertEqual([result.key() for result in results][:3],
+                         [("vertical_matches", 5, 4, 0.2), ("vertical_matches", 5, 4, 0.8),
+                          ("vertical_matches", 8, 8, 0.2)])
+        self.assertEqual(len(results), 4 + 4 + 2) # playthroughs don't depend on the density
+        self.assertTrue(all(result.seconds > 0 and result.operations > 0 for result in results))
+        self.assertEqual(results_from_json(results_to_json(results)), results)
+
+    def test_compare_flags_only_slower_cases(self):
+        baseline = [BenchmarkResult("tick", 13, 6, 0.5, 1.0, 10), BenchmarkResult("tick", 50, 50, 0.5, 2.0, 10),
+                    BenchmarkResult("playthrough", 13, 6, 0.5, 1.0, 10)]
+        results = [BenchmarkResult("tick", 13, 6, 0.5, 1.05, 10), BenchmarkResult("tick", 50, 50, 0.5, 3.0, 10),
+                   BenchmarkResult("playthrough", 13, 6, 0.5, 2.0, 10), BenchmarkResult("tick", 5, 4, 0.5, 9.0, 10)]
+        regressions = compare_results(baseline, results, threshold=0.1)
+        self.assertEqual([regression.key for regression in regressions],
+                         [("playthrough", 13, 6, 0.5), ("tick", 50, 50, 0.5)])
+        self.assertEqual(regressions[0].ratio(), 2.0)
+
+    def test_generated_fields_have_requested_shape(self):
+        field = random_field((20, 10), 0.0, random.Random(0))
+        self.assertEqual((len(field), len(field[0])), (22, 10))
+        self.assertTrue(all(cell == EMPTY for row in field for cell in row))
+
+        state = settled_state((20, 10), 0.9, random.Random(0), 5)
+        self.assertTrue(all(row[5] == EMPTY for row in state._field))
+        self.assertEqual(state._matches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import time
+from game_mechanics import GameState
+from array_field import numpy
+from game_mechanics_errors import FallerNotActiveError
+from bot import PlacementBot, BotMovePolicy, Placement, placement_moves
+from simulation import simulate_game, GameRunner, RandomFallerSource, RandomMovePolicy, no_moves
+
+class TestPlacementBot(unittest.TestCase):
+    def setUp(self) -> None:
+        self._test_game_state = GameState((5, 4))
+
+    def test_bot_completes_a_horizontal_match(self):
+        self._test_game_state.fill_initial_field([[' ', ' ', ' ', ' '], [' ', ' ', ' ', ' '],
+                                                  [' ', ' ', ' ', ' '], [' ', ' ', ' ', ' '],
+                                                  ['X', 'X', ' ', 'Y']])
+        self._test_game_state.create_faller(['Y', 'Z', 'X'], 4)
+        placement = PlacementBot().choose_placement(self._test_game_state)
+        self.assertEqual((placement.column, placement.rotations), (3, 0)) # X lands next to the two others
+        self.assertEqual(placement_moves(self._test_game_state, placement), ["left"])
+
+    def test_bot_rotates_faller_into_a_vertical_match(self):
+        self._test_game_state.fill_initial_field([[' ', ' ', ' ', ' '], [' ', ' ', ' ', ' '],
+                                                  [' ', ' ', ' ', ' '], ['Z', ' ', ' ', 'Z'],
+                                                  ['Z', ' ', ' ', 'Z']])
+        self._test_game_state.create_faller(['Z', 'X', 'Y'], 1)
+        placement = PlacementBot().choose_placement(self._test_game_state)
+        self.assertIn(placement.column, (1, 4))
+        self.assertEqual(placement.rotations, 2) # Z ends up at the bottom of the faller
+        self.assertEqual(placement_moves(self._test_game_state, Placement(4, 2, 0.0)),
+                         ["rotate", "rotate", "right", "right", "right"])
+
+    def test_search_does_not_change_the_game(self):
+        self._test_game_state.create_faller(['X', 'Y', 'Z'], 2)
+        snapshot = self._test_game_state.to_bytes()
+        PlacementBot(depth=2).choose_placement(self._test_game_state, [['X', 'X', 'Y']])
+        self.assertEqual(self._test_game_state.to_bytes(), snapshot)
+
+    def test_transposition_table_reuses_settled_positions(self):
+        self._test_game_state.create_faller(['X', 'Y', 'Z'], 2)
+        bot = PlacementBot(depth=2, time_budget=10)
+        first_placement = bot.choose_placement(self._test_game_state, [['X', 'X', 'Y']])
+        hits = bot._table.hits
+        self.assertEqual(bot.choose_placement(self._test_game_state, [['X', 'X', 'Y']]), first_placement)
+        self.assertGreater(bot._table.hits, hits)
+
+        small_bot = PlacementBot(depth=2, time_budget=10, table_size=5)
+        small_bot.choose_placement(self._test_game_state, [['X', 'X', 'Y']])
+        self.assertEqual(len(small_bot._table), 5)
+
+    def test_reused_bot_scores_each_start_column_separately(self):
+        def walled_state() -> GameState: # column 2 is full, so fallers can't cross it
+            state = GameState((5, 4))
+            state.fill_initial_field([[' ', 'S', ' ', ' '], [' ', 'T', ' ', ' '], [' ', 'S', ' ', ' '],
+                                      [' ', 'T', ' ', ' '], [' ', 'S', ' ', ' ']])
+            return state
+
+        upcoming = (('X', 'Y', 'Z'),)
+        deadline = time.perf_counter() + 10
+        expected_scores = [PlacementBot(depth=2)._settled_score(walled_state(), upcoming, start_column, deadline)
+                           for start_column in (1, 4)]
+        self.assertNotEqual(expected_scores[0], expected_scores[1])
+        bot = PlacementBot(depth=2)
+        self.assertEqual([bot._settled_score(walled_state(), upcoming, start_column, deadline)
+                          for start_column in (1, 4)], expected_scores)
+
+    def test_bot_answers_within_time_budget(self):
+        self._test_game_state = GameState((13, 6))
+        self._test_game_state.create_faller(['X', 'Y', 'Z'], 3)
+        placement = PlacementBot(depth=4, time_budget=0).choose_placement(self._test_game_state,
+                                                                          [['X', 'Y', 'Z']] * 3)
+        self.assertEqual(placement.rotations, 0) # only had time for the first placement
+        self.assertRaises(FallerNotActiveError, PlacementBot().choose_placement, GameState((5, 4)))
+
+    def test_bot_outscores_dropping_fallers_in_place(self):
+        bot_stats = simulate_game(RandomFallerSource(0), BotMovePolicy(PlacementBot(time_budget=10)), max_ticks=500)
+        stats = simulate_game(RandomFallerSource(0), no_moves, max_ticks=500)
+        self.assertGreater(bot_stats.score, stats.score)
+        self.assertGreater(bot_stats.ticks, stats.ticks)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_batched_bot_chooses_same_placements(self):
+        bot = PlacementBot(time_budget=10)
+        batched_bot = PlacementBot(batched=True)
+        runner = GameRunner(GameState((8, 5)), RandomFallerSource(4, ("X", "Y", "Z")), RandomMovePolicy(4, 0.5))
+        for i in range(300):
+            if runner.state._faller is not None:
+                self.assertEqual(batched_bot.choose_placement(runner.state), bot.choose_placement(runner.state))
+            if runner.step():
+                break
+
+
+if __name__ == "__main__":
+    unittest.main()
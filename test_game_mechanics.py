@@ -1,8 +1,17 @@
 import unittest
-from game_mechanics import GameState
+import random
+from game_mechanics import (GameState, CELL_EMPTY, CELL_FALLING, CELL_LANDED,
+                            CELL_FROZEN, CELL_MATCHED, CHANGE_FALLER_CREATED, CHANGE_FALLER_MOVED,
+                            CHANGE_FALLER_ROTATED, CHANGE_FALLER_LANDED, CHANGE_FALLER_FALLING,
+                            CHANGE_FALLER_FROZEN, CHANGE_MATCHES_MARKED, CHANGE_MATCHES_CLEARED,
+                            CHANGE_GAME_OVER)
+from matching_mechanics import (_check_diagonal_matches, _check_horizontal_matches,
+                                _check_vertical_matches)
+from array_field import ArrayField, FieldBatch, encode_jewel, numpy
+from faller import Faller
 from game_mechanics_errors import (FallerAlreadyActiveError, FallerNotActiveError,
                                     InvalidFallerJewelNumbers, InvalidMoveError,
-                                    InvalidColumnError)
+                                    InvalidColumnError, InvalidSnapshotError, InvalidJewelError)
 
 class TestGameMechanics(unittest.TestCase):
     def setUp(self) -> None:
@@ -38,6 +47,22 @@ class TestGameMechanics(unittest.TestCase):
         self.assertEqual(self._test_game_state.rotate_faller(),
                          {"jewels": ["Z", "X", "Y"], "positions": [[0, 1], [1, 1], [2, 1]]})
         
+    def test_faller_moves_in_place(self):
+        self.setup_default_test_faller()
+        faller = self._test_game_state._faller
+        jewels = faller.jewels
+        self.assertIs(self._test_game_state.rotate_faller(), faller)
+        self._test_game_state.shift_faller("right")
+        self._test_game_state.tick()
+        self.assertIs(self._test_game_state._faller, faller)
+        self.assertIs(faller.jewels, jewels)
+        self.assertEqual((faller.jewels, faller.top_row, faller.column), (["Z", "X", "Y"], 1, 2))
+        self.assertEqual(faller['positions'], [[1, 2], [2, 2], [3, 2]])
+        self.assertEqual(faller.bottom_row(), 3)
+        self.assertRaises(KeyError, lambda: faller['column'])
+        self.assertEqual(faller, Faller(["Z", "X", "Y"], 1, 2))
+        self.assertRaises(TypeError, hash, faller) # changes in place, so never a dictionary key
+
     def test_moving_faller_down_a_row(self):
         self.setup_default_test_faller()
         self._test_game_state.tick()
@@ -220,6 +245,317 @@ class TestGameMechanics(unittest.TestCase):
         # the leftover "Y" jewel from the faller is still not visible in the field, so the game should end
         self.assertEqual(self._test_game_state._game_over, True) 
 
+    def test_incremental_matches_agree_with_full_scan_on_cascade(self):
+        self._test_game_state = GameState((4, 4), verify_matches=True) # raises if incremental check disagrees
+        custom_field = [
+            [ 0,   0,   0,   0],
+            [ 0,   0,   0,   0],
+            [ 0,   0,   0,   0],
+            ["S",  0,  "V", "X"],
+            ["T", "Y", "Y", "S"],
+            ["X", "X", "X", "Y"],
+        ]
+        self._test_game_state.fill_initial_field(custom_field)
+        self._test_game_state.tick()
+        self.assertEqual(sorted(self._test_game_state._matches), [(5, 1), (5, 2), (5, 3)])
+
+    def test_resolve_cascades_clears_every_step_at_once(self):
+        custom_field = [
+            [ 0,   0,   0,   0],
+            [ 0,   0,   0,   0],
+            ["S",  0,   0,   0],
+            ["T",  0,  "V", "X"],
+            ["V", "Y", "Y", "S"],
+            ["X", "X", "X", "Y"],
+        ]
+        self._test_game_state = GameState((4, 4), array_field=isinstance(self._test_game_state._field, ArrayField))
+        self._test_game_state.fill_initial_field(custom_field)
+        ticked_state = self._test_game_state.clone()
+        while ticked_state._match_found_previous_tick:
+            ticked_state.tick()
+
+        cleared_matches, field = self._test_game_state.resolve_cascades()
+        self.assertEqual([sorted(matches) for matches in cleared_matches],
+                         [[(5, 0), (5, 1), (5, 2)], [(5, 1), (5, 2), (5, 3)]])
+        self.assertEqual(field, ticked_state._field)
+        self.assertEqual(self._test_game_state.to_bytes(), ticked_state.to_bytes())
+        self.assertEqual(self._test_game_state.resolve_cascades(), ([], field))
+        self.assertEqual(type(field), list)
+        field[5][0] = "Z" # a copy, not the game's field
+        self.assertEqual(self._test_game_state._field[5][0], ticked_state._field[5][0])
+
+    def test_resolve_cascades_requires_frozen_faller(self):
+        self.setup_default_test_faller()
+        self.assertRaises(FallerAlreadyActiveError, self._test_game_state.resolve_cascades)
+
+    def test_incremental_matches_found_when_faller_freezes(self):
+        self._test_game_state = GameState((5, 4), verify_matches=True)
+        self._test_game_state.create_faller(['X', 'X', 'X'], 2)
+        for i in range(5):
+            self._test_game_state.tick()
+        self.assertEqual(sorted(self._test_game_state._matches), [(4, 1), (5, 1), (6, 1)])
+
+    def test_crossing_diagonal_matches_counted_once(self):
+        field = [
+            ["X",  0,  "X"],
+            [ 0,  "X",  0 ],
+            ["X",  0,  "X"],
+            [ 0,   0,   0 ],
+        ]
+        diagonal_matches = _check_diagonal_matches(field)
+        self.assertEqual(len(diagonal_matches), 5) # center jewel is shared by both diagonals
+        self.assertEqual(set(diagonal_matches), {(0, 0), (1, 1), (2, 2), (0, 2), (2, 0)})
+
+    def test_floating_jewels_brought_down_in_changed_columns_only(self):
+        custom_field = [
+            [ 0,   0,   0,   0],
+            [ 0,   0,   0,   0],
+            [ 0,   0,   0,   0],
+            ["X",  0,   0,  "S"],
+            [ 0,   0,  "T", "V"],
+            ["T",  0,   0,  "S"],
+            [ 0,  "Y",  0,  "Y"],
+        ]
+        self._test_game_state._load_initial_jewel_positions(custom_field)
+        changed_columns = self._test_game_state._bring_floating_jewels_down()
+        self.assertEqual(changed_columns, {0, 2})
+        self.assertEqual(self._test_game_state._field,
+                         [[0,0,0,0],[0,0,0,0],[0,0,0,0],[0,0,0,"S"],[0,0,0,"V"],["X",0,0,"S"],["T","Y","T","Y"]])
+
+    def test_cleared_cells_only_move_the_stack_above_them(self):
+        self._test_game_state = GameState((200, 3))
+        self._test_game_state.fill_initial_field([[' ', ' ', ' ']] * 198 + [['Y', ' ', ' '], ['Z', 'Z', 'X']])
+        self._test_game_state.create_faller(['Z', 'X', 'X'], 3)
+        while self._test_game_state._faller is not None:
+            self._test_game_state.tick()
+        self._test_game_state.tick() # clears the X column, which brings the Z down next to the other two
+        self.assertEqual(sorted(self._test_game_state._matches), [(201, 0), (201, 1), (201, 2)])
+        self.assertTrue(all(row >= 198 for row, column, jewel in self._test_game_state.last_changes().cells))
+        self._test_game_state.tick()
+        self.assertEqual(self._test_game_state._field[200:], [[0, 0, 0], ['Y', 0, 0]])
+        self.assertFalse(self._test_game_state.game_over())
+
+    def test_changed_cells_track_faller_movement(self):
+        self.setup_default_test_faller()
+        self.assertEqual(self._test_game_state.take_changed_cells(), {(0, 1), (1, 1), (2, 1)})
+        self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.take_changed_cells(), {(0, 1), (1, 1), (2, 1), (3, 1)})
+        self.assertEqual(self._test_game_state.take_changed_cells(), set()) # nothing changed since last taken
+
+    def test_changed_cells_include_matches_and_cleared_columns(self):
+        self._test_game_state.create_faller(['X', 'X', 'X'], 2)
+        for i in range(5):
+            self._test_game_state.tick()
+        self._test_game_state.take_changed_cells()
+        self._test_game_state.tick() # clears the vertical match
+        self.assertEqual(self._test_game_state.take_changed_cells(), {(4, 1), (5, 1), (6, 1)})
+
+    def test_cell_statuses_follow_faller_through_landing_and_freezing(self):
+        self.setup_default_test_faller()
+        self.assertEqual(self._test_game_state.cell_status((2, 1)), CELL_FALLING)
+        self._test_game_state.shift_faller('right')
+        self.assertEqual(self._test_game_state.cell_status((2, 1)), CELL_EMPTY)
+        self.assertEqual(self._test_game_state.cell_status((2, 2)), CELL_FALLING)
+
+        for i in range(4):
+            self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.cell_status((6, 2)), CELL_LANDED)
+        self._test_game_state.tick()
+        self.assertEqual([row[2] for row in self._test_game_state.cell_statuses()],
+                         [CELL_EMPTY, CELL_EMPTY, CELL_EMPTY, CELL_EMPTY, CELL_FROZEN, CELL_FROZEN, CELL_FROZEN])
+
+    def test_cell_statuses_mark_matched_jewels(self):
+        self._test_game_state.create_faller(['X', 'X', 'X'], 2)
+        self._test_game_state.rotate_faller()
+        for i in range(5):
+            self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.cell_status((5, 1)), CELL_MATCHED)
+        self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.cell_status((5, 1)), CELL_EMPTY)
+
+    def test_snapshot_round_trip_with_landed_faller(self):
+        self._test_game_state._field[6][1] = "S"
+        self.setup_default_test_faller()
+        for i in range(3):
+            self._test_game_state.tick()
+        restored_state = GameState.from_bytes(self._test_game_state.to_bytes())
+        self.assertEqual(restored_state._field, self._test_game_state._field)
+        self.assertEqual(restored_state._faller, self._test_game_state._faller)
+        self.assertEqual(restored_state._faller_landed, True)
+        self.assertEqual(restored_state.cell_status((5, 1)), CELL_LANDED)
+        self.assertEqual(restored_state.to_bytes(), self._test_game_state.to_bytes())
+
+    def test_snapshot_round_trip_with_matches(self):
+        self._test_game_state.create_faller(['X', 'X', 'X'], 2)
+        for i in range(5):
+            self._test_game_state.tick()
+        restored_state = GameState.from_bytes(self._test_game_state.to_bytes())
+        self.assertEqual(restored_state._matches, self._test_game_state._matches)
+        self.assertEqual(restored_state._match_found_previous_tick, True)
+        restored_state.tick() # matches are cleared from the restored game too
+        self.assertEqual(restored_state._field, [[0,0,0,0]] * 7)
+
+    def test_large_field_snapshot_round_trip(self):
+        self._test_game_state = GameState((260, 260))
+        self._test_game_state._field = [["X"] * 260 for i in range(262)]
+        self._test_game_state._matches = [(row, column) for row in range(2, 262) for column in range(260)]
+        self._test_game_state._match_found_previous_tick = True
+        self.assertGreater(len(self._test_game_state._matches), 65535)
+
+        restored_state = GameState.from_bytes(self._test_game_state.to_bytes())
+        self.assertEqual((restored_state.rows(), restored_state.columns()), (260, 260))
+        self.assertEqual(restored_state._matches, self._test_game_state._matches)
+        self.assertEqual(restored_state.to_bytes(), self._test_game_state.to_bytes())
+
+    def test_invalid_snapshot_rejected(self):
+        self.assertRaises(InvalidSnapshotError, GameState.from_bytes, b"not a snapshot")
+        self.assertRaises(InvalidSnapshotError, GameState.from_bytes, self._test_game_state.to_bytes()[:-1])
+
+    def test_position_hash_same_for_same_position_reached_differently(self):
+        self.setup_default_test_faller()
+        starting_hash = self._test_game_state.position_hash()
+        self._test_game_state.shift_faller("left")
+        shifted_hash = self._test_game_state.position_hash()
+        self._test_game_state.shift_faller("right")
+        self.assertNotEqual(shifted_hash, starting_hash)
+        self.assertEqual(self._test_game_state.position_hash(), starting_hash)
+        for i in range(3):
+            self._test_game_state.rotate_faller()
+        self.assertEqual(self._test_game_state.position_hash(), starting_hash)
+        self._test_game_state.tick()
+        self.assertNotEqual(self._test_game_state.position_hash(), starting_hash)
+
+    def test_position_hash_includes_faller_status(self):
+        self._test_game_state.create_faller(['X', 'Y', 'Z'], 2)
+        for i in range(4):
+            self._test_game_state.tick()
+        self.assertEqual(self._test_game_state._faller_landed, True)
+        landed_hash = self._test_game_state.position_hash()
+        self._test_game_state.tick()
+        self.assertEqual(self._test_game_state._field[6][1], "Z") # same jewels, now frozen
+        self.assertNotEqual(self._test_game_state.position_hash(), landed_hash)
+        self.assertEqual(GameState((5, 4)).position_hash(), 0)
+
+    def test_any_list_field_jewel_can_be_read_and_hashed(self):
+        list_game_state = GameState((5, 4), verify_hash=True) # lists store any jewel
+        list_game_state.create_faller(['XX', 0, 'Y'], 2)
+        self.assertEqual(list_game_state._stale_cell_hashes, {(0, 1), (1, 1), (2, 1)})
+        self.assertTrue(list_game_state.coordinate_in_faller((0, 1)))
+        self.assertEqual(len(list_game_state._stale_cell_hashes), 3) # reading statuses doesn't hash
+        faller_hash = list_game_state.position_hash()
+        list_game_state.shift_faller("left")
+        self.assertNotEqual(list_game_state.position_hash(), faller_hash)
+        list_game_state.shift_faller("right")
+        self.assertEqual(list_game_state.position_hash(), faller_hash)
+
+    def test_position_hash_verified_against_full_recompute(self):
+        self._test_game_state._verify_hash = True
+        generator = random.Random(0)
+        for i in range(200):
+            if self._test_game_state._faller is None and not self._test_game_state._match_found_previous_tick:
+                self._test_game_state.create_faller(generator.choices(["X", "Y"], k=3), generator.randint(1, 4))
+                if self._test_game_state.game_over():
+                    break
+            elif self._test_game_state._faller is not None and generator.random() < 0.5:
+                try:
+                    self._test_game_state.shift_faller(generator.choice(["left", "right"]))
+                except InvalidMoveError:
+                    pass
+            else:
+                self._test_game_state.tick()
+            self._test_game_state.position_hash() # raises HashVerificationError on a mismatch
+        restored_state = GameState.from_bytes(self._test_game_state.to_bytes())
+        self.assertEqual(restored_state.position_hash(), self._test_game_state.position_hash())
+
+    def test_clone_is_independent_of_original(self):
+        self._test_game_state._field[6][0] = "S"
+        self.setup_default_test_faller()
+        clone = self._test_game_state.clone()
+        clone.shift_faller("left")
+        for i in range(3):
+            clone.tick()
+        self._test_game_state.rotate_faller()
+        self.assertEqual(self._test_game_state._faller,
+                         Faller(['Z', 'X', 'Y'], 0, 1))
+        self.assertEqual(clone._faller, Faller(['X', 'Y', 'Z'], 3, 0))
+        self.assertEqual([row[0] for row in clone._field], [0, 0, 0, "X", "Y", "Z", "S"])
+        self.assertEqual([row[0] for row in self._test_game_state._field], [0, 0, 0, 0, 0, 0, "S"])
+        self.assertEqual(clone.cell_status((5, 0)), CELL_LANDED)
+        self.assertEqual(self._test_game_state.cell_status((5, 0)), CELL_EMPTY)
+
+    def test_clone_shares_unchanged_rows(self):
+        self.setup_default_test_faller()
+        clone = self._test_game_state.clone()
+        clone.tick()
+        if not isinstance(clone._field, ArrayField):
+            self.assertIs(clone._field[5], self._test_game_state._field[5])
+            self.assertIsNot(clone._field[3], self._test_game_state._field[3])
+        self.assertEqual(clone.position_hash(), clone._compute_position_hash())
+        self.assertEqual(self._test_game_state.position_hash(), self._test_game_state._compute_position_hash())
+
+    def test_clones_play_the_same_as_snapshot_copies(self):
+        generator = random.Random(2)
+        for i in range(300):
+            if self._test_game_state._faller is None and not self._test_game_state._match_found_previous_tick:
+                self._test_game_state.create_faller(generator.choices(["X", "Y"], k=3), generator.randint(1, 4))
+                if self._test_game_state.game_over():
+                    break
+            else:
+                self._test_game_state.tick()
+            clone = self._test_game_state.clone()
+            copied_state = GameState.from_bytes(self._test_game_state.to_bytes(),
+                                                array_field=isinstance(clone._field, ArrayField))
+            if clone._faller is not None or clone._match_found_previous_tick: # the clone's tick mustn't change the original
+                clone.tick()
+                copied_state.tick()
+            self.assertEqual(clone.to_bytes(), copied_state.to_bytes())
+            self.assertEqual(clone.cell_statuses(), copied_state.cell_statuses())
+
+    def test_last_changes_describe_faller_moves(self):
+        self._test_game_state._field[6][0] = "S"
+        self.setup_default_test_faller()
+        self.assertEqual(self._test_game_state.last_changes(),
+                         (((0, 1, "X"), (1, 1, "Y"), (2, 1, "Z")), ((CHANGE_FALLER_CREATED, (("X", "Y", "Z"), 1)),)))
+        self._test_game_state.rotate_faller()
+        self.assertEqual(self._test_game_state.last_changes().events, ((CHANGE_FALLER_ROTATED, (("Z", "X", "Y"),)),))
+        for i in range(3):
+            self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.last_changes().events, ((CHANGE_FALLER_MOVED, (3, 1)),))
+        self._test_game_state.shift_faller("left") # onto the "S"
+        self.assertEqual(self._test_game_state.last_changes().cells,
+                         ((3, 0, "Z"), (3, 1, 0), (4, 0, "X"), (4, 1, 0), (5, 0, "Y"), (5, 1, 0)))
+        self.assertEqual(self._test_game_state.last_changes().events,
+                         ((CHANGE_FALLER_MOVED, (3, 0)), (CHANGE_FALLER_LANDED, ())))
+        self._test_game_state.shift_faller("right")
+        self.assertEqual(self._test_game_state.last_changes().events,
+                         ((CHANGE_FALLER_MOVED, (3, 1)), (CHANGE_FALLER_FALLING, ())))
+        self.assertRaises(FallerAlreadyActiveError, self._test_game_state.create_faller, ['X', 'Y', 'Z'], 3)
+        self.assertEqual(self._test_game_state.last_changes(), ((), ()))
+
+    def test_last_changes_describe_matches_and_game_over(self):
+        self._test_game_state.create_faller(['X', 'X', 'X'], 2)
+        for i in range(5):
+            self._test_game_state.tick()
+        matches = tuple(self._test_game_state._matches)
+        self.assertEqual(self._test_game_state.last_changes(),
+                         ((), ((CHANGE_FALLER_FROZEN, ([[4, 1], [5, 1], [6, 1]],)), (CHANGE_MATCHES_MARKED, (matches,)))))
+        self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.last_changes(),
+                         (((4, 1, 0), (5, 1, 0), (6, 1, 0)), ((CHANGE_MATCHES_CLEARED, (matches,)),)))
+
+        for i in range(3): # fill the column up
+            self._test_game_state.create_faller(['X', 'Y', 'Z'], 1)
+            while self._test_game_state._faller is not None:
+                self._test_game_state.tick()
+        self.assertEqual(self._test_game_state.last_changes().events[-1], (CHANGE_GAME_OVER, ()))
+
+    def test_last_changes_include_jewels_moved_by_gravity(self):
+        self._test_game_state.fill_initial_field([[' ', ' ', ' ', ' '], [' ', ' ', ' ', ' '], ['S', ' ', ' ', ' '],
+                                                  ['T', ' ', ' ', ' '], ['X', 'X', 'X', ' ']])
+        self._test_game_state.tick() # clears the X row, which brings the S and T down
+        self.assertEqual(self._test_game_state.last_changes().cells,
+                         ((4, 0, 0), (5, 0, "S"), (6, 0, "T"), (6, 1, 0), (6, 2, 0)))
+
     def test_inability_to_create_multiple_fallers(self):
         self.setup_default_test_faller()
         self.assertRaises(FallerAlreadyActiveError, self._test_game_state.create_faller, ['X', 'Y', 'Z'], 3)
@@ -249,6 +585,85 @@ class TestGameMechanics(unittest.TestCase):
         self.assertEqual(self._test_game_state.coordinate_in_faller((1, 2)), False)
         self.assertEqual(self._test_game_state.coordinate_in_faller((2, 2)), False)
 
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestArrayFieldGameMechanics(TestGameMechanics):
+    # runs every game mechanics test again with the numpy array-backed field
+    def setUp(self) -> None:
+        self._test_game_state = GameState((5, 4), array_field=True)
+
+    def test_vectorized_matches_agree_with_list_matchers(self):
+        generator = random.Random(0)
+        for i in range(200):
+            rows, columns = generator.randint(3, 10), generator.randint(1, 8)
+            field = [[generator.choice([0, "X", "Y"]) for j in range(columns)] for k in range(rows)]
+            array_field = ArrayField(rows, columns)
+            for row_index in range(rows):
+                for column_index in range(columns):
+                    array_field[row_index][column_index] = field[row_index][column_index]
+
+            expected_matches = set(_check_horizontal_matches(field) + _check_vertical_matches(field)
+                                   + _check_diagonal_matches(field))
+            self.assertEqual(set(array_field.find_matches()), expected_matches)
+
+    def test_jewels_without_byte_codes_are_rejected(self):
+        self.assertRaises(InvalidJewelError, self._test_game_state.create_faller, ['X', '\u0100', 'Y'], 1)
+        self.assertEqual((self._test_game_state._faller, self._test_game_state.last_changes().cells), (None, ()))
+        self.assertTrue(all(jewel == 0 for row in self._test_game_state._field for jewel in row))
+        for jewel in ['XY', '\u0100', 5]:
+            self.assertRaises(InvalidJewelError, encode_jewel, jewel)
+
+        list_game_state = GameState((5, 4)) # lists store any jewel
+        list_game_state.create_faller(['X', '\u0100', 'Y'], 1)
+        list_game_state.tick()
+        self.assertEqual(list_game_state.cell_statuses()[3][0], CELL_FALLING)
+
+    def test_array_field_compacts_columns(self):
+        array_field = ArrayField(4, 2)
+        array_field[0][0] = "X"
+        array_field[2][0] = "Y"
+        array_field[3][1] = "Z"
+        self.assertEqual(array_field.bring_jewels_down(), {0})
+        self.assertEqual(array_field, [[0, 0], [0, 0], ["X", 0], ["Y", "Z"]])
+
+    def test_field_batch_drops_and_settles_like_game_state(self):
+        generator = random.Random(3)
+        states, fallers = [], []
+        for i in range(40): # the fields left between fallers of a few random games
+            if self._test_game_state.game_over():
+                self._test_game_state = GameState((5, 4))
+            while self._test_game_state._faller is not None or self._test_game_state._match_found_previous_tick:
+                self._test_game_state.tick()
+            states.append(self._test_game_state.clone())
+            fallers.append((generator.choices(["X", "Y", "Z"], k=3), generator.randint(1, 4)))
+            self._test_game_state.create_faller(*fallers[-1])
+
+        batch = FieldBatch.from_fields([state._field for state in states])
+        batch.drop_fallers([[encode_jewel(jewel) for jewel in jewels] for jewels, column in fallers],
+                           [column - 1 for jewels, column in fallers])
+        cleared, cascades = batch.settle()
+
+        for i, (state, (jewels, column)) in enumerate(zip(states, fallers)):
+            state.create_faller(jewels, column)
+            expected_cleared = expected_cascades = 0
+            while state._faller is not None and not state.game_over():
+                state.tick()
+            while state._match_found_previous_tick and not state.game_over():
+                expected_cleared += len(state._matches)
+                state.tick()
+                expected_cascades += state._match_found_previous_tick
+            self.assertEqual(batch.game_over()[i], state.game_over())
+            self.assertEqual((cleared[i], cascades[i]), (expected_cleared, expected_cascades))
+            if not state.game_over():
+                self.assertEqual(batch.field(i), state._field)
+
+    def test_field_batch_scores_columns_and_neighbours(self):
+        batch = FieldBatch.from_field([[0, 0], [0, 0], [0, 0], ["X", 0], ["X", "X"]], 2)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.column_heights().tolist(), [[2, 1], [2, 1]])
+        self.assertEqual(batch.neighbour_counts().tolist(), [3, 3])
+        self.assertEqual(batch.find_matches().any(), False)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,185 @@
+import unittest
+import asyncio
+import random
+from game_mechanics import GameState
+from game_server import (GameServer, GameClient, TimerWheel, encode_delta, decode_delta, run_load,
+                         _ServerSession, _MAX_PUSH_BUFFER_BYTES,
+                         STATUS_OK, STATUS_REJECTED, STATUS_UNKNOWN_SESSION, DELTA_GAME_OVER)
+from game_mechanics import EMPTY
+
+class _StalledTransport:
+    def __init__(self) -> None:
+        self.aborted = False
+
+    def get_write_buffer_size(self) -> int:
+        return _MAX_PUSH_BUFFER_BYTES + 1 # the client stopped reading
+
+    def abort(self) -> None:
+        self.aborted = True
+
+class _StalledWriter:
+    def __init__(self) -> None:
+        self.transport = _StalledTransport()
+        self.written = []
+
+    def is_closing(self) -> bool:
+        return self.transport.aborted
+
+    def write(self, data: bytes) -> None:
+        self.written.append(data)
+
+class TestGameServer(unittest.TestCase):
+    def test_timer_wheel_expires_keys_in_order(self):
+        wheel = TimerWheel(0.01, 8, 0.0)
+        wheel.schedule("later", 0.2) # wraps around the wheel twice
+        wheel.schedule("soon", 0.03)
+        wheel.schedule("cancelled", 0.03)
+        wheel.cancel("cancelled")
+        self.assertEqual(wheel.advance(0.025), [])
+        self.assertEqual(wheel.advance(0.035), ["soon"])
+        self.assertEqual(wheel.advance(0.195), [])
+        self.assertEqual(wheel.advance(0.205), ["later"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_delta_holds_only_changed_cells(self):
+        state = GameState((5, 4))
+        encode_delta(state)
+        state.create_faller(["X", "Y", "Z"], 2)
+        flags, cells = decode_delta(encode_delta(state))
+        self.assertEqual(sorted(cells), [(0, 1, "X", 1), (1, 1, "Y", 1), (2, 1, "Z", 1)])
+        state.tick()
+        flags, cells = decode_delta(encode_delta(state))
+        self.assertEqual(sorted((row, column, jewel) for row, column, jewel, status in cells),
+                         [(0, 1, 0), (1, 1, "X"), (2, 1, "Y"), (3, 1, "Z")])
+        self.assertEqual(decode_delta(encode_delta(state)), (0, []))
+
+    def test_client_field_follows_server_sessions(self):
+        async def play() -> None:
+            server = GameServer()
+            port = await server.start()
+            client = GameClient()
+            await client.connect(port=port)
+
+            session_id = await client.create_session((5, 4), gravity_interval=0)
+            generator = random.Random(0)
+            while client.flags.get(session_id, 0) & DELTA_GAME_OVER == 0:
+                status = await client.tick(session_id)
+                if status == STATUS_REJECTED: # no faller
+                    self.assertEqual(await client.create_faller(session_id, generator.choices(["X", "Y"], k=3),
+                                                                generator.randint(1, 4)), STATUS_OK)
+                elif generator.random() < 0.5:
+                    await client.shift_faller(session_id, generator.choice(["left", "right"]))
+                state = server._sessions[session_id].state
+                self.assertEqual(client.fields[session_id], state._field)
+                self.assertEqual(client.statuses[session_id], state.cell_statuses())
+
+            self.assertEqual(await client.close_session(session_id), STATUS_OK)
+            self.assertEqual(await client.rotate_faller(session_id), STATUS_UNKNOWN_SESSION)
+            self.assertEqual(server.sessions(), 0)
+            await client.close()
+            await server.close()
+
+        asyncio.run(play())
+
+    def test_gravity_ticks_are_pushed(self):
+        async def play() -> None:
+            server = GameServer(slot_seconds=0.001)
+            port = await server.start()
+            client = GameClient()
+            await client.connect(port=port)
+
+            session_id = await client.create_session((5, 4), gravity_interval=0.005)
+            await client.create_faller(session_id, ["X", "Y", "Z"], 1)
+            while client.pushes < 3:
+                await asyncio.sleep(0.005)
+            column = [row[0] for row in client.fields[session_id]]
+            self.assertEqual(column.index("X"), min(client.pushes, 4)) # one row per tick until it lands
+            await client.close()
+            await server.close()
+
+        asyncio.run(play())
+
+    def test_sessions_with_invalid_dimensions_are_rejected(self):
+        async def play() -> None:
+            server = GameServer()
+            port = await server.start()
+            client = GameClient()
+            await client.connect(port=port)
+
+            for dimensions in [(0, 6), (1, 1), (13, 0), (65535, 65535), (251, 6)]:
+                self.assertIsNone(await client.create_session(dimensions, gravity_interval=0))
+            self.assertEqual((server.sessions(), client.fields), (0, {}))
+            self.assertIsNotNone(await client.create_session((3, 1), gravity_interval=0)) # still connected
+            await client.close()
+            await server.close()
+
+        asyncio.run(play())
+
+    def test_failing_session_does_not_stop_gravity_for_others(self):
+        async def play() -> None:
+            server = GameServer(slot_seconds=0.001)
+            port = await server.start()
+            client = GameClient()
+            await client.connect(port=port)
+
+            broken_session_id = await client.create_session((5, 4), gravity_interval=0.005)
+            session_id = await client.create_session((5, 4), gravity_interval=0.005)
+            def broken_tick():
+                raise RuntimeError("broken")
+            server._sessions[broken_session_id].state.tick = broken_tick
+            await client.create_faller(session_id, ["X", "Y", "Z"], 1)
+            while client.pushes < 3 or len(client.closed_sessions) == 0:
+                await asyncio.sleep(0.005)
+            self.assertNotIn(broken_session_id, server._sessions)
+            self.assertIn(session_id, server._sessions)
+            self.assertEqual(client.closed_sessions, {broken_session_id}) # told the client
+            self.assertEqual(list(client.fields), [session_id])
+            await client.close()
+            await server.close()
+
+        with self.assertLogs("game_server", "ERROR") as logs:
+            asyncio.run(play())
+        self.assertIn("RuntimeError: broken", logs.output[0])
+
+    def test_fallers_of_unknown_jewels_are_rejected(self):
+        async def play() -> None:
+            server = GameServer()
+            port = await server.start()
+            client = GameClient()
+            await client.connect(port=port)
+
+            session_id = await client.create_session((5, 4), gravity_interval=0)
+            for jewels in [[EMPTY, "X", "Y"], ["X", "A", "Y"]]:
+                self.assertEqual(await client.create_faller(session_id, jewels, 1), STATUS_REJECTED)
+            self.assertIsNone(server._sessions[session_id].state._faller)
+            self.assertEqual(await client.create_faller(session_id, ["X", "Y", "Z"], 1), STATUS_OK) # still connected
+            await client.close()
+            await server.close()
+
+        asyncio.run(play())
+
+    def test_clients_that_stop_reading_pushes_are_dropped(self):
+        server = GameServer()
+        server._wheel = TimerWheel(0.01, 8, 0.0)
+        writer = _StalledWriter()
+        server._sessions[1] = _ServerSession(GameState((5, 4)), writer, 0.01)
+        server._sessions[1].state.create_faller(["X", "Y", "Z"], 1)
+        server._push_gravity_tick(1, server._sessions[1])
+        self.assertTrue(writer.transport.aborted)
+        self.assertEqual((writer.written, server.sessions(), len(server._wheel)), ([], 0, 0))
+
+    def test_load_generator_reports_latency(self):
+        async def load():
+            server = GameServer()
+            port = await server.start()
+            report = await run_load(port, 20, connections=4, commands_per_session=3, seed=0)
+            await server.close()
+            return report
+
+        report = asyncio.run(load())
+        self.assertEqual((report.sessions, report.commands), (20, 60))
+        self.assertLessEqual(report.p50, report.p99)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import asyncio
+import os
+from unittest import mock
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+import main
+from main import ColumnsGame, _INPUT_POLL_INTERVAL, _MAX_INPUT_POLL_INTERVAL, _IDLE_INPUT_POLL_INTERVAL
+
+class TestColumnsGame(unittest.TestCase):
+    def setUp(self) -> None:
+        self._sleeps = []
+        self._polls_until_event = 0
+        self._real_sleep = asyncio.sleep
+        for patcher in [mock.patch.object(main.asyncio, "sleep", self._recorded_sleep),
+                        mock.patch.object(main.pygame.event, "get", self._delayed_events)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _recorded_sleep(self, seconds: float) -> None:
+        self._sleeps.append(seconds)
+        await self._real_sleep(0)
+
+    def _delayed_events(self) -> list:
+        self._polls_until_event -= 1
+        return ["event"] if self._polls_until_event == 0 else []
+
+    def test_idle_async_waits_back_off_polling(self):
+        game = ColumnsGame()
+        self._polls_until_event = 8
+        self.assertEqual(asyncio.run(game._wait_for_events_async(None)), ["event"])
+        self.assertEqual(self._sleeps, [0, _INPUT_POLL_INTERVAL, 0.02, 0.04, 0.08, 0.16,
+                                        _IDLE_INPUT_POLL_INTERVAL, _IDLE_INPUT_POLL_INTERVAL])
+
+        self._sleeps.clear()
+        self._polls_until_event = 6
+        self.assertEqual(asyncio.run(game._wait_for_events_async(10.0)), ["event"])
+        self.assertEqual(self._sleeps, [0, _INPUT_POLL_INTERVAL, 0.02, 0.04, _MAX_INPUT_POLL_INTERVAL,
+                                        _MAX_INPUT_POLL_INTERVAL])
+
+
+class TestColumnsGameViewport(unittest.TestCase):
+    def setUp(self) -> None:
+        self._game = ColumnsGame(dimensions=(100, 60))
+        self._game._start()
+        self._game._redraw()
+
+    def tearDown(self) -> None:
+        pygame.quit()
+
+    def press(self, key: int, times: int = 1) -> None:
+        for i in range(times):
+            self._game._move_viewport(key)
+            self._game._redraw()
+
+    def test_viewport_is_clamped_to_the_field(self):
+        visible_rows, visible_columns = self._game._render_cache.visible_cells
+        self.assertLess((visible_rows, visible_columns), (100, 60))
+
+        self.press(pygame.K_w, 10)
+        self.press(pygame.K_a, 10)
+        self.assertEqual(self._game._viewport_origin, (2, 0)) # never shows the hidden rows
+        self.press(pygame.K_s, 100)
+        self.press(pygame.K_d, 100)
+        self.assertEqual(self._game._viewport_origin, (102 - visible_rows, 60 - visible_columns))
+        self.assertEqual((self._game._render_cache.first_row, self._game._render_cache.first_column),
+                         self._game._viewport_origin)
+
+    def test_viewport_follows_the_faller_again_after_f(self):
+        self._game._state.create_faller(['X', 'Y', 'Z'], 60)
+        self._game._redraw()
+        self.assertTrue(self._game._render_cache.is_visible(2, 59))
+
+        self.press(pygame.K_a, 100)
+        self._game._state.tick()
+        self._game._redraw()
+        self.assertFalse(self._game._render_cache.is_visible(3, 59)) # scrolling stopped the following
+
+        self.press(pygame.K_f)
+        self.assertTrue(self._game._render_cache.is_visible(3, 59))
+
+    def test_only_visible_changed_cells_are_drawn(self):
+        self._game._state.create_faller(['X', 'Y', 'Z'], 1)
+        self._game._redraw()
+        self._game._state.take_changed_cells()
+        render_cache = self._game._render_cache
+        updated_rects = self._game._draw_changed_cells(pygame.display.get_surface(),
+                                                       {(2, 0), (0, 0), (101, 59), (2, render_cache.visible_cells[1])})
+        self.assertEqual(updated_rects, [render_cache.cell_rect(2, 0)])
+
+    def test_zooming_out_fits_the_field_again(self):
+        self._game = ColumnsGame()
+        self._game._start()
+        self._game._redraw()
+        self.press(pygame.K_MINUS)
+        self.assertEqual((self._game._cell_size, self._game._render_cache.visible_cells), (None, (13, 6)))
+
+        self.press(pygame.K_EQUALS)
+        self.assertNotEqual(self._game._cell_size, None)
+        self.assertLess(self._game._render_cache.visible_cells, (13, 6))
+        for i in range(5):
+            self.press(pygame.K_MINUS)
+        self.assertEqual((self._game._cell_size, self._game._render_cache.visible_cells), (None, (13, 6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
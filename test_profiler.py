@@ -0,0 +1,64 @@
+import unittest
+from game_mechanics import GameState, CHANGE_FALLER_LANDED, CHANGE_FALLER_FROZEN, CHANGE_MATCHES_CLEARED
+from game_mechanics_errors import FallerNotActiveError
+from array_field import numpy
+from profiler import Profiler, TimingHistogram
+
+class TestProfiler(unittest.TestCase):
+    array_field = False
+
+    def setUp(self) -> None:
+        self._test_game_state = GameState((4, 3), array_field=self.array_field)
+        self._test_game_state.fill_initial_field([[' ', ' ', ' '], [' ', ' ', ' '],
+                                                  [' ', ' ', ' '], ['X', 'X', ' ']])
+        self._profiler = Profiler()
+        self._profiler.instrument_state(self._test_game_state)
+
+    def test_tick_phases_are_timed_and_counted(self):
+        self._test_game_state.create_faller(['Y', 'Z', 'X'], 3)
+        for i in range(5): # falls 2 rows, lands, freezes with a match, clears it
+            self._test_game_state.tick()
+        self.assertRaises(FallerNotActiveError, self._test_game_state.tick)
+
+        phase_counts = {phase: self._profiler.histogram(phase).count
+                        for phase in ("state.tick", "state.land", "state.freeze", "state.clear", "state.gravity")}
+        self.assertEqual(phase_counts, {"state.tick": 6, "state.land": 1, "state.freeze": 1,
+                                        "state.clear": 1, "state.gravity": 1})
+        self.assertEqual(self._profiler.histogram("state.move").count, 2 + 1) # the landing move too
+        self.assertEqual([self._profiler.counter("state." + kind)
+                          for kind in (CHANGE_FALLER_LANDED, CHANGE_FALLER_FROZEN, CHANGE_MATCHES_CLEARED)], [1, 1, 1])
+        self.assertGreater(self._profiler.counter("state.cells_written"), 0)
+        self.assertIn("state.match_scan", self._profiler.snapshot()["phases"])
+
+    def test_clones_and_uninstrumented_games_are_not_profiled(self):
+        self._test_game_state.create_faller(['Y', 'Z', 'X'], 3)
+        clone = self._test_game_state.clone()
+        clone.tick()
+        self.assertEqual(self._profiler.histogram("state.tick").count, 0)
+        self.assertNotIn("tick", vars(clone))
+
+        self._profiler.uninstrument(self._test_game_state)
+        self._test_game_state.tick()
+        self.assertEqual(self._profiler.histogram("state.tick").count, 0)
+        self.assertEqual(self._test_game_state._faller, clone._faller)
+
+    def test_histogram_percentiles_bound_durations(self):
+        histogram = TimingHistogram()
+        for nanoseconds in [100] * 98 + [5000, 70000]:
+            histogram.record(nanoseconds)
+        self.assertEqual(histogram.percentile_ns(0.5), 127) # top of the 64..127 bucket
+        self.assertEqual(histogram.percentile_ns(1.0), 70000)
+        self.assertEqual(histogram.to_dict()["buckets"], {"127": 98, "8191": 1, "131071": 1})
+        self._profiler.record("custom", 10)
+        self._profiler.reset()
+        self.assertEqual(self._profiler.histogram("custom").count, 0)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestArrayFieldProfiler(TestProfiler):
+    # profiles the same games with the numpy array-backed field, whose gravity takes another path
+    array_field = True
+
+
+if __name__ == "__main__":
+    unittest.main()
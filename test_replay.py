@@ -0,0 +1,97 @@
+import unittest
+import os
+import random
+import tempfile
+from unittest import mock
+from game_mechanics import GameState
+from game_mechanics_errors import (FallerAlreadyActiveError, FallerNotActiveError, InvalidMoveError,
+                                   InvalidJewelError, InvalidReplayError)
+from replay import ReplayRecorder, ReplayReader, validate_replays, _REPLAY_HEADER, _REPLAY_MAGIC, _REPLAY_VERSION
+
+class TestReplay(unittest.TestCase):
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._directory.name, "game.replay")
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def record_random_game(self, keyframe_interval: int) -> list[bytes]:
+        # plays a random game through the recorder, returning a snapshot after every tick
+        generator = random.Random(1)
+        snapshots = [GameState((8, 4)).to_bytes()]
+        with ReplayRecorder(self._path, GameState((8, 4)), keyframe_interval) as recorder:
+            while not recorder.state.game_over():
+                try:
+                    if generator.random() < 0.2:
+                        recorder.shift_faller(generator.choice(["left", "right"]))
+                    elif generator.random() < 0.1:
+                        recorder.rotate_faller()
+                    recorder.tick()
+                    snapshots.append(recorder.state.to_bytes())
+                except FallerNotActiveError:
+                    recorder.create_faller(generator.choices(["X", "Y", "Z"], k=3), generator.randint(1, 4))
+                except InvalidMoveError:
+                    pass
+        return snapshots
+
+    def test_seeking_to_every_tick_matches_recorded_game(self):
+        snapshots = self.record_random_game(keyframe_interval=7)
+        with ReplayReader(self._path) as reader:
+            self.assertEqual(reader.ticks(), len(snapshots) - 1)
+            for tick in range(reader.ticks() + 1):
+                self.assertEqual(reader.state_at(tick).to_bytes(), snapshots[tick])
+
+    def test_recorded_replay_is_valid(self):
+        self.record_random_game(keyframe_interval=5)
+        with ReplayReader(self._path) as reader:
+            reader.validate()
+        self.assertEqual(validate_replays([self._path]), {})
+
+    def test_truncated_replay_can_still_be_read(self):
+        snapshots = self.record_random_game(keyframe_interval=5)
+        with open(self._path, "rb+") as replay_file:
+            replay_file.truncate(os.path.getsize(self._path) - 3) # cut off part of the last keyframe
+        with ReplayReader(self._path) as reader:
+            self.assertLessEqual(reader.ticks(), len(snapshots) - 1)
+            self.assertEqual(reader.state_at(reader.ticks()).to_bytes(), snapshots[reader.ticks()])
+
+    def test_tampered_replay_is_invalid(self):
+        with ReplayRecorder(self._path, GameState((8, 4)), keyframe_interval=2) as recorder:
+            recorder.create_faller(["X", "Y", "Z"], 1)
+            recorder.tick()
+            recorder._file.write(bytes([3])) # a shift right that was never applied to the state
+            recorder.tick()
+        self.assertIn(self._path, validate_replays([self._path]))
+
+    def test_non_replay_file_rejected(self):
+        with open(self._path, "wb") as replay_file:
+            replay_file.write(b"not a replay file")
+        self.assertRaises(InvalidReplayError, ReplayReader, self._path)
+
+    def test_rejected_replays_are_closed(self):
+        with mock.patch.object(ReplayReader, "close", autospec=True, side_effect=ReplayReader.close) as close:
+            for contents in [b"", _REPLAY_HEADER.pack(_REPLAY_MAGIC, _REPLAY_VERSION, 5) + bytes([99]),
+                             _REPLAY_HEADER.pack(_REPLAY_MAGIC, _REPLAY_VERSION, 5)]:
+                with open(self._path, "wb") as replay_file:
+                    replay_file.write(contents)
+                self.assertRaises(InvalidReplayError, ReplayReader, self._path)
+        closed_readers = [call.args[0] for call in close.call_args_list]
+        self.assertEqual(len(closed_readers), 2) # the empty file was never mapped
+        self.assertTrue(all(reader._file.closed and reader._data.closed for reader in closed_readers))
+
+    def test_rejected_commands_are_not_recorded(self):
+        with ReplayRecorder(self._path, GameState((8, 4))) as recorder:
+            recorder.create_faller(["X", "Y", "Z"], 1)
+            recorded_size = recorder._file.tell()
+            self.assertRaises(InvalidMoveError, recorder.shift_faller, "left")
+            self.assertRaises(FallerAlreadyActiveError, recorder.create_faller, ["X", "Y", "Z"], 2)
+            self.assertRaises(InvalidJewelError, recorder.create_faller, ["X", "\u0100", "Z"], 2)
+            self.assertEqual(recorder._file.tell(), recorded_size)
+            recorder.tick()
+        with ReplayReader(self._path) as reader:
+            reader.validate()
+            self.assertEqual(reader.state_at(1)._faller.top_row, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import asyncio
+from simulation import (simulate_game, run_simulation, RandomFallerSource, RandomMovePolicy,
+                        GAME_OVER_FALLER_BLOCKED, GAME_OVER_JEWELS_OUT_OF_FIELD, GAME_OVER_TICK_LIMIT)
+from parallel_simulation import run_parallel_simulation, SimulationAggregate
+from game_session import GameSession, run_sessions
+
+class TestSimulation(unittest.TestCase):
+    def test_seeded_games_are_reproducible(self):
+        first_report = run_simulation(20, seed=7, move_policy_factory=RandomMovePolicy)
+        second_report = run_simulation(20, seed=7, move_policy_factory=RandomMovePolicy)
+        self.assertEqual(first_report.games, second_report.games)
+
+    def test_games_end_with_a_known_cause(self):
+        report = run_simulation(20, seed=3)
+        for stats in report.games:
+            self.assertIn(stats.game_over_cause, (GAME_OVER_FALLER_BLOCKED, GAME_OVER_JEWELS_OUT_OF_FIELD))
+            self.assertGreater(stats.ticks, 0)
+        self.assertEqual(report.total_ticks, sum(stats.ticks for stats in report.games))
+
+    def test_game_stops_at_tick_limit(self):
+        stats = simulate_game(RandomFallerSource(0), max_ticks=5)
+        self.assertEqual(stats.ticks, 5)
+        self.assertEqual(stats.game_over_cause, GAME_OVER_TICK_LIMIT)
+
+    def test_matching_fallers_score_and_cascade(self):
+        # every faller is a vertical match, so every faller scores 3 jewels
+        stats = simulate_game(lambda state: (["X", "X", "X"], 1), max_ticks=100)
+        self.assertEqual(stats.game_over_cause, GAME_OVER_TICK_LIMIT)
+        self.assertGreater(stats.score, 0)
+        self.assertEqual(stats.score % 3, 0)
+        self.assertEqual(stats.cascades, 0)
+
+    def test_parallel_aggregate_does_not_depend_on_worker_count(self):
+        single_worker_aggregate, seconds = run_parallel_simulation(30, master_seed=11, workers=1, games_per_shard=7)
+        multi_worker_aggregate, seconds = run_parallel_simulation(30, master_seed=11, workers=3, games_per_shard=4)
+        self.assertEqual(single_worker_aggregate.to_json(), multi_worker_aggregate.to_json())
+        self.assertEqual(single_worker_aggregate.games, 30)
+
+    def test_parallel_aggregate_matches_sequential_games(self):
+        aggregate, seconds = run_parallel_simulation(12, master_seed=5, workers=2, games_per_shard=5)
+        expected_aggregate = SimulationAggregate()
+        for stats in run_simulation(12, seed=5).games:
+            expected_aggregate.add(stats)
+        self.assertEqual(aggregate.to_json(), expected_aggregate.to_json())
+
+    def test_concurrent_sessions_play_the_same_games_as_the_simulator(self):
+        sessions = [GameSession(RandomFallerSource(seed), gravity_interval=0) for seed in range(4)]
+        session_stats = asyncio.run(run_sessions(sessions))
+        self.assertEqual(session_stats, [simulate_game(RandomFallerSource(seed)) for seed in range(4)])
+
+    def test_session_stops_at_tick_limit(self):
+        session = GameSession(RandomFallerSource(0), gravity_interval=0)
+        stats = asyncio.run(session.run(max_ticks=3))
+        self.assertEqual(stats.ticks, 3)
+        self.assertEqual(stats.game_over_cause, GAME_OVER_TICK_LIMIT)
+
+if __name__ == "__main__":
+    unittest.main()